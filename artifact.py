@@ -0,0 +1,159 @@
+from collections import OrderedDict
+import json
+import os
+
+import numpy
+
+import constants
+
+
+
+class Model:
+	### Initialization ###
+	# Initializes an empty model artifact: a trained linear model (SVM or
+	# logistic regression) reduced to the arrays needed to score examples, the
+	# layout of the features it was trained on, and the clustering threshold.
+	# Scoring only needs NumPy, so an artifact can be loaded without
+	# scikit-learn.
+	def __init__(self):
+		self.version = constants.ARTIFACT_VERSION
+		self.model = None
+		self.threshold = None
+		self.layout = []
+
+		# Scaler parameters, linear weights, intercept and the class labels.
+		self.mean = None
+		self.scale = None
+		self.weights = None
+		self.intercept = None
+		self.classes = None
+
+		# Optional predicted language similarities (see
+		# Learner.predictLanguageSimilarity).
+		self.predictedSimilarities = None
+		self.similarityLanguages = None
+
+
+	# Builds an artifact from a trained learner. The layout describes the
+	# features of the training examples (see Extractor.getMinimalLayout).
+	@classmethod
+	def fromLearner(cls, learner, model, layout = None, threshold = None):
+		machine = learner.SVM if model == constants.SVM else learner.LR
+
+		artifact = cls()
+		artifact.model = model
+		artifact.threshold = threshold
+		artifact.layout = layout if layout is not None else []
+
+		artifact.mean = numpy.asarray(learner.scaler.mean_, dtype = numpy.float64)
+		artifact.scale = numpy.asarray(learner.scaler.scale_, dtype = numpy.float64)
+		artifact.weights = numpy.asarray(machine.coef_, dtype = numpy.float64).ravel()
+		artifact.intercept = numpy.asarray(machine.intercept_, dtype = numpy.float64).ravel()
+		artifact.classes = numpy.asarray(machine.classes_)
+
+		if getattr(learner, "predictedSimilarities", None) is not None:
+			artifact.predictedSimilarities = numpy.asarray(learner.predictedSimilarities, dtype = numpy.float64)
+			artifact.similarityLanguages = numpy.asarray(learner.similarityLanguages, dtype = int)
+
+		return artifact
+
+
+	### Saving and Loading ###
+	# Saves the artifact to a directory: one .npy file per array and a JSON
+	# manifest with the version, the model settings, the feature layout and the
+	# array filenames. Each file is written to a temporary file and renamed,
+	# and the manifest is written last, so that a half-written artifact is
+	# never loaded.
+	def save(self, directory):
+		if not os.path.exists(directory):
+			os.makedirs(directory)
+
+		arrays = OrderedDict()
+		for name, array in self.getArrays().iteritems():
+			arrays[name] = constants.ARTIFACT_ARRAY.format(name)
+			self.write(os.path.join(directory, arrays[name]), lambda output: numpy.save(output, array))
+
+		manifest = OrderedDict([
+			("version", self.version),
+			("model", self.model),
+			("threshold", self.threshold),
+			("features", self.layout),
+			("featureCount", len(self.weights)),
+			("arrays", arrays)
+		])
+
+		self.write(os.path.join(directory, constants.ARTIFACT_MANIFEST), lambda output: json.dump(manifest, output, indent = 1))
+
+
+	# Writes a file through a temporary file.
+	def write(self, filename, dump):
+		temporary = filename + ".{0}.tmp".format(os.getpid())
+		with open(temporary, "wb") as output:
+			dump(output)
+		os.rename(temporary, filename)
+
+
+	# Collects the arrays of the artifact by name.
+	def getArrays(self):
+		arrays = OrderedDict([("mean", self.mean), ("scale", self.scale), ("weights", self.weights), ("intercept", self.intercept), ("classes", self.classes)])
+
+		if self.predictedSimilarities is not None:
+			arrays["predictedSimilarities"] = self.predictedSimilarities
+			arrays["similarityLanguages"] = self.similarityLanguages
+
+		return arrays
+
+
+	# Loads an artifact from a directory. Arrays are memory-mapped read-only,
+	# so loading does not depend on their size.
+	@classmethod
+	def load(cls, directory):
+		with open(os.path.join(directory, constants.ARTIFACT_MANIFEST), "rb") as input:
+			manifest = json.load(input)
+
+		if manifest.get("version") != constants.ARTIFACT_VERSION:
+			raise ValueError("Unsupported model artifact version: {0} (expected {1})".format(manifest.get("version"), constants.ARTIFACT_VERSION))
+
+		artifact = cls()
+		artifact.model = manifest["model"]
+		artifact.threshold = manifest["threshold"]
+		artifact.layout = manifest["features"]
+
+		for name, filename in manifest["arrays"].iteritems():
+			setattr(artifact, name, numpy.load(os.path.join(directory, filename), mmap_mode = "r"))
+
+		if len(artifact.weights) != manifest["featureCount"]:
+			raise ValueError("Model artifact weights do not match its feature count.")
+
+		return artifact
+
+
+	### Prediction ###
+	# Computes the decision function of the linear model on standardized
+	# examples.
+	def decide(self, testExamples):
+		testExamples = (numpy.asarray(testExamples, dtype = numpy.float64) - self.mean) / self.scale
+		return testExamples.dot(self.weights) + self.intercept[0]
+
+
+	# Predicts the class of each example with the SVM.
+	def predictSVM(self, testExamples):
+		return self.classes[(self.decide(testExamples) > 0).astype(int)]
+
+
+	# Predicts the class of each example with logistic regression.
+	def predictLogisticRegression(self, testExamples):
+		return self.classes[(self.decide(testExamples) > 0).astype(int)]
+
+
+	# Predicts the probability of the positive class of each example with
+	# logistic regression.
+	def predictProbLogisticRegression(self, testExamples):
+		return 1.0 / (1.0 + numpy.exp(-self.decide(testExamples)))
+
+
+	### Features ###
+	# Compiles the feature layout of the artifact into an extractor function,
+	# using the given extractor's measures and preprocessors.
+	def getExtractor(self, extractor):
+		return extractor.compileExtractor(self.layout)
@@ -0,0 +1,230 @@
+from __future__ import division
+from collections import OrderedDict
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import constants
+import extractor
+import learner
+import output
+import pairer
+import reader
+
+
+
+class Benchmark:
+	### Initialization ###
+	# Initializes the benchmark with a fixed sample size and seed, so that the
+	# same pairs are timed on every run.
+	def __init__(self, sampleSize = constants.BENCHMARK_SAMPLE, seed = constants.BENCHMARK_SEED, repeats = constants.BENCHMARK_REPEATS):
+		self.sampleSize = sampleSize
+		self.seed = seed
+		self.repeats = repeats
+
+		self.results = OrderedDict()
+
+
+	### Data ###
+	# Reads and pairs the data using the language split of the main script,
+	# then draws a seeded sample of training and test pairs.
+	def prepare(self):
+		self.rdr = reader.Reader()
+		self.rdr.read()
+
+		self.trainLanguages = constants.LANGUAGE_GROUPS[1] + constants.LANGUAGE_GROUPS[2] + constants.LANGUAGE_GROUPS[3]
+		self.testLanguages = constants.LANGUAGE_GROUPS[0] + constants.LANGUAGE_GROUPS[4] + constants.LANGUAGE_GROUPS[5] + constants.LANGUAGE_GROUPS[6] + constants.LANGUAGE_GROUPS[8] + constants.LANGUAGE_GROUPS[7]
+
+		self.prr = pairer.Pairer()
+		self.prr.pairBySpecificLanguage(self.rdr.cognateCCNs, self.rdr.dCognateCCNs, self.trainLanguages, self.testLanguages)
+
+		sampler = random.Random(self.seed)
+
+		self.examples = {}
+		self.labels = {}
+
+		for purpose in [constants.TRAIN, constants.TEST]:
+			indices = sorted(sampler.sample(range(len(self.prr.examples[purpose])), min(self.sampleSize, len(self.prr.examples[purpose]))))
+			self.examples[purpose] = [self.prr.examples[purpose][i] for i in indices]
+			self.labels[purpose] = [self.prr.labels[purpose][i] for i in indices]
+
+		self.meanings = sorted(self.prr.testMeanings)[: constants.BENCHMARK_MEANINGS]
+
+
+	### Timing ###
+	# Runs the function a number of times, records the best wall time together
+	# with per-call latency and pair throughput.
+	def time(self, name, function, calls, pairs):
+		times = []
+
+		for i in range(self.repeats):
+			start = time.time()
+			function()
+			times.append(time.time() - start)
+
+		seconds = min(times)
+
+		self.results[name] = OrderedDict([
+			("calls", calls),
+			("pairs", pairs),
+			("seconds", seconds),
+			("latency", seconds / calls if calls > 0 else 0.0),
+			("pairsPerSecond", pairs / seconds if seconds > 0 else 0.0)
+		])
+
+
+	### Benchmarks ###
+	# Times every word similarity measure on the sampled pairs.
+	def benchmarkMeasures(self):
+		ext = extractor.Extractor()
+		forms = [(form1, form2) for (form1, form2, language1, language2, meaningIndex) in self.examples[constants.TRAIN]]
+
+		for measure in ext.allMeasures:
+			self.time("measure." + measure.__name__, lambda: [measure(form1, form2) for (form1, form2) in forms], len(forms), len(forms))
+
+
+	# Times each of the extractor's feature appending methods on the sampled
+	# pairs. Group letter features are very wide, and are thus timed on a tenth
+	# of the sample.
+	def benchmarkFeatures(self):
+		pairCount = len(self.examples[constants.TRAIN]) + len(self.examples[constants.TEST])
+
+		def run(method):
+			ext = extractor.Extractor()
+			ext.consonantPrep = self.rdr.consonants
+			ext.soundClassPrep = self.rdr.soundClasses
+			method(ext)
+			return ext
+
+		self.time("extractor.appendWordSimilarityFeatures", lambda: run(lambda ext: ext.appendWordSimilarityFeatures(self.examples, self.labels, ext.HK2011Measures)), 1, pairCount)
+		self.time("extractor.appendWordSimilarityFeatures.soundClass", lambda: run(lambda ext: ext.appendWordSimilarityFeatures(self.examples, self.labels, [ext.LCPLength, ext.commonBigramNumber, ext.identicalPrefix], self.rdr.soundClasses)), 1, pairCount)
+		self.time("extractor.appendPOSTags", lambda: run(lambda ext: ext.appendPOSTags(self.examples, self.labels, self.rdr.POSTags)), 1, pairCount)
+		self.time("extractor.appendLetterFeatures", lambda: run(lambda ext: ext.appendLetterFeatures(self.examples, self.labels)), 1, pairCount)
+		self.time("extractor.appendSameLanguageGroupFeatures", lambda: run(lambda ext: ext.appendSameLanguageGroupFeatures(self.examples, self.labels)), 1, pairCount)
+		self.time("extractor.appendBinaryLanguageFeatures", lambda: run(lambda ext: ext.appendBinaryLanguageFeatures(self.examples, self.labels, constants.TEST, self.prr.testLanguages)), 1, len(self.examples[constants.TEST]))
+
+		shortExamples = {purpose: examples[: len(examples) // 10] for purpose, examples in self.examples.iteritems()}
+		shortLabels = {purpose: labels[: len(labels) // 10] for purpose, labels in self.labels.iteritems()}
+		self.time("extractor.appendGroupLetterFeatures", lambda: run(lambda ext: ext.appendGroupLetterFeatures(shortExamples, shortLabels)), 1, len(shortExamples[constants.TRAIN]) + len(shortExamples[constants.TEST]))
+
+		def similarities(ext):
+			ext.appendWordSimilarityFeatures(self.examples, self.labels, ext.HK2011Measures)
+			ext.appendTrainLanguageSimilarities(self.examples)
+		self.time("extractor.appendTrainLanguageSimilarities", lambda: run(similarities), 1, len(self.examples[constants.TRAIN]))
+
+		self.time("extractor.extractEditOps", lambda: extractor.Extractor().extractEditOps(self.examples, self.labels), 1, sum(self.labels[constants.TRAIN]))
+
+
+	# Times pairing of the full data set by language.
+	def benchmarkPairing(self):
+		def pair():
+			prr = pairer.Pairer()
+			prr.pairBySpecificLanguage(self.rdr.cognateCCNs, self.rdr.dCognateCCNs, self.trainLanguages, self.testLanguages)
+
+		pairCount = len(self.prr.examples[constants.TRAIN]) + len(self.prr.examples[constants.TEST])
+		self.time("pairer.pairBySpecificLanguage", pair, 1, pairCount)
+
+
+	# Trains the minimal approach on the sampled pairs, then times distance
+	# computation, clustering, and the evaluation metrics on a few test
+	# meanings.
+	def benchmarkLearning(self):
+		ext = extractor.Extractor()
+		ext.appendWordSimilarityFeatures(self.examples, self.labels, ext.minimalMeasures)
+		ext.appendPOSTags(self.examples, self.labels, self.rdr.POSTags)
+
+		lrn = learner.Learner()
+		lrn.initLogisticRegression(0.0001)
+		self.time("learner.fitLogisticRegression", lambda: lrn.fitLogisticRegression(ext.trainExamples, ext.trainLabels), 1, len(ext.trainLabels))
+		self.time("learner.predictLogisticRegression", lambda: lrn.predictLogisticRegression(ext.testExamples), 1, len(ext.testLabels))
+
+		wordforms = self.rdr.wordforms
+		meaningLanguages = {meaningIndex: lrn.collectMeaningLanguages(self.prr.testLanguages, wordforms[meaningIndex]) for meaningIndex in self.meanings}
+		pairCount = sum([len(languages) ** 2 for languages in meaningLanguages.itervalues()])
+
+		def distances():
+			for meaningIndex in self.meanings:
+				lrn.computeDistances(constants.LR, meaningLanguages[meaningIndex], self.prr.testLanguages, wordforms, meaningIndex, self.rdr.POSTags, ext.minimalExtractor)
+		self.time("learner.computeDistances", distances, len(self.meanings), pairCount)
+
+		clustering = {}
+		def cluster():
+			clustering["labels"] = lrn.cluster(constants.LR, constants.T3, wordforms, self.rdr.POSTags, self.meanings, self.prr.testLanguages, ext.minimalExtractor)[0]
+		self.time("learner.cluster", cluster, len(self.meanings), pairCount)
+
+		# Metrics
+		predictions = lrn.predictLogisticRegression(ext.testExamples)
+		trueLabels = ext.extractGroupLabels(self.rdr.cognateSets, wordforms, self.meanings, self.prr.testLanguages)
+		itemCount = sum([len(labels) for labels in trueLabels.itervalues()])
+
+		self.time("metrics.computeAccuracy", lambda: lrn.computeAccuracy(ext.testLabels, predictions), 1, len(predictions))
+		self.time("metrics.computeF1", lambda: lrn.computeF1(ext.testLabels, predictions), 1, len(predictions))
+		self.time("metrics.computeF1Interval", lambda: lrn.computeF1Interval(ext.testLabels, predictions), 1, len(predictions))
+		self.time("metrics.computeV1Scores", lambda: lrn.computeV1Scores(trueLabels, clustering["labels"], self.meanings), len(self.meanings), itemCount)
+		self.time("metrics.computeB3Scores", lambda: lrn.computeB3Scores(trueLabels, clustering["labels"], self.meanings), len(self.meanings), itemCount)
+
+
+	# Runs all benchmarks.
+	def run(self):
+		self.prepare()
+		self.benchmarkMeasures()
+		self.benchmarkFeatures()
+		self.benchmarkPairing()
+		self.benchmarkLearning()
+
+
+	### Saving and Comparing ###
+	# Writes the results as JSON.
+	def save(self, filename):
+		output.checkDirectory(filename)
+
+		with open(filename, "wb") as results:
+			json.dump(OrderedDict([("sampleSize", self.sampleSize), ("seed", self.seed), ("results", self.results)]), results, indent = 2)
+
+
+	# Compares per-call latencies with a stored baseline. Returns the names of
+	# benchmarks that became slower than the baseline by more than the given
+	# tolerance, together with the slowdown ratios.
+	def compare(self, filename, tolerance = constants.BENCHMARK_TOLERANCE):
+		with open(filename, "rb") as results:
+			baseline = json.load(results)["results"]
+
+		regressions = OrderedDict()
+
+		for name, result in self.results.iteritems():
+			if name in baseline and baseline[name]["latency"] > 0:
+				ratio = result["latency"] / baseline[name]["latency"]
+				if ratio > tolerance:
+					regressions[name] = ratio
+
+		return regressions
+
+
+
+# FLOW
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "Times the extractor measures and the pairing, feature extraction, learning and evaluation stages.")
+	parser.add_argument("--sample", type = int, default = constants.BENCHMARK_SAMPLE, help = "number of sampled training and test pairs")
+	parser.add_argument("--seed", type = int, default = constants.BENCHMARK_SEED, help = "sampling seed")
+	parser.add_argument("--output", default = constants.BENCHMARK_OUT, help = "JSON file to write results to")
+	parser.add_argument("--baseline", default = constants.BENCHMARK_BASELINE, help = "JSON file with baseline results")
+	parser.add_argument("--save-baseline", action = "store_true", help = "store the results as the new baseline")
+	parser.add_argument("--tolerance", type = float, default = constants.BENCHMARK_TOLERANCE, help = "largest allowed latency ratio to the baseline")
+	arguments = parser.parse_args()
+
+	bnc = Benchmark(arguments.sample, arguments.seed)
+	bnc.run()
+	bnc.save(arguments.output)
+
+	regressions = None
+	if arguments.save_baseline:
+		bnc.save(arguments.baseline)
+	elif os.path.exists(arguments.baseline):
+		regressions = bnc.compare(arguments.baseline, arguments.tolerance)
+
+	output.reportBenchmark(bnc.results, regressions)
+
+	sys.exit(1 if regressions else 0)
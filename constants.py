@@ -1,9 +1,53 @@
 # Settings
+# Default numbers of languages and meanings of generated wordlists (those of
+# the Comparative Indo-European Database).
 LANGUAGE_COUNT = 95
 MEANING_COUNT = 200
 
 PERMUTATIONS = 10000
 
+# Largest number of swap matrix cells drawn at once by the permutation test.
+PERMUTATION_CELLS = 10000000
+
+# Number of bootstrap replicates, the largest number of resampled indices
+# drawn at once, and the confidence level of bootstrap intervals.
+BOOTSTRAPS = 1000
+BOOTSTRAP_CELLS = 10000000
+CONFIDENCE = 0.95
+
+# Significance level and the z value of the p-value confidence interval used
+# to stop the permutation test early.
+SIGNIFICANCE_LEVEL = 0.05
+CONFIDENCE_Z = 2.576
+
+# Number of feature rows scored by a model at once.
+BATCH_SIZE = 10000
+
+# Length of the sound class n-grams two wordforms must share to be scored by a
+# model during clustering. Other pairs are blocked and get the maximum
+# distance. 0 disables blocking; it is enabled per run (--blocking).
+BLOCKING_N = 0
+
+# Number of MinHash values per wordform, number of values per LSH band, and
+# the prime modulus of the MinHash hash functions.
+MINHASH_COUNT = 64
+LSH_BAND_SIZE = 2
+MINHASH_PRIME = 2147483647
+
+# Largest number of candidates returned by an LSH index query.
+LSH_CANDIDATES = 100
+
+# Largest loss of V1 (of an incrementally updated clustering against a full
+# clustering of the same distances) that is not considered drift.
+DRIFT_TOLERANCE = 0.05
+
+# Largest number of pairs scored at once by a scorer, longest time (in
+# seconds) a request waits for its batch to fill, and the number of recently
+# scored pairs cached.
+SCORER_BATCH = 1000
+SCORER_LATENCY = 0.005
+SCORER_CACHE = 100000
+
 # HK2011 1st pass
 T1 = 0.3594
 # HK2011 2nd pass
@@ -13,12 +57,72 @@ T3 = 0.3674
 # Combined approach
 T4 = 0.3667
 
+# Benchmarks: number of sampled pairs, sampling seed, timing repeats, number
+# of test meanings clustered, and the largest latency ratio to the baseline
+# that is not reported as a regression.
+BENCHMARK_SAMPLE = 2000
+BENCHMARK_SEED = 0
+BENCHMARK_REPEATS = 3
+BENCHMARK_MEANINGS = 5
+BENCHMARK_TOLERANCE = 1.25
+
+# Number of test meanings clustered at each scale of the scaling benchmark.
+SCALING_MEANINGS = 10
+
+# Interval (in seconds) at which the scaling benchmark checks whether a scale
+# process died without a result.
+SCALING_POLL = 1.0
+
+# Environment variable naming the trace file. Stages are only instrumented if
+# it is set.
+TRACE_VARIABLE = "COGNATES_TRACE"
+
+# Clustering server address, and the load test defaults: numbers of entries
+# per request, requests per batch size, and concurrent clients.
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8000
+LOADTEST_SIZES = [5, 10, 20, 40, 80]
+LOADTEST_REQUESTS = 100
+LOADTEST_CONCURRENCY = 8
+
+# Default grid of the hyperparameter sweep: C values and clustering
+# thresholds.
+SWEEP_CS = [0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0]
+SWEEP_THRESHOLDS = [0.30, 0.325, 0.35, 0.375, 0.40, 0.425, 0.45, 0.475, 0.50]
+
+# Number of examples per chunk and number of passes over all chunks when
+# training a streaming model.
+STREAM_CHUNK = 50000
+STREAM_EPOCHS = 5
+
+# Number of examples whose edit operations are counted at once by a worker.
+EDIT_OPS_SHARD = 20000
+
+# Version of the code behind stored feature blocks. Blocks are keyed by a hash
+# of the source of the function that computed them and of this version, which
+# is raised when code those functions call changes (e.g., n-gram helpers or
+# preprocessing), so that stale blocks are never loaded.
+STORE_VERSION = 1
+
+# Version of the model artifact format. Artifacts of other versions are not
+# loaded.
+ARTIFACT_VERSION = 1
+
 
 # Data
 IN = "input/input.txt"
 POS = "input/POS.txt"
 DOLGO = "input/dolgo.txt"
 CONS = "input/consonants.txt"
+STORE = "store/"
+ARTIFACTS = "models/"
+SHARED_MEMORY = "/dev/shm"
+BENCHMARK_OUT = "benchmarks/results.json"
+BENCHMARK_BASELINE = "benchmarks/baseline.json"
+SCALING_DIRECTORY = "benchmarks/"
+SCALING_OUT = "benchmarks/scaling.json"
+SWEEP_OUT = "output/Sweep.tsv"
+EDIT_OPS_OUT = "output/EditOps.tsv"
 
 
 # Types
@@ -61,6 +165,10 @@ DOUBTFUL_COGNATION = 3
 # Datasets
 TRAIN = 0
 TEST = 1
+TABLE = 2
+
+# Extractor features and labels that can be placed in shared memory.
+SHARED_FEATURES = ["trainExamples", "trainLabels", "testExamples", "testLabels", "tableExamples", "tableLabels"]
 
 
 # Methods
@@ -78,6 +186,17 @@ DEDUCERS = ["Identical Words", "Identical Prefixes", "Identical First Letter"]
 MEASURES = ["Minimum Edit Distance", "Hauer & Kondrak, 2011"]
 MODELS = ["SVM", "Logistic Regression"]
 
+# Names of the minimal and combined approaches, under which their models are
+# saved (see output.pickleLearning).
+MINIMAL = "minimal"
+COMBINED = "combined"
+
+
+# Preprocessors
+RAW = "raw"
+CONSONANT = "consonant"
+SOUND_CLASS = "soundClass"
+
 
 # Edit operations
 EQUAL = "equal"
@@ -85,9 +204,15 @@ INSERT = "insert"
 DELETE = "delete"
 REPLACE = "replace"
 
+# Edit operation tables: one per language pair, or one per language group
+# pair.
+LANGUAGE_PAIR_TABLES = "languagePair"
+GROUP_PAIR_TABLES = "groupPair"
+
 
 # Classes
 TARGETS = ["Non-cognates", "Cognates"]
+CLASSES = [0, 1]
 
 
 # Letters
@@ -116,10 +241,26 @@ LANGUAGE_GROUPS = [
 	# Albanian subfamily (6)
 	range(80, 85) + [95]
 ]
+LANGUAGE_GROUP_NAMES = ["Celtic", "Romance", "Germanic", "Baltoslavic", "Indoaryan", "Greek", "Armenian", "Iranian", "Albanian"]
+
+# Language group id of languages outside all language groups (e.g., those of
+# other wordlists).
+UNGROUPED = len(LANGUAGE_GROUPS)
 
 
 # Formatting
 PICKLE_EXT = "pickles/ext{0}.pickle"
-PICKLE_LRN = "pickles/lrn{0}.pickle"
+STORE_BLOCK = "{0}.{1}.{2}.{3}.npy"
+STORE_MEASURE = "{0}-{1}"
+STREAM_MEASURE = "stream-{0}-{1}-{2}"
+ARTIFACT_STAGE = "stage{0}"
+ARTIFACT_MANIFEST = "manifest.json"
+ARTIFACT_ARRAY = "{0}.npy"
+RUNNER_PREFIX = "cognates-"
+RUNNER_LOG = "terminal.txt"
+SHARED_PREFIX = "cognates-"
+SHARED_ARRAY = "{0}.npy"
 REPORTING = "{0:30} {1:.4f}"
+INTERVAL = "{0:30} {1:.4f} [{2:.4f}, {3:.4f}]"
+INTERVAL_LABEL = "{0} ({1:g}% CI):"
 SIGNIFICANCE = "significance = {0:.5f}\n"
\ No newline at end of file
@@ -0,0 +1,144 @@
+from __future__ import division
+from collections import OrderedDict
+import multiprocessing
+import time
+
+import numpy
+
+import constants
+import learner
+import shared
+
+
+
+class CrossValidation:
+	### Initialization ###
+	# Initializes leave-one-family-out cross-validation. Each language group of
+	# constants.LANGUAGE_GROUPS is held out for testing in turn, and logistic
+	# regression is trained on the pairs of all other groups. The pair table
+	# (tbl, paired with Pairer.pairAll) and its features (ext.tableExamples)
+	# are split-independent, so they are computed once and only split for each
+	# fold. Test meanings of each fold are clustered with the given extractor
+	# function and threshold, and an optional blocker (see
+	# Extractor.getBlocker).
+	def __init__(self, rdr, tbl, ext, extractor, threshold, C, processes = None, blocker = None):
+		self.rdr = rdr
+		self.tbl = tbl
+		self.ext = ext
+		self.extractor = extractor
+		self.threshold = threshold
+		self.C = C
+		self.processes = processes or multiprocessing.cpu_count()
+		self.blocker = blocker
+
+		# For each fold: the held-out group, pair counts, scores and timings.
+		self.results = []
+
+
+	### Running ###
+	# Runs the given folds (all language groups by default) in a process pool.
+	# Returns one result per fold, in the order of the groups.
+	def run(self, groups = None):
+		groups = range(len(constants.LANGUAGE_GROUPS)) if groups is None else groups
+
+		global CROSS_VALIDATION
+		CROSS_VALIDATION = self
+
+		if self.processes < 2 or len(groups) < 2:
+			self.results = [runFold(group) for group in groups]
+			return self.results
+
+		# The pair table and its features are moved into shared memory, and
+		# each worker attaches to them by name. Workers thus map the same pages
+		# instead of copying every part of the table they touch.
+		arrays = shared.SharedArrays()
+		pool = None
+
+		try:
+			self.tbl.shareTable(arrays)
+			self.ext.shareFeatures(arrays)
+
+			pool = multiprocessing.Pool(min(self.processes, len(groups)), attachWorker, (arrays.name,))
+			self.results = pool.map(runFold, groups)
+		finally:
+			if pool:
+				pool.terminate()
+				pool.join()
+			arrays.unlink()
+
+		return self.results
+
+
+	# Runs a single fold: splits the pair table, trains on all other groups,
+	# evaluates pairwise predictions on the held-out group and clusters its
+	# wordforms.
+	def runFold(self, group):
+		start = time.time()
+
+		trainLanguages = [language for i, languages in enumerate(constants.LANGUAGE_GROUPS) if i != group for language in languages]
+		testLanguages = constants.LANGUAGE_GROUPS[group]
+		self.ext.splitTable(self.tbl.splitByLanguage(trainLanguages, testLanguages))
+		split = time.time()
+
+		# Learning
+		lrn = learner.Learner()
+		lrn.initLogisticRegression(self.C)
+		lrn.fitLogisticRegression(self.ext.trainExamples, self.ext.trainLabels)
+		predictions = lrn.predictLogisticRegression(self.ext.testExamples)
+		F1 = lrn.computeF1(self.ext.testLabels, predictions)
+		fit = time.time()
+
+		# Clustering
+		testMeanings = self.tbl.testMeanings
+		trueLabels = self.ext.extractGroupLabels(self.rdr.cognateSets, self.rdr.wordforms, testMeanings, testLanguages)
+		predictedLabels = lrn.cluster(constants.LR, self.threshold, self.rdr.wordforms, self.rdr.POSTags, testMeanings, testLanguages, self.extractor, self.blocker)[0]
+		V1 = numpy.mean(lrn.computeV1Scores(trueLabels, predictedLabels, testMeanings).values())
+		end = time.time()
+
+		return OrderedDict([
+			("group", constants.LANGUAGE_GROUP_NAMES[group]),
+			("languages", len(testLanguages)),
+			("trainPairs", len(self.ext.trainLabels)),
+			("testPairs", len(self.ext.testLabels)),
+			("F1", F1),
+			("V1", V1),
+			("splitSeconds", split - start),
+			("fitSeconds", fit - split),
+			("clusterSeconds", end - fit)
+		])
+
+
+	### Aggregation ###
+	# Averages pairwise F1 and cluster V1 over all folds, weighting every fold
+	# equally, and adds up the time spent on each step.
+	def aggregate(self):
+		return OrderedDict([
+			("F1", numpy.mean([result["F1"] for result in self.results])),
+			("F1std", numpy.std([result["F1"] for result in self.results])),
+			("V1", numpy.mean([result["V1"] for result in self.results])),
+			("V1std", numpy.std([result["V1"] for result in self.results])),
+			("splitSeconds", sum([result["splitSeconds"] for result in self.results])),
+			("fitSeconds", sum([result["fitSeconds"] for result in self.results])),
+			("clusterSeconds", sum([result["clusterSeconds"] for result in self.results]))
+		])
+
+
+
+### Parallel Workers ###
+# The cross-validation is set before the worker pool is created, so that
+# forked workers inherit it. Its pair table and features are replaced by
+# views of shared memory when each worker starts.
+CROSS_VALIDATION = None
+
+
+# Attaches a worker process to the pair table and features in the named
+# shared arrays.
+def attachWorker(name):
+	arrays = shared.SharedArrays(name)
+	CROSS_VALIDATION.tbl.attachTable(arrays)
+	CROSS_VALIDATION.ext.attachFeatures(arrays)
+
+
+# Runs a single fold in a worker process.
+def runFold(group):
+	return CROSS_VALIDATION.runFold(group)
@@ -0,0 +1,208 @@
+from __future__ import division
+
+import numpy
+
+import constants
+
+
+
+class Evaluator:
+	### Contingency Tables ###
+	# Builds a single sparse contingency table for any number of meanings. The
+	# labels of each meaning are renumbered and offset, so that the table is
+	# block diagonal with one block per meaning. Returns the non-zero cells
+	# (rows, columns, counts), the meaning of each row and column, and the
+	# number of items of each meaning.
+	def buildContingency(self, truths, predictions):
+		from scipy import sparse
+		
+		rows = []
+		columns = []
+		rowMeanings = []
+		columnMeanings = []
+
+		rowOffset = 0
+		columnOffset = 0
+
+		for k in range(len(truths)):
+			trueClasses, trueIndices = numpy.unique(numpy.asarray(truths[k]), return_inverse = True)
+			predictedClasses, predictedIndices = numpy.unique(numpy.asarray(predictions[k]), return_inverse = True)
+
+			rows.append(trueIndices + rowOffset)
+			columns.append(predictedIndices + columnOffset)
+			rowMeanings.append(numpy.repeat(k, len(trueClasses)))
+			columnMeanings.append(numpy.repeat(k, len(predictedClasses)))
+
+			rowOffset += len(trueClasses)
+			columnOffset += len(predictedClasses)
+
+		rows = numpy.concatenate(rows + [numpy.zeros(0, dtype = int)])
+		columns = numpy.concatenate(columns + [numpy.zeros(0, dtype = int)])
+
+		table = sparse.coo_matrix((numpy.ones(len(rows)), (rows, columns)), shape = (rowOffset, columnOffset)).tocsr().tocoo()
+		itemCounts = numpy.array([len(truth) for truth in truths], dtype = float)
+
+		return table, numpy.concatenate(rowMeanings + [numpy.zeros(0, dtype = int)]), numpy.concatenate(columnMeanings + [numpy.zeros(0, dtype = int)]), itemCounts
+
+
+	# Computes the row (true class) and column (predicted cluster) sizes of
+	# each non-zero cell of the table.
+	def computeMarginals(self, table):
+		rowSums = numpy.asarray(table.sum(axis = 1)).ravel()
+		columnSums = numpy.asarray(table.sum(axis = 0)).ravel()
+
+		return rowSums[table.row], columnSums[table.col], rowSums, columnSums
+
+
+	### Clustering Metrics ###
+	# Computes B-cubed precision, recall and F-1 (Amigo, Gonzalo, Artiles, &
+	# Verdejo, 2009) for each meaning. Every item in a cell of n items shares n
+	# items with both its true class and its predicted cluster, so the item
+	# averages reduce to sums of n^2 / (cluster or class size) over cells.
+	def computeB3(self, truths, predictions):
+		table, rowMeanings, columnMeanings, itemCounts = self.buildContingency(truths, predictions)
+		cellRowSums, cellColumnSums, rowSums, columnSums = self.computeMarginals(table)
+
+		cellMeanings = rowMeanings[table.row]
+		squares = table.data ** 2
+
+		P = self.divide(numpy.bincount(cellMeanings, weights = squares / cellColumnSums, minlength = len(truths)), itemCounts)
+		R = self.divide(numpy.bincount(cellMeanings, weights = squares / cellRowSums, minlength = len(truths)), itemCounts)
+		F = self.divide(2 * P * R, P + R)
+
+		return P, R, F
+
+
+	# Computes homogeneity, completeness and V-measure for each meaning, using
+	# the same definitions as scikit-learn (mutual information divided by the
+	# entropy of classes and of clusters respectively).
+	def computeVMeasures(self, truths, predictions):
+		table, rowMeanings, columnMeanings, itemCounts = self.buildContingency(truths, predictions)
+		cellRowSums, cellColumnSums, rowSums, columnSums = self.computeMarginals(table)
+
+		cellMeanings = rowMeanings[table.row]
+		cellItemCounts = itemCounts[cellMeanings]
+
+		# Mutual information of classes and clusters.
+		MI = numpy.bincount(cellMeanings, weights = table.data / cellItemCounts * numpy.log(cellItemCounts * table.data / (cellRowSums * cellColumnSums)), minlength = len(truths))
+
+		# Entropies of classes and clusters.
+		rowProbabilities = rowSums / itemCounts[rowMeanings]
+		columnProbabilities = columnSums / itemCounts[columnMeanings]
+		entropyC = -numpy.bincount(rowMeanings, weights = rowProbabilities * numpy.log(rowProbabilities), minlength = len(truths))
+		entropyK = -numpy.bincount(columnMeanings, weights = columnProbabilities * numpy.log(columnProbabilities), minlength = len(truths))
+
+		homogeneity = numpy.where(entropyC > 0, self.divide(MI, entropyC), 1.0)
+		completeness = numpy.where(entropyK > 0, self.divide(MI, entropyK), 1.0)
+		V1 = self.divide(2 * homogeneity * completeness, homogeneity + completeness)
+
+		return homogeneity, completeness, V1
+
+
+	### Pairwise Metrics ###
+	# Counts the examples misclassified by the first model only (c01) and by
+	# the second model only (c10), using the 2 x 2 contingency table of the
+	# correctness of the two models.
+	def computeMcNemarCounts(self, truth, predictions1, predictions2):
+		evals1 = (numpy.asarray(predictions1) == numpy.asarray(truth)).astype(int)
+		evals2 = (numpy.asarray(predictions2) == numpy.asarray(truth)).astype(int)
+
+		table = numpy.bincount(evals1 * 2 + evals2, minlength = 4).reshape((2, 2))
+
+		return int(table[0, 1]), int(table[1, 0])
+
+
+	# Counts true negatives, false positives, false negatives and true
+	# positives of binary predictions with a single bincount.
+	def computeConfusion(self, truth, predictions):
+		categories = (numpy.asarray(truth) == 1).astype(int) * 2 + (numpy.asarray(predictions) == 1).astype(int)
+		
+		return numpy.bincount(categories, minlength = 4).astype(float)
+	
+	
+	# Computes precision, recall, F1 and support of each class (non-cognates,
+	# then cognates) from the confusion counts.
+	def computePairwiseScores(self, truth, predictions):
+		TN, FP, FN, TP = self.computeConfusion(truth, predictions)
+		
+		support = numpy.array([TN + FP, TP + FN])
+		precision = self.divide(numpy.array([TN, TP]), numpy.array([TN + FN, TP + FP]))
+		recall = self.divide(numpy.array([TN, TP]), support)
+		F1 = self.divide(2 * precision * recall, precision + recall)
+		
+		return precision, recall, F1, support
+	
+	
+	# Formats a report of precision, recall, F1 and support for each class and
+	# their support-weighted averages, laid out as scikit-learn's
+	# classification report.
+	def formatPairwiseReport(self, truth, predictions, targetNames = constants.TARGETS):
+		precision, recall, F1, support = self.computePairwiseScores(truth, predictions)
+		
+		heading = "avg / total"
+		line = "%{0}s  ".format(max([len(name) for name in targetNames] + [len(heading)])) + " ".join(["% 9s"] * 4) + "\n"
+		
+		rows = [(targetNames[i], precision[i], recall[i], F1[i], support[i]) for i in range(len(targetNames))]
+		total = (heading, ) + tuple([numpy.average(scores, weights = support) if support.sum() else 0.0 for scores in (precision, recall, F1)]) + (support.sum(), )
+		
+		report = line % ("", "precision", "recall", "f1-score", "support") + "\n"
+		for row in rows + ["", total]:
+			report += line % (row[0], "{0:.2f}".format(row[1]), "{0:.2f}".format(row[2]), "{0:.2f}".format(row[3]), "{0:.0f}".format(row[4])) if row else "\n"
+		
+		return report
+	
+	
+	### Bootstrap ###
+	# Computes a bootstrap confidence interval for F1 of the positive class.
+	# Each example is reduced to its confusion category once. Replicates are
+	# drawn as matrices of example indices (one row per replicate, in chunks of
+	# bounded size), and the confusion counts of all replicates in a chunk come
+	# from a single bincount.
+	def bootstrapF1(self, truth, predictions, replicates = constants.BOOTSTRAPS, seed = 0):
+		categories = (numpy.asarray(truth) == 1).astype(int) * 2 + (numpy.asarray(predictions) == 1).astype(int)
+		exampleCount = len(categories)
+		
+		random = numpy.random.RandomState(seed)
+		chunkSize = max(1, constants.BOOTSTRAP_CELLS // max(1, exampleCount))
+		
+		counts = []
+		for start in range(0, replicates, chunkSize):
+			size = min(chunkSize, replicates - start)
+			indices = random.randint(0, exampleCount, size = (size, exampleCount))
+			codes = categories[indices] + 4 * numpy.arange(size)[:, numpy.newaxis]
+			counts.append(numpy.bincount(codes.ravel(), minlength = 4 * size).reshape((size, 4)))
+		
+		counts = numpy.vstack(counts + [numpy.bincount(categories, minlength = 4).reshape((1, 4))]).astype(float)
+		
+		# Category 1: false positive, 2: false negative, 3: true positive.
+		F1 = self.divide(2 * counts[:, 3], 2 * counts[:, 3] + counts[:, 1] + counts[:, 2])
+		
+		return self.computeInterval(F1[-1], F1[: -1])
+	
+	
+	# Computes a bootstrap confidence interval for the average of per-meaning
+	# scores (e.g., V1) by resampling meanings.
+	def bootstrapMean(self, scores, replicates = constants.BOOTSTRAPS, seed = 0):
+		scores = numpy.asarray(scores, dtype = float)
+		
+		indices = numpy.random.RandomState(seed).randint(0, len(scores), size = (replicates, len(scores)))
+		
+		return self.computeInterval(scores.mean(), scores[indices].mean(axis = 1))
+	
+	
+	# Computes the percentile interval of bootstrap replicates, returns it
+	# together with the statistic computed on the original data.
+	def computeInterval(self, statistic, replicates):
+		tail = (1 - constants.CONFIDENCE) / 2 * 100
+		lower, upper = numpy.percentile(replicates, [tail, 100 - tail])
+		
+		return statistic, lower, upper
+
+
+	### Formatting ###
+	# Divides two arrays elementwise, returning 0 where the denominator is 0.
+	def divide(self, numerators, denominators):
+		result = numpy.zeros(numpy.shape(numerators))
+		numpy.divide(numerators, denominators, out = result, where = denominators != 0)
+
+		return result
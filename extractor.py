@@ -1,12 +1,16 @@
 from __future__ import division
 from collections import OrderedDict
+import hashlib
+import json
 import math
+import multiprocessing
 import os
 
 import Levenshtein
 import numpy
 
 import constants
+import tracer
 
 
 
@@ -29,9 +33,25 @@ class Extractor:
 		self.trainLabels = []
 		self.testExamples = []
 		self.testLabels = []
+		
+		# A split-independent feature table for all pairs in the data.
+		self.tableExamples = []
+		self.tableLabels = []
 	
 		self.consonantPrep = None
 		self.soundClassPrep = None
+		
+		# Counts of all and positive training decisions for each language pair,
+		# the sorted language indices whose positions index the counts, and the
+		# column of the training set that holds the decision-based language
+		# similarity feature.
+		self.decisionCounts = numpy.zeros((2, 0, 0))
+		self.decisionLanguages = numpy.zeros(0, dtype = int)
+		self.similarityColumn = None
+		
+		# An optional on-disk feature store. When set, word similarity features
+		# are loaded from the store if they have been computed before.
+		self.store = None
 	
 	
 	# Resets training and test features. Allows using the same object multiple
@@ -42,6 +62,9 @@ class Extractor:
 		
 		self.testExamples = []
 		self.testLabels = []
+		
+		self.tableExamples = []
+		self.tableLabels = []
 	
 	
 	### Pairwise Methods ###
@@ -182,9 +205,90 @@ class Extractor:
 		return numpy.array(example)
 	
 	
+	### Feature Layout ###
+	# Describes the features of the minimal approach as a list of feature
+	# groups that can be stored with a model and compiled back into an
+	# extractor.
+	def getMinimalLayout(self, POSTags):
+		return [self.describeMeasures(self.minimalMeasures), self.describePOSTags(POSTags)]
+	
+	
+	# Describes the features of the combined approach.
+	def getCombinedLayout(self, POSTags):
+		return [
+			self.describeMeasures([self.commonBigramRatio, self.commonTrigramNumber, self.bigramDice, self.jaroDistance]),
+			self.describeMeasures([self.identicalWords], self.consonantPrep),
+			self.describeMeasures([self.LCPLength, self.commonBigramNumber, self.identicalPrefix], self.soundClassPrep),
+			self.describePOSTags(POSTags),
+			{"type": "letters"},
+			{"type": "sameLanguageGroup", "groups": constants.LANGUAGE_GROUPS}
+		]
+	
+	
+	# Describes a group of word similarity measures applied to preprocessed
+	# wordforms.
+	def describeMeasures(self, tests, preprocessor = None):
+		return {"type": "measures", "measures": [test.__name__ for test in tests], "preprocessor": self.getPreprocessorName(preprocessor)}
+	
+	
+	# Describes binary POS tag features: the order of the tags, and the tag of
+	# each meaning.
+	def describePOSTags(self, POSTags):
+		return {"type": "POSTags", "tags": sorted(list(set(POSTags.values()))), "meanings": {str(meaningIndex): tag for meaningIndex, tag in POSTags.iteritems()}}
+	
+	
+	# Compiles a feature layout into an extractor with the usual extractor
+	# signature. POS tags are taken from the layout rather than the POSTags
+	# argument, so that the extractor matches the features a model was
+	# trained on.
+	def compileExtractor(self, layout):
+		groups = [self.compileGroup(group) for group in layout]
+		
+		def extractor(form1, form2, languages, language1, language2, meaningIndex, POSTags = None):
+			example = []
+			for group in groups:
+				example.extend(group(form1, form2, language1, language2, meaningIndex))
+			return numpy.array(example)
+		
+		return extractor
+	
+	
+	# Compiles a single feature group into a function of a word pair.
+	def compileGroup(self, group):
+		if group["type"] == "measures":
+			tests = [getattr(self, name) for name in group["measures"]]
+			preprocessor = self.getPreprocessor(group["preprocessor"])
+			
+			if preprocessor:
+				return lambda form1, form2, language1, language2, meaningIndex: [test(self.preprocess(form1, preprocessor), self.preprocess(form2, preprocessor)) for test in tests]
+			return lambda form1, form2, language1, language2, meaningIndex: [test(form1, form2) for test in tests]
+		
+		elif group["type"] == "POSTags":
+			POSTags = {int(meaningIndex): tag for meaningIndex, tag in group["meanings"].iteritems()}
+			return lambda form1, form2, language1, language2, meaningIndex: self.examplePOSTagFeature(POSTags, meaningIndex)
+		
+		elif group["type"] == "letters":
+			def letters(form1, form2, language1, language2, meaningIndex):
+				operations = self.exampleLetterFeature(form1, form2)
+				return operations[numpy.triu_indices_from(operations)]
+			return letters
+		
+		elif group["type"] == "sameLanguageGroup":
+			languageGroups = {language: i for i, languages in enumerate(group["groups"]) for language in languages}
+			return lambda form1, form2, language1, language2, meaningIndex: [self.exampleSameLanguageGroupFeature(languageGroups, language1, language2)]
+		
+		elif group["type"] == "languagePairs":
+			languages = group["languages"]
+			return lambda form1, form2, language1, language2, meaningIndex: self.exampleBinaryLanguageFeature(languages, language1, language2)
+		
+		raise ValueError("Unknown feature group: {0}".format(group["type"]))
+	
+	
 	### POS Tags ###
 	# Appends binary POS tag features to each examples. POS tags are decided
 	# based on the English meaning rather than the particular language word.
+	# Meanings without a POS tag have none of the features set.
+	@tracer.traced("extractor.appendPOSTags", "pairs extracted", tracer.countExamples)
 	def appendPOSTags(self, allExamples, allLabels, POSTags):
 		tags = sorted(list(set(POSTags.values())))
 		
@@ -192,59 +296,87 @@ class Extractor:
 			tagFeatures = numpy.zeros((len(allExamples[purpose]), len(tags)))
 			
 			for i, (form1, form2, language1, language2, meaningIndex) in enumerate(examples):
-				tagIndex = tags.index(POSTags[meaningIndex])
-				tagFeatures[i, tagIndex] = 1.0
+				if meaningIndex in POSTags:
+					tagFeatures[i, tags.index(POSTags[meaningIndex])] = 1.0
 			
 			self.stackExamples(purpose, tagFeatures)
 			self.setLabels(purpose, numpy.array(allLabels[purpose]))
 
 
 	# Given a single example, generates a set of binary POS tag features.
+	# Meanings without a POS tag (e.g., those beyond input/POS.txt in larger
+	# wordlists) have none of the features set.
 	def examplePOSTagFeature(self, POSTags, meaningIndex):
 		tags = sorted(list(set(POSTags.values())))
 		tagFeatures = [0.0] * len(tags)
-		tagFeatures[tags.index(POSTags[meaningIndex])] = 1.0
+		if meaningIndex in POSTags:
+			tagFeatures[tags.index(POSTags[meaningIndex])] = 1.0
 	
 		return tagFeatures
 
 	
 	### Language Similarity ###
 	# Extracts the necessary language similarity values from the language
-	# similarity matrix, appends the new feature to the existing test set.
-	def appendTestLanguageSimilarities(self, predictedSimilarities, allExamples):
-		similarityFeature = []
-		
-		for i, (form1, form2, language1, language2, meaningIndex) in enumerate(allExamples[constants.TEST]):
-			similarityFeature.append(predictedSimilarities[language1][language2])
+	# similarity matrix, appends the new feature to the existing test set. The
+	# matrix is indexed by positions in the sorted similarityLanguages.
+	@tracer.traced("extractor.appendTestLanguageSimilarities", "pairs extracted", tracer.countDataset(constants.TEST))
+	def appendTestLanguageSimilarities(self, predictedSimilarities, similarityLanguages, allExamples):
+		languageIds = numpy.searchsorted(similarityLanguages, self.getLanguagePairs(allExamples[constants.TEST]))
+		similarityFeature = numpy.asarray(predictedSimilarities)[languageIds[:, 0], languageIds[:, 1]]
 		
-		self.testExamples = numpy.hstack((self.testExamples, numpy.array(similarityFeature)))
+		self.testExamples = numpy.column_stack((self.testExamples, similarityFeature))
 	
 	
 	# Measures language similarity as a fraction of positive examples to all
 	# examples for each language pair in the training set.
+	@tracer.traced("extractor.appendTrainLanguageSimilarities", "pairs extracted", tracer.countDataset(constants.TRAIN))
 	def appendTrainLanguageSimilarities(self, allExamples):
-		decisionCounts = self.countTrainDecisions(allExamples)
-		decisionSimilarities = self.computeTrainLanguageSimilarity(allExamples, decisionCounts)
+		self.countTrainDecisions(allExamples)
+		decisionSimilarities = self.computeTrainLanguageSimilarity(allExamples)
 		
-		self.trainExamples = numpy.column_stack((self.trainExamples, numpy.array(decisionSimilarities)))
+		self.trainExamples = numpy.column_stack((self.trainExamples, decisionSimilarities))
+		self.similarityColumn = self.trainExamples.shape[1] - 1
+	
+	
+	# Recomputes the decision-based language similarity feature of every
+	# training example from the current decision counts (e.g., after new
+	# labelled examples were added with updateTrainDecisions, and their rows
+	# stacked onto the training set).
+	def refreshTrainLanguageSimilarities(self, allExamples):
+		self.trainExamples[:, self.similarityColumn] = self.computeTrainLanguageSimilarity(allExamples)
 	
 	
 	# For each example, adds a set of binary language pair features. All
 	# features are 0 except for a single feature that corresponds to the
 	# example's language pair. That feature is set to 1. Used in Hauer &
-	# Kondrak, 2011.
+	# Kondrak, 2011. Languages are identified by their position in the given
+	# list, and feature indices of all examples are computed at once. The
+	# features are a sparse matrix, as they grow with the square of the
+	# number of languages, and the examples they extend become sparse too.
+	@tracer.traced("extractor.appendBinaryLanguageFeatures", "pairs extracted", tracer.countPurposeExamples)
 	def appendBinaryLanguageFeatures(self, allExamples, allLabels, purpose, languages):
-		languageFeatures = [[] for i in range(len(allExamples[purpose]))]
+		from scipy import sparse
+		
+		positions = {language: i for i, language in enumerate(languages)}
+		languagePairs = self.getLanguagePairs(allExamples[purpose])
+		
+		ids = numpy.array([positions[language] for language in languagePairs.ravel()], dtype = int).reshape((-1, 2))
+		index1 = ids.min(axis = 1)
+		index2 = ids.max(axis = 1)
 		
-		for i, (form1, form2, language1, language2, meaningIndex) in enumerate(allExamples[purpose]):
-			languageFeatures[i] = self.exampleBinaryLanguageFeature(languages, language1, language2)
+		count = len(languages)
+		rows = numpy.flatnonzero(index1 != index2)
 		
-		self.stackExamples(purpose, numpy.array(languageFeatures))
+		columns = self.computeIndices(count, index1[rows], index2[rows])
+		languageFeatures = sparse.csr_matrix((numpy.ones(len(rows)), (rows, columns)), shape = (len(ids), count * (count - 1) // 2))
+		
+		self.stackExamples(purpose, languageFeatures)
 		self.setLabels(purpose, numpy.array(allLabels[purpose]))
 	
 	
 	# Adds s single binary feature to each example. 1 indicates that the two
 	# words come from closely related languages.
+	@tracer.traced("extractor.appendSameLanguageGroupFeatures", "pairs extracted", tracer.countExamples)
 	def appendSameLanguageGroupFeatures(self, allExamples, allLabels):
 		languageGroups = self.getLanguageGroups()
 		
@@ -259,9 +391,13 @@ class Extractor:
 	
 
 	# Given a single example, returns 1.0 if the two words in the example belong
-	# to languages of the same language group.
+	# to languages of the same language group. Languages outside all groups
+	# (see constants.UNGROUPED) are not related to any language.
 	def exampleSameLanguageGroupFeature(self, languageGroups, language1, language2):
-		return 1.0 if languageGroups[language1] == languageGroups[language2] else 0.0
+		group1 = languageGroups.get(language1, constants.UNGROUPED)
+		group2 = languageGroups.get(language2, constants.UNGROUPED)
+		
+		return 1.0 if group1 == group2 and group1 != constants.UNGROUPED else 0.0
 	
 	
 	# Formats language group information.
@@ -272,46 +408,94 @@ class Extractor:
 				languageGroups[language] = i
 
 		return languageGroups
+	
+	
+	# Returns the language group of each language in an array, or
+	# constants.UNGROUPED for languages outside all groups.
+	def getLanguageGroupIds(self, languages):
+		languages = numpy.asarray(languages, dtype = int)
+		languageGroups = self.getLanguageGroups()
+		
+		lookup = numpy.full(max(languages.max() if languages.size else 0, max(languageGroups)) + 1, constants.UNGROUPED, dtype = int)
+		lookup[languageGroups.keys()] = languageGroups.values()
+		
+		return lookup[languages]
 
 
 	# Given a single example, generates a set of binary language pair features.
+	# Languages are identified by their position in the languages list.
 	def exampleBinaryLanguageFeature(self, languages, language1, language2):
-		languageMatrix = numpy.zeros((len(languages), len(languages)))
-		languageMatrix[language1 - 1][language2 - 1] = 1.0
-		languageMatrix[language2 - 1][language1 - 1] = 1.0
+		count = len(languages)
+		languageFeature = numpy.zeros(count * (count - 1) // 2)
+		
+		index1, index2 = self.getLanguageIndices(languages, language1, language2)
+		if index1 != index2:
+			languageFeature[self.computeIndex(count, index1, index2)] = 1.0
 		
-		indices = numpy.triu_indices_from(languageMatrix, 1)
-		return numpy.asarray(languageMatrix[indices])
+		return languageFeature
 
 
 	# Uses the training dataset to count positive and all cognateness decisions
-	# for language pairs present in the data.
+	# for language pairs present in the data. Counts are stored in a 2 x L x L
+	# array, where L is the number of languages in the training set, indexed by
+	# dense language ids (positions in decisionLanguages).
 	def countTrainDecisions(self, allExamples):
-		decisionCounts = {}
+		self.decisionCounts = numpy.zeros((2, 0, 0))
+		self.decisionLanguages = numpy.zeros(0, dtype = int)
 		
-		for i, (form1, form2, language1, language2, meaningIndex) in enumerate(allExamples[constants.TRAIN]):
-			if language1 not in decisionCounts:
-				decisionCounts[language1] = {}
-			if language2 not in decisionCounts[language1]:
-				decisionCounts[language1][language2] = [0, 0]
-			
-			decisionCounts[language1][language2][0] += 1
+		self.addDecisionCounts(allExamples[constants.TRAIN], self.trainLabels)
+
+
+	# Adds newly labelled training examples to the existing decision counts,
+	# so that the language similarity feature can be kept current without
+	# recounting all training examples.
+	def updateTrainDecisions(self, examples, labels):
+		self.addDecisionCounts(examples, labels)
+
+
+	# Counts all and positive decisions of the given examples with a single
+	# bincount over encoded language pair ids, adds them to the decision
+	# counts. If the examples contain unseen languages, the languages are
+	# merged and existing counts are moved to their new ids.
+	def addDecisionCounts(self, examples, labels):
+		languagePairs = self.getLanguagePairs(examples)
+		languages = numpy.union1d(self.decisionLanguages, languagePairs.ravel()).astype(int)
+		size = len(languages)
+		
+		if size > len(self.decisionLanguages):
+			positions = numpy.searchsorted(languages, self.decisionLanguages)
+			grown = numpy.zeros((2, size, size))
+			grown[:, positions[:, numpy.newaxis], positions] = self.decisionCounts
 			
-			if self.trainLabels[i] == 1:
-				decisionCounts[language1][language2][1] += 1
-	
-		return decisionCounts
+			self.decisionCounts = grown
+			self.decisionLanguages = languages
+		
+		languageIds = numpy.searchsorted(languages, languagePairs)
+		pairIds = languageIds[:, 0] * size + languageIds[:, 1]
+		positives = (numpy.asarray(labels) == 1).astype(float)
+		
+		self.decisionCounts[0] += numpy.bincount(pairIds, minlength = size * size).reshape((size, size))
+		self.decisionCounts[1] += numpy.bincount(pairIds, weights = positives, minlength = size * size).reshape((size, size))
 
 
 	# Once all decisions are counted, computes decision-based language pair
-	# similarity using counts of positive and all decisions.
-	def computeTrainLanguageSimilarity(self, allExamples, decisionCounts):
-		decisionSimilarities = []
+	# similarity using counts of positive and all decisions. The ratios are
+	# broadcast back to the examples by indexing with their language ids.
+	def computeTrainLanguageSimilarity(self, allExamples):
+		languageIds = numpy.searchsorted(self.decisionLanguages, self.getLanguagePairs(allExamples[constants.TRAIN]))
 		
-		for i, (form1, form2, language1, language2, meaningIndex) in enumerate(allExamples[constants.TRAIN]):
-			decisionSimilarities.append(decisionCounts[language1][language2][1] / decisionCounts[language1][language2][0])
+		allCounts = self.decisionCounts[0][languageIds[:, 0], languageIds[:, 1]]
+		positiveCounts = self.decisionCounts[1][languageIds[:, 0], languageIds[:, 1]]
 
-		return decisionSimilarities
+		return positiveCounts / allCounts
+	
+	
+	# Collects the language pair of each example into an N x 2 array.
+	def getLanguagePairs(self, examples):
+		languages1 = numpy.fromiter((example[2] for example in examples), int, len(examples))
+		languages2 = numpy.fromiter((example[3] for example in examples), int, len(examples))
+		
+		return numpy.column_stack((languages1, languages2))
 	
 	
 	# Computes the index of a language pair in a binary language pair feature
@@ -323,6 +507,12 @@ class Extractor:
 		return int((count * (count - 1) / 2) - ((count - index1) * (count - index1 - 1) / 2) + (index2 - index1) - 1)
 	
 	
+	# Computes the indices of many language pairs at once, given arrays of
+	# first and second language positions (index1 < index2).
+	def computeIndices(self, count, index1, index2):
+		return (count * (count - 1) - (count - index1) * (count - index1 - 1)) // 2 + (index2 - index1) - 1
+	
+	
 	# Counts possible language pairs.
 	def countLanguageFeatures(self, languages):
 		return int(len(languages) * (len(languages) + 1) / 2)
@@ -342,34 +532,174 @@ class Extractor:
 
 	### Edit Operations ###
 	# Extracts all edit operations (insertions, deletions, replacements and
-	# matches) from positive training examples, stores counts in a matrix.
-	def extractEditOps(self, allExamples, allLabels):
+	# matches) from positive training examples, stores counts in a matrix. With
+	# tables set to constants.LANGUAGE_PAIR_TABLES or
+	# constants.GROUP_PAIR_TABLES, returns separate matrices for each language
+	# pair or language group pair instead (see accumulateEditOps).
+	@tracer.traced("extractor.extractEditOps")
+	def extractEditOps(self, allExamples, allLabels, tables = None, processes = None):
+		examples = [example for example, label in zip(allExamples[constants.TRAIN], allLabels[constants.TRAIN]) if label == 1]
+		
+		return self.accumulateEditOps(examples, tables, processes)
+	
+	
+	# Sums the edit operations of all examples into correspondence tables:
+	# a single matrix, or an ordered dictionary of matrices keyed by sorted
+	# language pair or language group pair, depending on tables. The examples
+	# are split into shards, each counted over the flat cell indices of all its
+	# operations; shards are counted in a process pool. Each shard returns only
+	# the cells it hit, which are added up here, so that no shard sends back a
+	# full set of mostly empty tables.
+	def accumulateEditOps(self, examples, tables = None, processes = None):
+		processes = processes or multiprocessing.cpu_count()
+		keys = self.getEditOpKeys(examples, tables)
+		tableKeys, firstIndices, tableIndices = numpy.unique(keys[:, 0] * (keys[:, 1].max() + 1) + keys[:, 1], return_index = True, return_inverse = True) if len(examples) else (numpy.zeros(1, dtype = int), numpy.zeros(1, dtype = int), numpy.zeros(0, dtype = int))
+		shards = [(start, start + constants.EDIT_OPS_SHARD) for start in range(0, len(examples), constants.EDIT_OPS_SHARD)]
+		
+		global EDIT_OPS
+		EDIT_OPS = (self, examples, tableIndices)
+		
+		# The pool is forked after the examples are paired, so that workers
+		# share them instead of receiving copies.
+		pool = multiprocessing.Pool(min(processes, len(shards))) if processes > 1 and len(shards) > 1 else None
+		
+		try:
+			counts = pool.map(countEditOpsShard, shards) if pool else [countEditOpsShard(shard) for shard in shards]
+		finally:
+			if pool:
+				pool.terminate()
+				pool.join()
+		
 		dimensions = constants.LAST - constants.FIRST + 3
-		operations = numpy.zeros((dimensions, dimensions))
+		operations = numpy.zeros(len(tableKeys) * dimensions * dimensions)
 		
-		for index, label in enumerate(allLabels[constants.TRAIN]):
-			if label == 1:
-				(form1, form2, language1, language2, meaningIndex) = allExamples[constants.TRAIN][index]
-				operations = numpy.add(operations, self.exampleLetterFeature(form1, form2))
-
-		return operations
+		# Cells are unique within each shard.
+		for cells, cellCounts in counts:
+			operations[cells] += cellCounts
+		
+		operations = operations.reshape((len(tableKeys), dimensions, dimensions))
+		
+		if not tables:
+			return operations[0]
+		
+		return OrderedDict([(tuple(keys[index]), operations[i]) for i, index in enumerate(firstIndices) if index < len(keys)])
+	
+	
+	# Returns the correspondence table key of each example: the sorted
+	# language pair, the sorted language group pair, or 0 for a single table.
+	def getEditOpKeys(self, examples, tables = None):
+		languages = numpy.array([(example[2], example[3]) for example in examples], dtype = int).reshape((-1, 2))
+		
+		if tables == constants.LANGUAGE_PAIR_TABLES:
+			return numpy.sort(languages, axis = 1)
+		elif tables == constants.GROUP_PAIR_TABLES:
+			return numpy.sort(self.getLanguageGroupIds(languages), axis = 1)
+		
+		return numpy.zeros_like(languages)
+	
+	
+	# Counts the edit operations of examples into tableCount correspondence
+	# tables, each example into the table given by its table index.
+	def countEditOps(self, examples, tableIndices, tableCount):
+		dimensions = constants.LAST - constants.FIRST + 3
+		cells = self.getEditOpCells(examples, tableIndices)
+		
+		return numpy.bincount(cells, minlength = tableCount * dimensions * dimensions).reshape((tableCount, dimensions, dimensions)).astype(float)
+	
+	
+	# Counts the edit operations of examples like countEditOps, but returns
+	# only the cells that occur: their flat indices into the tables and their
+	# counts.
+	def countEditOpCells(self, examples, tableIndices):
+		return numpy.unique(self.getEditOpCells(examples, tableIndices), return_counts = True)
+	
+	
+	# Returns the flat index of each edit operation of examples into the
+	# correspondence tables, each example counted into the table given by its
+	# table index.
+	def getEditOpCells(self, examples, tableIndices):
+		dimensions = constants.LAST - constants.FIRST + 3
+		first, second, rows = self.collectEditOps(examples)
+		
+		return (numpy.asarray(tableIndices, dtype = int)[rows] * dimensions + first) * dimensions + second
+	
+	
+	# Aligns the two forms of each example, returns the flat letter index
+	# arrays of all edit operations (as counted by exampleLetterFeature), and
+	# the example each operation belongs to. Only the operation spans are
+	# collected per example; letters are looked up for all of them at once.
+	def collectEditOps(self, examples):
+		spans = {tag: [] for tag in [constants.EQUAL, constants.REPLACE, constants.DELETE, constants.INSERT]}
+		forms1 = []
+		forms2 = []
+		offset1 = 0
+		offset2 = 0
+		
+		for index, example in enumerate(examples):
+			form1, form2 = example[0], example[1]
+			
+			for (tag, i, j, m, n) in Levenshtein.opcodes(form1, form2):
+				spans[tag].append((offset1 + i, offset2 + m, max(j - i, n - m), index))
+			
+			forms1.append(form1)
+			forms2.append(form2)
+			offset1 += len(form1)
+			offset2 += len(form2)
+		
+		letters1 = self.getLetterIndices("".join(forms1))
+		letters2 = self.getLetterIndices("".join(forms2))
+		nothing = constants.LAST - constants.FIRST + 2
+		
+		equal1, equal2, equalRows = self.expandSpans(spans[constants.EQUAL])
+		replace1, replace2, replaceRows = self.expandSpans(spans[constants.REPLACE])
+		delete1, delete2, deleteRows = self.expandSpans(spans[constants.DELETE])
+		insert1, insert2, insertRows = self.expandSpans(spans[constants.INSERT])
+		
+		# Matches are counted once, on the diagonal; all other operations in
+		# both directions. Insertions and deletions pair a letter with nothing.
+		first = numpy.concatenate((letters1[equal1], letters1[replace1], letters2[replace2], letters1[delete1], numpy.full(len(delete1), nothing, dtype = int), letters2[insert2], numpy.full(len(insert2), nothing, dtype = int)))
+		second = numpy.concatenate((letters1[equal1], letters2[replace2], letters1[replace1], numpy.full(len(delete1), nothing, dtype = int), letters1[delete1], numpy.full(len(insert2), nothing, dtype = int), letters2[insert2]))
+		rows = numpy.concatenate((equalRows, replaceRows, replaceRows, deleteRows, deleteRows, insertRows, insertRows))
+		
+		return first, second, rows
+	
+	
+	# Expands (start1, start2, length, row) operation spans into the positions
+	# of every letter they cover in both forms, and the row of each letter.
+	def expandSpans(self, spans):
+		spans = numpy.array(spans, dtype = int).reshape((-1, 4))
+		lengths = spans[:, 2]
+		steps = numpy.arange(lengths.sum()) - numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+		
+		return numpy.repeat(spans[:, 0], lengths) + steps, numpy.repeat(spans[:, 1], lengths) + steps, numpy.repeat(spans[:, 3], lengths)
+	
+	
+	# Maps each character of a string to its letter index; characters other
+	# than letters (e.g., spaces or sound classes) share the space index.
+	def getLetterIndices(self, string):
+		codes = numpy.frombuffer(string, dtype = numpy.uint8).astype(int) if string else numpy.zeros(0, dtype = int)
+		
+		return numpy.where((codes >= constants.FIRST) & (codes <= constants.LAST), codes - constants.FIRST, constants.LAST - constants.FIRST + 1)
 	
 	
-	# For each example, appends a set of letter correspondence features.
+	# For each example, appends a set of letter correspondence features. The
+	# edit operations of each batch of examples are counted at once.
+	@tracer.traced("extractor.appendLetterFeatures", "pairs extracted", tracer.countExamples)
 	def appendLetterFeatures(self, allExamples, allLabels, preprocessor = None):
+		dimensions = constants.LAST - constants.FIRST + 3
+		rows, columns = numpy.triu_indices(dimensions)
+		
 		for purpose, examples in allExamples.iteritems():
-			letterFeatures = []
+			letterFeatures = numpy.zeros((len(examples), len(rows)))
+			
+			for start in range(0, len(examples), constants.BATCH_SIZE):
+				batch = examples[start : start + constants.BATCH_SIZE]
 				
-			for index, (form1, form2, language1, language2, meaningIndex) in enumerate(examples):
 				if preprocessor:
-					form1 = self.preprocess(form1, preprocessor)
-					form2 = self.preprocess(form2, preprocessor)
+					batch = [(self.preprocess(form1, preprocessor), self.preprocess(form2, preprocessor)) for (form1, form2, language1, language2, meaningIndex) in batch]
 				
-				operations = self.exampleLetterFeature(form1, form2)
-				indices = numpy.triu_indices_from(operations)
-				letterFeatures.append(numpy.asarray(operations[indices]))
-
-			letterFeatures = numpy.array(letterFeatures)
+				operations = self.countEditOps(batch, numpy.arange(len(batch)), len(batch))
+				letterFeatures[start : start + len(batch)] = operations[:, rows, columns]
 			
 			self.stackExamples(purpose, letterFeatures)
 			self.setLabels(purpose, numpy.array(allLabels[purpose]))
@@ -377,6 +707,7 @@ class Extractor:
 
 	# For each example, appends a set of letter correspondence features. Letter
 	# correspondences are not global, but rather language-group specific.
+	@tracer.traced("extractor.appendGroupLetterFeatures", "pairs extracted", tracer.countExamples)
 	def appendGroupLetterFeatures(self, allExamples, allLabels):
 		groupCount = len(constants.LANGUAGE_GROUPS)
 		groupPairCount = int(groupCount * (groupCount + 1) / 2)
@@ -411,53 +742,44 @@ class Extractor:
 	
 
 	# Given two words, extracts all letter correspondence features by aligning
-	# the two forms.
+	# the two forms. Adds one dimension for a space, and another for nothing
+	# (i.e., insertion/deletion). The flat matrix cells of all operations are
+	# counted with a single bincount; for a single pair, collecting them
+	# without NumPy (unlike collectEditOps) is faster.
 	def exampleLetterFeature(self, form1, form2):
-		# Adds one dimensions for a space, and another for nothing (i.e.,
-		# insertion/deletion).
 		dimensions = constants.LAST - constants.FIRST + 3
 		space = dimensions - 2
 		nothing = dimensions - 1
 		
-		operations = numpy.zeros((dimensions, dimensions))
-
+		letters1 = [ord(char) - constants.FIRST if constants.FIRST <= ord(char) <= constants.LAST else space for char in form1]
+		letters2 = [ord(char) - constants.FIRST if constants.FIRST <= ord(char) <= constants.LAST else space for char in form2]
+		cells = []
+		
 		for (tag, i, j, m, n) in Levenshtein.opcodes(form1, form2):
-			# Insertion.
-			if tag == constants.INSERT:
-				for o in range(m, n):
-					letter = ord(form2[o]) - constants.FIRST if ord(form2[o]) >= constants.FIRST else space
-					operations[nothing][letter] += 1
-					operations[letter][nothing] += 1
-		
-			# Deletion, equality, or replacement.
+			if tag == constants.EQUAL:
+				cells.extend([letter * dimensions + letter for letter in letters1[i : j]])
+			elif tag == constants.REPLACE:
+				cells.extend([letter1 * dimensions + letter2 for letter1, letter2 in zip(letters1[i : j], letters2[m : n])])
+				cells.extend([letter2 * dimensions + letter1 for letter1, letter2 in zip(letters1[i : j], letters2[m : n])])
 			else:
-				o = m
-				for k in range(i, j):
-					if tag == constants.DELETE:
-						letter = ord(form1[k]) - constants.FIRST if ord(form1[k]) >= constants.FIRST else space
-						operations[nothing][letter] += 1
-						operations[letter][nothing] += 1
-				
-					elif tag == constants.EQUAL:
-						letter = ord(form1[k]) - constants.FIRST if ord(form1[k]) >= constants.FIRST else space
-						operations[letter][letter] += 1
-						
-					elif tag == constants.REPLACE:
-						letter1 = ord(form1[k]) - constants.FIRST if ord(form1[k]) >= constants.FIRST else space
-						letter2 = ord(form2[o]) - constants.FIRST if ord(form2[o]) >= constants.FIRST else space
-						operations[letter1][letter2] += 1
-						operations[letter2][letter1] += 1
+				letters = letters1[i : j] if tag == constants.DELETE else letters2[m : n]
+				cells.extend([nothing * dimensions + letter for letter in letters])
+				cells.extend([letter * dimensions + nothing for letter in letters])
 		
-					o += 1
-
-		return operations
+		return numpy.bincount(cells, minlength = dimensions * dimensions).reshape((dimensions, dimensions)).astype(float)
 	
 	
 	### Feature Extraction ###
 	# Uses the provided test function to compare wordforms in each word pair and
 	# assign a value based on the comparison.
+	@tracer.traced("extractor.appendWordSimilarityFeatures", "pairs extracted", tracer.countExamples)
 	def appendWordSimilarityFeatures(self, allExamples, allLabels, tests, preprocessor = None):
 		for purpose, examples in allExamples.iteritems():
+			if self.store and len(examples) > 0:
+				self.stackExamples(purpose, self.storedWordSimilarityFeatures(examples, purpose, tests, preprocessor))
+				self.setLabels(purpose, numpy.array(allLabels[purpose]))
+				continue
+			
 			wordFeatures = []
 			
 			for i, (form1, form2, language1, language2, meaningIndex) in enumerate(examples):
@@ -472,19 +794,111 @@ class Extractor:
 			self.setLabels(purpose, numpy.array(allLabels[purpose]))
 	
 
+	# Loads word similarity features from the feature store one measure at a
+	# time. Only measures that have never been computed for this pair table,
+	# preprocessor and split are extracted; they are saved for later use.
+	def storedWordSimilarityFeatures(self, examples, purpose, tests, preprocessor = None):
+		pairHash = self.store.hashPairs(examples)
+		preprocessorName = self.getPreprocessorName(preprocessor)
+		
+		forms = None
+		blocks = []
+		
+		for test in tests:
+			measure = self.store.getMeasureKey(test)
+			
+			if not self.store.contains(measure, preprocessorName, pairHash, purpose):
+				if forms is None:
+					forms = [(form1, form2) for (form1, form2, language1, language2, meaningIndex) in examples]
+					if preprocessor:
+						forms = [(self.preprocess(form1, preprocessor), self.preprocess(form2, preprocessor)) for (form1, form2) in forms]
+				
+				self.store.save(measure, preprocessorName, pairHash, purpose, [test(form1, form2) for (form1, form2) in forms])
+			
+			blocks.append(self.store.load(measure, preprocessorName, pairHash, purpose))
+		
+		return self.store.combine(blocks)
+	
+	
+	# Extracts features of examples one chunk at a time with the extractor
+	# compiled from a feature layout (e.g., getMinimalLayout), yields each
+	# chunk's features and labels. Used to train on pair sets whose features
+	# do not fit in memory. With a feature store, each chunk is saved as a
+	# block the first time it is extracted, keyed by the layout (see
+	# getLayoutKey), and later passes read it back from its memory-mapped
+	# block.
+	def streamFeatures(self, examples, labels, layout, purpose, chunkSize = constants.STREAM_CHUNK):
+		extractor = self.compileExtractor(layout)
+		pairHash = self.store.hashPairs(examples) if self.store else None
+		layoutKey = self.getLayoutKey(layout) if self.store else None
+		
+		for start in range(0, len(examples), chunkSize):
+			chunkLabels = numpy.array(labels[start : start + chunkSize])
+			measure = constants.STREAM_MEASURE.format(layoutKey, start, chunkSize)
+			
+			if self.store and self.store.contains(measure, constants.RAW, pairHash, purpose):
+				yield self.store.load(measure, constants.RAW, pairHash, purpose), chunkLabels
+				continue
+			
+			chunk = examples[start : start + chunkSize]
+			rows = numpy.array([extractor(form1, form2, None, language1, language2, meaningIndex) for (form1, form2, language1, language2, meaningIndex) in chunk])
+			
+			if self.store:
+				self.store.save(measure, constants.RAW, pairHash, purpose, rows)
+			
+			yield rows, chunkLabels
+	
+	
+	# Generates the feature store key of a feature layout: a hash of the layout
+	# itself (which holds POS tags, language groups and languages), of the
+	# keys of the functions that compute its groups (see
+	# FeatureStore.getMeasureKey) and of the contents of its preprocessors.
+	# Features stored for a layout are thus never reused once any of these
+	# change.
+	def getLayoutKey(self, layout):
+		digest = hashlib.sha1(json.dumps(layout, sort_keys = True))
+		
+		for function in [self.compileExtractor, self.compileGroup]:
+			digest.update(self.store.getMeasureKey(function))
+		
+		for group in layout:
+			for function in self.getGroupFunctions(group):
+				digest.update(self.store.getMeasureKey(function))
+			
+			if group["type"] == "measures":
+				digest.update(repr(sorted((self.getPreprocessor(group["preprocessor"]) or {}).items())))
+		
+		return digest.hexdigest()[: 16]
+	
+	
+	# Returns the functions that compute the features of a layout group.
+	def getGroupFunctions(self, group):
+		if group["type"] == "measures":
+			return [getattr(self, name) for name in group["measures"]] + [self.preprocess]
+		
+		return {
+			"POSTags": [self.examplePOSTagFeature],
+			"letters": [self.exampleLetterFeature],
+			"sameLanguageGroup": [self.exampleSameLanguageGroupFeature],
+			"languagePairs": [self.exampleBinaryLanguageFeature, self.getLanguageIndices, self.computeIndex]
+		}[group["type"]]
+	
+	
 	# Returns, for each meaning, a list of language-sorted cognate group label
 	# indices for the test dataset.
 	def extractGroupLabels(self, cognateSets, wordforms, testMeanings, testLanguages):
 		groupLabels = OrderedDict()
 		
+		testLanguages = set(testLanguages)
+		
 		for meaningIndex in testMeanings:
 			labels = [-1] * len(wordforms[meaningIndex])
 			keys = wordforms[meaningIndex].keys()
+			positions = {languageIndex: index for index, languageIndex in enumerate(keys)}
 			
 			for clusterIndex, entries in cognateSets[meaningIndex].iteritems():
 				for (wordform, languageIndex) in entries:
-					index = keys.index(languageIndex)
-					labels[index] = clusterIndex
+					labels[positions[languageIndex]] = clusterIndex
 	
 			groupLabels[meaningIndex] = []
 
@@ -497,6 +911,74 @@ class Extractor:
 		return groupLabels
 	
 	
+	### Blocking ###
+	# Returns a blocker for clustering: a function that, given the wordforms
+	# of a meaning, returns the candidate pairs to score (see
+	# generateCandidates). Returns None if n is 0, i.e., all pairs are scored.
+	def getBlocker(self, n = constants.BLOCKING_N):
+		if not n:
+			return None
+		
+		return lambda forms: self.generateCandidates(forms, n)
+	
+	
+	# Generates the candidate pairs among a list of wordforms: those that share
+	# at least one sound class n-gram (letter n-gram, if sound classes are not
+	# set). Each form is indexed by its n-grams, and only forms found under a
+	# common n-gram are paired, instead of checking every pair. Forms shorter
+	# than n are paired with all others. Returns a boolean matrix over the
+	# positions of the forms; empty forms are never candidates.
+	def generateCandidates(self, forms, n = constants.BLOCKING_N):
+		candidates = numpy.zeros((len(forms), len(forms)), dtype = bool)
+		postings = {}
+		
+		for i, form in enumerate(forms):
+			if not form:
+				continue
+			
+			if self.soundClassPrep:
+				form = self.preprocess(form, self.soundClassPrep)
+			
+			if len(form) < n:
+				candidates[i, :] = True
+				candidates[:, i] = True
+				continue
+			
+			for ngram in set(self.ngrams(n, form)):
+				postings.setdefault(ngram, []).append(i)
+		
+		for indices in postings.itervalues():
+			candidates[numpy.ix_(indices, indices)] = True
+		
+		present = numpy.array([bool(form) for form in forms], dtype = bool)
+		
+		return candidates & numpy.outer(present, present)
+	
+	
+	# Decides whether a pair of wordforms is obviously unrelated, i.e., the two
+	# forms share no sound class n-grams (or no letter n-grams, if sound
+	# classes are not set). Such pairs need not be scored by a model. Forms
+	# shorter than n are never blocked.
+	def blocked(self, form1, form2, n = constants.BLOCKING_N):
+		if self.soundClassPrep:
+			form1 = self.preprocess(form1, self.soundClassPrep)
+			form2 = self.preprocess(form2, self.soundClassPrep)
+		
+		if len(form1) < n or len(form2) < n:
+			return False
+		
+		return not set(self.ngrams(n, form1)) & set(self.ngrams(n, form2))
+	
+	
+	# Counts labelled examples, positive examples, and how many of each would be
+	# blocked. Blocked positives are true cognate pairs wrongly pruned.
+	def evaluateBlocking(self, examples, labels, n = constants.BLOCKING_N):
+		blocked = numpy.array([self.blocked(form1, form2, n) for (form1, form2, language1, language2, meaningIndex) in examples], dtype = bool)
+		positives = numpy.asarray(labels) == 1
+		
+		return len(blocked), int(blocked.sum()), int(positives.sum()), int((blocked & positives).sum())
+	
+	
 	### Word Preprocessing ###
 	# Preprocesses the word before features are extracte. For example, the
 	# Dolgopolsky's preprocessor converts each letter of the input into one of
@@ -504,6 +986,30 @@ class Extractor:
 	def preprocess(self, form, preprocessor):
 		return "".join([preprocessor[char] if char in preprocessor else "" for char in form])
 
+	
+	# Returns the preprocessor of the given name (see getPreprocessorName).
+	def getPreprocessor(self, name):
+		if name == constants.RAW:
+			return None
+		elif name == constants.CONSONANT and self.consonantPrep:
+			return self.consonantPrep
+		elif name == constants.SOUND_CLASS and self.soundClassPrep:
+			return self.soundClassPrep
+		
+		raise ValueError("Preprocessor not available: {0}".format(name))
+	
+	
+	# Names the preprocessor for use in feature store keys.
+	def getPreprocessorName(self, preprocessor):
+		if not preprocessor:
+			return constants.RAW
+		elif preprocessor is self.consonantPrep:
+			return constants.CONSONANT
+		elif preprocessor is self.soundClassPrep:
+			return constants.SOUND_CLASS
+		else:
+			return hashlib.sha1(repr(sorted(preprocessor.items()))).hexdigest()[: 16]
+
 
 	### Word Similarity Measures ###
 	# Returns 1 if at least one letter is shared between the two words.
@@ -777,14 +1283,61 @@ class Extractor:
 			return wordform[ : 4]
 
 
+	### Global Feature Table ###
+	# Selects training and test examples from the global feature table using
+	# the masks returned by the pairer. The table is extracted once (using the
+	# TABLE dataset), after which any split is a slicing step.
+	def splitTable(self, masks):
+		self.trainExamples = self.tableExamples[masks[constants.TRAIN]]
+		self.trainLabels = self.tableLabels[masks[constants.TRAIN]]
+		
+		self.testExamples = self.tableExamples[masks[constants.TEST]]
+		self.testLabels = self.tableLabels[masks[constants.TEST]]
+
+
+	### Shared Memory ###
+	# Moves the training, test and table features and labels into shared
+	# memory (see shared.SharedArrays), so that worker processes can attach to
+	# them by name. The extractor then holds views of the shared arrays.
+	def shareFeatures(self, arrays):
+		for name in constants.SHARED_FEATURES:
+			if len(getattr(self, name)):
+				setattr(self, name, arrays.put(name, getattr(self, name)))
+	
+	
+	# Sets the features and labels to read-only views of those in shared
+	# memory.
+	def attachFeatures(self, arrays):
+		for name in constants.SHARED_FEATURES:
+			if arrays.contains(name):
+				setattr(self, name, arrays.get(name))
+	
+	
 	### Formatting ###
 	# Appends additional features to existing examples, or sets the new features
 	# as current examples if no examples exist yet.
 	def stackExamples(self, purpose, extension):
 		if purpose == constants.TRAIN:
-			self.trainExamples = numpy.column_stack((self.trainExamples, extension)) if numpy.any(self.trainExamples) else extension
+			self.trainExamples = self.stackColumns(self.trainExamples, extension)
+		elif purpose == constants.TABLE:
+			self.tableExamples = self.stackColumns(self.tableExamples, extension)
 		else:
-			self.testExamples = numpy.column_stack((self.testExamples, extension)) if numpy.any(self.testExamples) else extension
+			self.testExamples = self.stackColumns(self.testExamples, extension)
+	
+	
+	# Stacks the columns of examples and their extension. If either is sparse
+	# (e.g., binary language pair features), so is the result.
+	def stackColumns(self, examples, extension):
+		if not isSparse(examples) and not numpy.any(examples):
+			return extension
+		
+		if isSparse(examples) or isSparse(extension):
+			from scipy import sparse
+			
+			extension = extension.reshape((-1, 1)) if extension.ndim == 1 else extension
+			return sparse.hstack((examples, extension), format = "csr")
+		
+		return numpy.column_stack((examples, extension))
 
 
 	# Sets labels.
@@ -792,4 +1345,28 @@ class Extractor:
 		if purpose == constants.TRAIN and not numpy.any(self.trainLabels):
 			self.trainLabels = labels
 		elif purpose == constants.TEST and not numpy.any(self.testLabels):
-			self.testLabels = labels
\ No newline at end of file
+			self.testLabels = labels
+		elif purpose == constants.TABLE and not numpy.any(self.tableLabels):
+			self.tableLabels = labels
+
+
+
+# Checks if features are a SciPy sparse matrix, without importing SciPy when
+# all features are dense.
+def isSparse(features):
+	return hasattr(features, "tocsr")
+
+
+
+### Parallel Workers ###
+# The extractor, examples and table indices are set before the worker pool is
+# created, so that forked workers inherit them.
+EDIT_OPS = None
+
+
+# Counts the edit operations of a single shard of examples in a worker process.
+def countEditOpsShard(shard):
+	ext, examples, tableIndices = EDIT_OPS
+	start, end = shard
+	
+	return ext.countEditOpCells(examples[start : end], tableIndices[start : end])
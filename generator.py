@@ -0,0 +1,157 @@
+from __future__ import division
+import random
+
+import constants
+
+
+
+class Generator:
+	### Initialization ###
+	# Initializes the generator. Languages are divided into families of
+	# consecutive language indices. For each meaning, every family inherits a
+	# root (shared with another family with the probability given by sharing),
+	# and each language keeps its family's root, or replaces it with a new one
+	# with a probability chosen so that cognate sets have about setSize
+	# members. Each inherited form undergoes sound changes: every letter is
+	# replaced by a letter of the same sound class with the probability given
+	# by noise, and deleted or followed by an inserted letter with a tenth of
+	# that probability each.
+	def __init__(self, languageCount = constants.LANGUAGE_COUNT, meaningCount = constants.MEANING_COUNT, familyCount = len(constants.LANGUAGE_GROUPS), setSize = 5, sharing = 0.3, noise = 0.2, missing = 0.05, doubtful = 0.01, seed = 0):
+		self.languageCount = languageCount
+		self.meaningCount = meaningCount
+		self.familyCount = min(familyCount, languageCount)
+		self.setSize = setSize
+		self.sharing = sharing
+		self.noise = noise
+		self.missing = missing
+		self.doubtful = doubtful
+
+		self.random = random.Random(seed)
+
+		# Language families, in the same format as constants.LANGUAGE_GROUPS.
+		familySize = languageCount / self.familyCount
+		self.families = [range(int(i * familySize) + 1, int((i + 1) * familySize) + 1) for i in range(self.familyCount)]
+
+		# Sound (letter) classes used to generate realistic letter changes.
+		self.soundClasses = {}
+
+
+	### Generation ###
+	# Writes a synthetic wordlist in the format of the Comparative
+	# Indo-European Database to the given file.
+	def generate(self, filename):
+		self.readSoundClasses()
+
+		meaningWidth = max(3, len(str(self.meaningCount)))
+		languageWidth = max(2, len(str(self.languageCount)))
+
+		with open(filename, "wb") as output:
+			for meaningIndex in range(1, self.meaningCount + 1):
+				output.write("{0} {1:0{2}d} MEANING{1}\n".format(constants.HEADER, meaningIndex, meaningWidth))
+
+				CCNs = self.generateMeaning()
+
+				for CCN in sorted(CCNs.keys()):
+					output.write("{0}{1}{2:03d}\n".format(constants.SUBHEADER, " " * 22, CCN))
+
+					for languageIndex, form in CCNs[CCN]:
+						output.write("  {0:0{1}d} {2:0{3}d} {4:15} {5}\n".format(meaningIndex, meaningWidth, languageIndex, languageWidth, "Language" + str(languageIndex), form.upper()))
+
+				# Doubtful cognation between some of the cognate groups.
+				groups = [CCN for CCN in CCNs if CCN != constants.CCN1]
+				for i in range(len(groups) - 1):
+					if self.random.random() < self.doubtful:
+						output.write("{0} {1:03d} {2} {3:03d}\n".format(constants.RELATIONSHIP, groups[i], constants.DOUBTFUL_COGNATION, groups[i + 1]))
+
+
+	# Generates the forms of a single meaning, grouped by CCN. Cognate sets with
+	# a single member are listed under CCN1, the others get consecutive CCN2
+	# and then CCN4 numbers (continuing past CCN5 for very large lists).
+	def generateMeaning(self):
+		roots = []
+		members = {}
+
+		for family in self.families:
+			if roots and self.random.random() < self.sharing:
+				familyRoot = self.random.randrange(len(roots))
+			else:
+				roots.append(self.generateRoot())
+				familyRoot = len(roots) - 1
+
+			for languageIndex in family:
+				if self.random.random() < self.missing:
+					continue
+
+				root = familyRoot
+				if self.random.random() < 1 / self.setSize:
+					roots.append(self.generateRoot())
+					root = len(roots) - 1
+
+				if root not in members:
+					members[root] = []
+				members[root].append((languageIndex, self.changeSounds(roots[root])))
+
+		CCNs = {}
+		CCN = constants.CCN2_START
+
+		for root in sorted(members.keys()):
+			if len(members[root]) == 1:
+				CCNs.setdefault(constants.CCN1, []).extend(members[root])
+			else:
+				CCNs[CCN] = members[root]
+				CCN = constants.CCN4_START if CCN == constants.CCN2_END else CCN + 1
+				if CCN == constants.CCN4_END + 1:
+					CCN = constants.CCN5_END + 1
+
+		return CCNs
+
+
+	# Generates a random root of alternating consonants and vowels.
+	def generateRoot(self):
+		vowels = self.soundClasses.get("V", "aeiou")
+		consonants = "".join([chars for soundClass, chars in sorted(self.soundClasses.iteritems()) if soundClass != "V"]) or "bcdfghjklmnpqrstvwxz"
+
+		length = self.random.randint(3, 8)
+		start = self.random.randint(0, 1)
+
+		return "".join([self.random.choice(vowels if (i + start) % 2 else consonants) for i in range(length)])
+
+
+	# Applies random sound changes to a form.
+	def changeSounds(self, form):
+		letters = []
+
+		for char in form:
+			chance = self.random.random()
+
+			if chance < self.noise / 10:
+				continue
+			elif chance < self.noise:
+				letters.append(self.random.choice(self.soundClasses.get(self.getSoundClass(char), char)))
+			else:
+				letters.append(char)
+
+			if self.random.random() < self.noise / 10:
+				letters.append(self.random.choice("abcdefghijklmnopqrstuvwxyz"))
+
+		return "".join(letters) or form
+
+
+	### Sound Classes ###
+	# Reads Dolgopolsky's sound classes, stored as sound class: characters.
+	def readSoundClasses(self):
+		if self.soundClasses:
+			return
+
+		with open(constants.DOLGO, "rb") as data:
+			for line in data:
+				parts = line.split(":")
+				self.soundClasses[parts[0]] = "".join([char.strip() for char in parts[1].split(",")])
+
+
+	# Finds the sound class of a character.
+	def getSoundClass(self, char):
+		for soundClass, chars in self.soundClasses.iteritems():
+			if char in chars:
+				return soundClass
+		return None
@@ -1,74 +1,196 @@
 from __future__ import division
+import itertools
 import math
-import random
+import multiprocessing
 
-from sklearn import cluster
-from sklearn import cross_validation
-from sklearn import ensemble
-from sklearn import linear_model
-from sklearn import metrics
-from sklearn import preprocessing
-from sklearn import svm
 import numpy
 
 import constants
+import evaluator
+import shared
+import tracer
 
 
 
 class Learner:
 	### Initialization ###
-	# Initializes the standard scaler.
+	# Initializes the clustering evaluator. scikit-learn is only imported by
+	# the methods that use it, so that the learner is cheap to import for
+	# tasks that do not train models; the standard scaler is created along
+	# with a model.
 	def __init__(self):
-		self.scaler = preprocessing.StandardScaler()
+		self.scaler = None
+		self.evaluator = evaluator.Evaluator()
+		
+		# An optional model artifact (see artifact.Model) that scores word pairs
+		# during clustering instead of a trained model.
+		self.artifact = None
+		
+		# Number of word pairs assigned the maximum distance by a blocker
+		# during clustering, i.e., feature rows the model did not score.
+		self.blockedCount = 0
+		
+		# For each clustered meaning, the languages of its wordforms, their
+		# distance matrix and cluster labels. Kept so that new languages can
+		# be added without recomputing existing distances.
+		self.clusterLanguages = {}
+		self.clusterMatrices = {}
+		self.clusterLabels = {}
 
 
 	### SVM ###
 	# Initializes SVM with a custom C value.
 	def initSVM(self, C):
+		from sklearn import preprocessing
+		from sklearn import svm
+		
+		self.scaler = preprocessing.StandardScaler()
 		self.SVM = svm.LinearSVC(C = C, fit_intercept = False, max_iter = 10000, verbose = True)
 	
 	
 	# Scales the data to ~N(0, 1), stores scaling information for later
-	# reference, fits the SVM model.
-	def fitSVM(self, trainExamples, trainLabels):
-		self.SVM.fit(self.scaler.fit_transform(trainExamples), trainLabels)
+	# reference, fits the SVM model. Sample weights (e.g., those of
+	# subsampled negative examples, see Pairer.subsampleNegatives) are
+	# optional.
+	@tracer.traced("learner.fitSVM")
+	def fitSVM(self, trainExamples, trainLabels, sampleWeights = None):
+		self.SVM.fit(self.fitScaler(trainExamples, sampleWeights), trainLabels, sample_weight = sampleWeights)
 	
 	
 	# Scales the data, generates SVM predictions.
+	@tracer.traced("learner.predictSVM", "rows scored", tracer.countRows)
 	def predictSVM(self, testExamples):
-		return self.SVM.predict(self.scaler.transform(testExamples))
+		return self.SVM.predict(self.scale(testExamples))
 	
 	
 	### Logistic Regression ###
-	# Initializes logistic regression.
-	def initLogisticRegression(self, C, penalty = "l2"):
-		self.LR = linear_model.LogisticRegression(penalty = penalty, solver = "liblinear", C = C, fit_intercept = False, verbose = False)
+	# Initializes logistic regression. With warmStart set, each fit starts from
+	# the solution of the previous one, which needs a solver other than
+	# liblinear (e.g., lbfgs).
+	def initLogisticRegression(self, C, penalty = "l2", solver = "liblinear", warmStart = False):
+		from sklearn import linear_model
+		from sklearn import preprocessing
+		
+		self.scaler = preprocessing.StandardScaler()
+		self.LR = linear_model.LogisticRegression(penalty = penalty, solver = solver, C = C, fit_intercept = False, warm_start = warmStart, verbose = False)
 	
 	
 	# Scales the data to ~N(0, 1), stores scaling information for later
-	# reference, fits the linear regression.
-	def fitLogisticRegression(self, trainExamples, trainLabels):
-		self.LR.fit(self.scaler.fit_transform(trainExamples), trainLabels)
+	# reference, fits the linear regression, optionally with sample weights.
+	@tracer.traced("learner.fitLogisticRegression")
+	def fitLogisticRegression(self, trainExamples, trainLabels, sampleWeights = None):
+		self.LR.fit(self.fitScaler(trainExamples, sampleWeights), trainLabels, sample_weight = sampleWeights)
 	
 	
 	# Scales the data, generates linear regression class predictions.
+	@tracer.traced("learner.predictLogisticRegression", "rows scored", tracer.countRows)
 	def predictLogisticRegression(self, testExamples):
-		return self.LR.predict(self.scaler.transform(testExamples))
+		return self.LR.predict(self.scale(testExamples))
 	
 	
 	# Scales the data, generates linear regression probability predictions.
+	@tracer.traced("learner.predictProbLogisticRegression", "rows scored", tracer.countRows)
 	def predictProbLogisticRegression(self, testExamples):
-		return self.LR.predict_proba(self.scaler.transform(testExamples))[:, 1]
+		return self.LR.predict_proba(self.scale(testExamples))[:, 1]
+	
+	
+	### Scaling ###
+	# Fits the scaler to the training examples, returns them scaled. With
+	# sample weights, the feature means and variances are weighted too: the
+	# models have no intercept, so the means the features are centred on
+	# matter as much as the weights themselves. Sparse examples (e.g., with
+	# binary language pair features) are made dense first, since centring
+	# them would make them dense anyway, and scaled in place.
+	def fitScaler(self, trainExamples, sampleWeights = None):
+		if sampleWeights is None and hasattr(trainExamples, "tocsr"):
+			trainExamples = self.densify(trainExamples)
+			return self.scaler.fit(trainExamples).transform(trainExamples, copy = False)
+		elif sampleWeights is None:
+			return self.scaler.fit_transform(trainExamples)
+		
+		trainExamples = numpy.asarray(self.densify(trainExamples), dtype = float)
+		mean = numpy.average(trainExamples, axis = 0, weights = sampleWeights)
+		variance = numpy.average((trainExamples - mean) ** 2, axis = 0, weights = sampleWeights)
+		
+		self.scaler.fit(trainExamples[: 1])
+		self.scaler.mean_ = mean
+		self.scaler.var_ = variance
+		self.scaler.scale_ = numpy.where(variance > 0, numpy.sqrt(variance), 1.0)
+		self.scaler.n_samples_seen_ = len(trainExamples)
+		
+		return self.scaler.transform(trainExamples)
+	
+	
+	# Scales examples with the fitted scaler. Sparse examples are made dense
+	# and scaled in place, as in fitScaler.
+	def scale(self, examples):
+		if hasattr(examples, "tocsr"):
+			return self.scaler.transform(self.densify(examples), copy = False)
+		
+		return self.scaler.transform(examples)
+	
+	
+	# Returns sparse examples as a dense array, other examples as they are.
+	def densify(self, examples):
+		return examples.toarray() if hasattr(examples, "tocsr") else examples
+	
+	
+	### Streaming ###
+	# Initializes a linear model trained by stochastic gradient descent, for
+	# training sets too large to hold in memory: log loss for logistic
+	# regression, hinge loss for SVM. The model is stored as the SVM or LR of
+	# the learner, so that it predicts as usual.
+	def initStreaming(self, model, C, seed = 0):
+		from sklearn import linear_model
+		from sklearn import preprocessing
+		
+		self.scaler = preprocessing.StandardScaler()
+		self.streamingC = C
+		
+		if model == constants.SVM:
+			self.SVM = linear_model.SGDClassifier(loss = "hinge", fit_intercept = False, random_state = seed)
+		elif model == constants.LR:
+			self.LR = linear_model.SGDClassifier(loss = "log", fit_intercept = False, random_state = seed)
+	
+	
+	# Trains the streaming model over chunks of examples and labels, given as a
+	# function that returns a new iterator over the chunks (e.g., a call to
+	# Extractor.streamFeatures or FeatureStore.streamBlocks). A first pass
+	# computes running feature means and variances; each epoch then shuffles
+	# and scales one chunk at a time and updates the model with partial_fit.
+	# Only a single chunk is held in memory at once. The regularization
+	# strength matches C of the batch models (alpha = 1 / (C * n)).
+	@tracer.traced("learner.fitStreaming")
+	def fitStreaming(self, model, chunks, epochs = constants.STREAM_EPOCHS):
+		machine = self.SVM if model == constants.SVM else self.LR
+		
+		count = 0
+		for examples, labels in chunks():
+			self.scaler.partial_fit(examples)
+			count += len(labels)
+		
+		machine.set_params(alpha = 1 / (self.streamingC * count))
+		random = numpy.random.RandomState(machine.random_state)
+		
+		for epoch in range(epochs):
+			for examples, labels in chunks():
+				order = random.permutation(len(labels))
+				machine.partial_fit(self.scaler.transform(examples)[order], numpy.asarray(labels)[order], classes = constants.CLASSES)
 	
 	
 	### Decision Tree Forest ###
 	# Initializes a forest of trees. Equivalent to employing a gardener and
 	# telling them how many trees and where to plant.
 	def initForest(self, estimatorCount, seed):
+		from sklearn import ensemble
+		from sklearn import preprocessing
+		
+		self.scaler = preprocessing.StandardScaler()
 		self.forest = ensemble.ExtraTreesClassifier(n_estimators = estimatorCount, random_state = seed)
 	
 	
 	# Scales the data, trains the forest of randomized trees.
+	@tracer.traced("learner.fitForest")
 	def fitForest(self, trainExamples, trainLabels):
 		self.forest.fit(self.scaler.fit_transform(trainExamples), trainLabels)
 	
@@ -79,8 +201,10 @@ class Learner:
 	
 	
 	### Clustering ###
-	# For each meaning, clusters all wordforms in the test dataset.
-	def cluster(self, model, threshold, wordforms, POSTags, testMeanings, testLanguages, extractor):
+	# For each meaning, clusters all wordforms in the test dataset. If a
+	# blocker is given, word pairs it blocks are not scored by the model.
+	@tracer.traced("learner.cluster")
+	def cluster(self, model, threshold, wordforms, POSTags, testMeanings, testLanguages, extractor, blocker = None):
 		predictedLabels = {}
 		predictedClusters = {}
 		clusterCounts = {}
@@ -88,29 +212,189 @@ class Learner:
 		
 		for meaningIndex in testMeanings:
 			meaningLanguages = self.collectMeaningLanguages(testLanguages, wordforms[meaningIndex])
-			distances = self.computeDistances(model, meaningLanguages, testLanguages, wordforms, meaningIndex, POSTags, extractor)
+			distances = self.computeDistances(model, meaningLanguages, testLanguages, wordforms, meaningIndex, POSTags, extractor, blocker)
 			
-			for n in range(1, len(meaningLanguages) + 1):
-				clustering = cluster.AgglomerativeClustering(n_clusters = n, affinity = "precomputed", linkage = "average")
-				labels = clustering.fit_predict(numpy.array(distances))
+			labels, n, minDistance = self.clusterMeaning(threshold, distances)
 			
-				# Finds the smallest distance between clusters.
-				minDistance = self.computeMinClusterDistance(n, distances, labels)
-				
-				predictedLabels[meaningIndex] = labels
-				predictedClusters[meaningIndex] = self.extractClusters(labels, meaningLanguages, wordforms[meaningIndex])
-					
-				clusterCounts[meaningIndex] = n
-				clusterDistances[meaningIndex] = minDistance
-				
-				if minDistance <= threshold:
-					break
+			predictedLabels[meaningIndex] = labels
+			predictedClusters[meaningIndex] = self.extractClusters(labels, meaningLanguages, wordforms[meaningIndex])
+			
+			clusterCounts[meaningIndex] = n
+			clusterDistances[meaningIndex] = minDistance
+			
+			self.clusterLanguages[meaningIndex] = meaningLanguages
+			self.clusterMatrices[meaningIndex] = numpy.array(distances, dtype = float)
+			self.clusterLabels[meaningIndex] = labels
 
 		return predictedLabels, predictedClusters, clusterCounts, clusterDistances
 	
 	
+	# Clusters the wordforms of a single meaning given their distances. The
+	# number of clusters is increased until the smallest distance between
+	# clusters falls to the threshold. Returns the labels, the number of
+	# clusters and the smallest distance between clusters.
+	def clusterMeaning(self, threshold, distances):
+		return self.clusterThresholds([threshold], distances)[threshold]
+	
+	
+	# Clusters the wordforms of a single meaning at several thresholds at once.
+	# The smallest distance between clusters only depends on the number of
+	# clusters, so a single pass over increasing numbers of clusters serves
+	# all thresholds. Returns the labels, the number of clusters and the
+	# smallest distance between clusters for each threshold.
+	def clusterThresholds(self, thresholds, distances):
+		from sklearn import cluster
+		
+		# A single wordform forms a cluster of its own.
+		if len(distances) == 1:
+			return {threshold: (numpy.zeros(1, dtype = int), 1, 1.0) for threshold in thresholds}
+		
+		labels, n, minDistance = numpy.zeros(0, dtype = int), 0, 1.0
+		pending = sorted(set(thresholds))
+		results = {}
+		
+		for n in range(1, len(distances) + 1):
+			clustering = cluster.AgglomerativeClustering(n_clusters = n, affinity = "precomputed", linkage = "average")
+			labels = clustering.fit_predict(numpy.array(distances))
+		
+			# Finds the smallest distance between clusters.
+			minDistance = self.computeMinClusterDistance(n, distances, labels)
+			
+			for threshold in [threshold for threshold in pending if minDistance <= threshold]:
+				results[threshold] = (labels, n, minDistance)
+				pending.remove(threshold)
+			
+			if not pending:
+				break
+		
+		for threshold in pending:
+			results[threshold] = (labels, n, minDistance)
+		
+		return results
+	
+	
+	### Incremental Clustering ###
+	# Adds the wordforms of a new language (already present in wordforms) to
+	# the clusterings of all meanings clustered so far. Each new wordform is
+	# only scored against the existing wordforms of its meaning. It then joins
+	# the cluster with the smallest average distance to it (the average
+	# linkage used in clustering) if that distance is within the threshold,
+	# and starts a new cluster otherwise. Returns labels and readable clusters
+	# of all clustered meanings.
+	def addLanguage(self, model, threshold, language, wordforms, POSTags, testLanguages, extractor, blocker = None):
+		predictedLabels = {}
+		predictedClusters = {}
+		
+		for meaningIndex in sorted(self.clusterLabels.keys()):
+			meaningLanguages = self.clusterLanguages[meaningIndex]
+			form = wordforms[meaningIndex].get(language, None)
+			
+			if form and language not in meaningLanguages:
+				distances = self.extendDistances(model, meaningIndex, language, form, wordforms, POSTags, testLanguages, extractor, blocker)
+				self.clusterLabels[meaningIndex] = self.attachWordform(threshold, distances, self.clusterLabels[meaningIndex])
+				
+				meaningLanguages.append(language)
+				self.clusterMatrices[meaningIndex] = distances
+			
+			predictedLabels[meaningIndex] = self.clusterLabels[meaningIndex]
+			predictedClusters[meaningIndex] = self.extractClusters(self.clusterLabels[meaningIndex], meaningLanguages, wordforms[meaningIndex])
+		
+		return predictedLabels, predictedClusters
+	
+	
+	# Extends the cached distance matrix of a meaning by a row and a column for
+	# a new wordform. All new pairs are scored by the model in a single batch.
+	def extendDistances(self, model, meaningIndex, language, form, wordforms, POSTags, testLanguages, extractor, blocker = None):
+		meaningLanguages = self.clusterLanguages[meaningIndex]
+		meaningWordforms = wordforms[meaningIndex]
+		size = len(meaningLanguages)
+		
+		distances = numpy.ones((size + 1, size + 1))
+		distances[: size, : size] = self.clusterMatrices[meaningIndex]
+		
+		# New column (existing, new), new row (new, existing), and the new
+		# wordform with itself.
+		pairs = [(i, size) for i in range(size)] + [(size, j) for j in range(size)] + [(size, size)]
+		languages = meaningLanguages + [language]
+		
+		forms = [meaningWordforms[language] for language in meaningLanguages] + [form]
+		candidates = blocker(forms) if blocker else None
+		
+		rows = []
+		cells = []
+		
+		for i, j in pairs:
+			if candidates is not None and not candidates[i, j]:
+				self.countBlocked(1)
+				continue
+			
+			rows.append(extractor(forms[i], forms[j], testLanguages, languages[i], languages[j], meaningIndex, POSTags))
+			cells.append((i, j))
+		
+		if rows:
+			cells = numpy.array(cells)
+			distances[cells[:, 0], cells[:, 1]] = self.computeDistanceRows(model, numpy.array(rows))
+		
+		return distances
+	
+	
+	# Scores feature rows with the model, returns the distances of the pairs.
+	def computeDistanceRows(self, model, rows):
+		scorer = self.artifact or self
+		
+		if model == constants.SVM:
+			return 1 - scorer.predictSVM(rows)
+		elif model == constants.LR:
+			return 1 - scorer.predictProbLogisticRegression(rows)
+	
+	
+	# Given a distance matrix whose last row and column belong to a new
+	# wordform, and the labels of all other wordforms, assigns the new wordform
+	# to the nearest cluster (by average distance of pairs, ordered as in
+	# computeMinClusterDistance), or to a new cluster if none is within the
+	# threshold.
+	def attachWordform(self, threshold, distances, labels):
+		labels = numpy.asarray(labels)
+		
+		if len(labels) == 0:
+			return numpy.zeros(1, dtype = int)
+		
+		sums = numpy.bincount(labels, weights = distances[: -1, -1])
+		counts = numpy.bincount(labels)
+		
+		averages = numpy.ones(len(counts))
+		numpy.divide(sums, counts, out = averages, where = counts > 0)
+		
+		nearest = averages.argmin()
+		label = nearest if averages[nearest] <= threshold else len(counts)
+		
+		return numpy.append(labels, label)
+	
+	
+	# Detects meanings whose incremental clustering has drifted from what a
+	# full clustering would produce. The full clustering is computed from the
+	# cached distances, so it requires no model calls. A meaning has drifted if
+	# the V1 score of its incremental clustering against the full one is below
+	# 1 - tolerance. Returns the drifted meanings, and their full clusterings
+	# are stored instead of the incremental ones if refresh is set.
+	def detectDrift(self, threshold, tolerance = constants.DRIFT_TOLERANCE, refresh = False):
+		meanings = sorted(self.clusterLabels.keys())
+		fullLabels = {meaningIndex: self.clusterMeaning(threshold, self.clusterMatrices[meaningIndex])[0] for meaningIndex in meanings}
+		
+		V1scores = self.computeV1Scores(fullLabels, self.clusterLabels, meanings)
+		drifted = [meaningIndex for meaningIndex in meanings if V1scores[meaningIndex] < 1 - tolerance]
+		
+		if refresh:
+			for meaningIndex in drifted:
+				self.clusterLabels[meaningIndex] = fullLabels[meaningIndex]
+		
+		return drifted
+	
+	
 	# Computes the optimal cluster distance threshold for clustering.
-	def computeDistanceThreshold(self, model, wordforms, POSTags, testMeanings, testLanguages, extractor, trueLabels):
+	def computeDistanceThreshold(self, model, wordforms, POSTags, testMeanings, testLanguages, extractor, trueLabels, blocker = None):
+		from sklearn import cluster
+		
 		sumDistances = 0.0
 		
 		for meaningIndex in testMeanings:
@@ -118,7 +402,7 @@ class Learner:
 			minDistances = []
 			
 			meaningLanguages = self.collectMeaningLanguages(testLanguages, wordforms[meaningIndex])
-			distances = self.computeDistances(model, meaningLanguages, testLanguages, wordforms, meaningIndex, POSTags, extractor)
+			distances = self.computeDistances(model, meaningLanguages, testLanguages, wordforms, meaningIndex, POSTags, extractor, blocker)
 	
 			for n in range(1, len(meaningLanguages) + 1):
 				clustering = cluster.AgglomerativeClustering(n_clusters = n, affinity = "precomputed", linkage = "average")
@@ -151,34 +435,33 @@ class Learner:
 
 	
 	# Generates a matrix of all possible languages, with cell values set to the
-	# distance between every two word pairs for the given meaning.
-	def computeDistances(self, model, meaningLanguages, testLanguages, wordforms, meaningIndex, POSTags, extractor):
-		languageCount = len(meaningLanguages)
-		
-		distances = [[0] * languageCount for i in range(languageCount)]
+	# distance between every two word pairs for the given meaning. If a
+	# blocker is given (see Extractor.getBlocker), only the candidate pairs it
+	# generates are scored; all other pairs get the maximum distance. The
+	# scored pairs are passed to the model in a single batch.
+	def computeDistances(self, model, meaningLanguages, testLanguages, wordforms, meaningIndex, POSTags, extractor, blocker = None):
+		forms = [wordforms[meaningIndex].get(language, None) for language in meaningLanguages]
+		present = numpy.array([bool(form) for form in forms], dtype = bool)
+		pairs = numpy.outer(present, present)
 		
-		for i in range(languageCount):
-			language1 = meaningLanguages[i]
-			form1 = wordforms[meaningIndex].get(language1, None)
-				
-			if not form1:
-				continue
+		candidates = blocker(forms) if blocker else pairs
+		distances = numpy.where(pairs & ~candidates, 1.0, 0.0)
+		self.countBlocked(int((pairs & ~candidates).sum()))
 		
-			for j in range(languageCount):
-				language2 = meaningLanguages[j]
-				form2 = wordforms[meaningIndex].get(language2, None)
-					
-				if not form2:
-					continue
-				
-				example = extractor(form1, form2, testLanguages, language1, language2, meaningIndex, POSTags)
+		cells = numpy.argwhere(candidates)
+		if len(cells):
+			rows = numpy.array([extractor(forms[i], forms[j], testLanguages, meaningLanguages[i], meaningLanguages[j], meaningIndex, POSTags) for i, j in cells])
+			distances[cells[:, 0], cells[:, 1]] = self.computeDistanceRows(model, rows)
 
-				if model == constants.SVM:
-					distances[i][j] = 1 - self.predictSVM(example)[0]
-				elif model == constants.LR:
-					distances[i][j] = 1 - self.predictProbLogisticRegression(example)[0]
-
-		return distances
+		return distances.tolist()
+	
+	
+	# Counts pairs assigned the maximum distance by a blocker, i.e., feature
+	# rows the model did not have to score.
+	def countBlocked(self, count):
+		self.blockedCount += count
+		if count:
+			tracer.count("rows not scored", count)
 	
 	
 	# Given cluster assignments and distances between each wordform of a
@@ -227,82 +510,73 @@ class Learner:
 	### Evaluation ###
 	# Computes accuracy of predictions by comparing them to the truth.
 	def computeAccuracy(self, truth, predictions):
-		return metrics.accuracy_score(truth, predictions)
+		return numpy.mean(numpy.asarray(truth) == numpy.asarray(predictions))
 	
 	
-	# Computes precision.
+	# Computes recall.
 	def computeRecall(self, truth, predictions):
-		return metrics.recall_score(truth, predictions)
+		return self.evaluator.computePairwiseScores(truth, predictions)[1][1]
 	
 	
-	# Computes recall.
+	# Computes precision.
 	def computePrecision(self, truth, predictions):
-		return metrics.precision_score(truth, predictions)
+		return self.evaluator.computePairwiseScores(truth, predictions)[0][1]
 
 
 	# Computes F1 of the positive class by comparing predictions to the truth.
 	def computeF1(self, truth, predictions):
-		return metrics.f1_score(truth, predictions)
+		return self.evaluator.computePairwiseScores(truth, predictions)[2][1]
 	
 	
 	# Computes homogeneity of a clustering.
 	def computeHomogeneity(self, truth, predictions):
-		return metrics.homogeneity_score(truth, predictions)
+		return self.evaluator.computeVMeasures([truth], [predictions])[0][0]
 	
 	
 	# Computes completeness of a clustering.
 	def computeCompleteness(self, truth, predictions):
-		return metrics.completeness_score(truth, predictions)
+		return self.evaluator.computeVMeasures([truth], [predictions])[1][0]
 	
 	
 	# Computes the V1 score of the predicted grouping of wordforms for a meaning
 	# compared to the actual cognate grouping.
 	def computeV1(self, truth, predictions):
-		return metrics.v_measure_score(truth, predictions)
+		return self.evaluator.computeVMeasures([truth], [predictions])[2][0]
+	
+	
+	# Computes V1 scores for all given meanings at once, from a single
+	# contingency table.
+	def computeV1Scores(self, trueLabels, predictedLabels, meanings):
+		V1scores = self.evaluator.computeVMeasures([trueLabels[meaningIndex] for meaningIndex in meanings], [predictedLabels[meaningIndex] for meaningIndex in meanings])[2]
+		return {meaningIndex: V1scores[i] for i, meaningIndex in enumerate(meanings)}
 	
 	
 	# Computes the B-cubed F-1 score (Amigo, Gonzalo, Artiles, & Verdejo, 2009).
 	def computeB3(self, truth, predictions):
-		# Creates clusters from the two arrays of cluster indices.
-		trueClusters = {}
-		predictedClusters = {}
-		
-		for i in range(len(truth)):
-			trueID = truth[i]
-			predictedID = predictions[i]
+		return self.evaluator.computeB3([truth], [predictions])[2][0]
 	
-			if trueID not in trueClusters:
-				trueClusters[trueID] = set()
-			if predictedID not in predictedClusters:
-				predictedClusters[predictedID] = set()
-
-			trueClusters[trueID].add(i)
-			predictedClusters[predictedID].add(i)
-		
-		# Computes recall and precision as an average of recall and precision
-		# values of each example.
-		P = 0.0
-		R = 0.0
-		
-		for i in range(len(truth)):
-			trueCluster = trueClusters[truth[i]]
-			predictedCluster = predictedClusters[predictions[i]]
-			intersection = trueCluster & predictedCluster
-			
-			P += len(intersection) / len(predictedCluster)
-			R += len(intersection) / len(trueCluster)
-		
-		P = P / len(truth)
-		R = R / len(truth)
-
-		return 0.0 if P + R <= 0.0 else 2 * P * R / (P + R)
-		
+	
+	# Computes B-cubed F-1 scores for all given meanings at once.
+	def computeB3Scores(self, trueLabels, predictedLabels, meanings):
+		B3scores = self.evaluator.computeB3([trueLabels[meaningIndex] for meaningIndex in meanings], [predictedLabels[meaningIndex] for meaningIndex in meanings])[2]
+		return {meaningIndex: B3scores[i] for i, meaningIndex in enumerate(meanings)}
 		
 	
+	# Computes a bootstrap confidence interval for F1 of the positive class.
+	def computeF1Interval(self, truth, predictions):
+		return self.evaluator.bootstrapF1(truth, predictions)
+	
+	
+	# Computes a bootstrap confidence interval for the average of per-meaning
+	# scores by resampling meanings.
+	def computeAverageInterval(self, scores):
+		return self.evaluator.bootstrapMean([scores[meaningIndex] for meaningIndex in sorted(scores.keys())])
+	
+	
 	# Generates an evaluation report, where precision, recall and F-1 scores are
 	# reported for each class separately, and for the entire dataset.
 	def evaluatePairwise(self, truth, predictions):
-		return metrics.classification_report(truth, predictions, target_names = constants.TARGETS)
+		return self.evaluator.formatPairwiseReport(truth, predictions)
 	
 	
 	# Checks if a difference of performance between two clasifiers is
@@ -315,20 +589,10 @@ class Learner:
 		truth = numpy.extract(condition, truth)
 		predictions1 = numpy.extract(condition, predictions1)
 		predictions2 = numpy.extract(condition, predictions2)
-	
-		evals1 = (predictions1 == truth)
-		evals2 = (predictions2 == truth)
 		
 		# Misclassified by the first model only: c01.
 		# Misclassified by the second model only: c10.
-		c01, c10 = 0, 0
-	
-		for i, eval1 in enumerate(evals1):
-			eval2 = evals2[i]
-			if eval1 == 0 and eval2 == 1:
-				c01 += 1
-			if eval1 == 1 and eval2 == 0:
-				c10 += 1
+		c01, c10 = self.evaluator.computeMcNemarCounts(truth, predictions1, predictions2)
 		
 		if c01 + c10 < 20:
 			print "Unreliable conclusion:", c01, c10
@@ -341,43 +605,78 @@ class Learner:
 	# different, and thus the resulting F1 scores indeed indicate significant
 	# difference in the performance of the two models. This here uses a Monte
 	# Carlo approximation of a paired permutation significance test.
-	def computePermutationSignificance(self, truth, predictions1, predictions2):
-		statistic1 = self.computeF1(truth, predictions1)
-		statistic2 = self.computeF1(truth, predictions2)
+	#
+	# Permutations are drawn in chunks as boolean swap matrices (one row per
+	# permutation), and the F1 scores of a whole chunk are computed with two
+	# matrix products. Chunks are spread over a process pool; each chunk has
+	# its own random stream seeded by (seed, chunk index), so the result does
+	# not depend on the number of processes. With early stopping, the test
+	# ends as soon as the confidence interval of the p-value no longer
+	# contains the significance level.
+	def computePermutationSignificance(self, truth, predictions1, predictions2, seed = 0, processes = None, earlyStopping = False):
+		truth = (numpy.asarray(truth) == 1)
+		predictions1 = (numpy.asarray(predictions1) == 1)
+		predictions2 = (numpy.asarray(predictions2) == 1)
+		
+		counts = (float((predictions1 & truth).sum()), float(predictions1.sum()), float((predictions2 & truth).sum()), float(predictions2.sum()), float(truth.sum()))
+		
+		statistic1 = computeF1Counts(numpy.array([counts[0]]), numpy.array([counts[1]]), counts[4])[0]
+		statistic2 = computeF1Counts(numpy.array([counts[2]]), numpy.array([counts[3]]), counts[4])[0]
 		
 		swap = 1 if (statistic1 > statistic2) else -1
 		difference = (statistic1 - statistic2) * swap
 		
-		m = int(constants.PERMUTATIONS * 0.1)
+		# Only examples on which the two models disagree are affected by
+		# swapping. Swapping such an example changes the predicted positives of
+		# the first model by delta, and its true positives by truthDelta (the
+		# second model changes by the same amounts in the opposite direction).
+		disagreements = (predictions1 != predictions2)
+		delta = predictions2[disagreements].astype(numpy.float32) - predictions1[disagreements].astype(numpy.float32)
+		truthDelta = delta * truth[disagreements]
+		
+		# Workers attach to the disagreements in shared memory by name rather
+		# than receiving a copy with each chunk.
+		arrays = shared.SharedArrays()
+		arrays.put("delta", delta)
+		arrays.put("truthDelta", truthDelta)
+		
+		chunkSize = max(1, min(constants.PERMUTATIONS, constants.PERMUTATION_CELLS // max(1, len(delta))))
+		chunks = [(seed, i, min(chunkSize, constants.PERMUTATIONS - start), arrays.name, counts, swap, difference) for i, start in enumerate(range(0, constants.PERMUTATIONS, chunkSize))]
+		
+		processes = processes or multiprocessing.cpu_count()
+		pool = multiprocessing.Pool(processes) if processes > 1 else None
+		results = pool.imap(countPermutationChunk, chunks) if pool else itertools.imap(countPermutationChunk, chunks)
 		
 		n = 0
-		for i in range(constants.PERMUTATIONS):
-			perm1, perm2 = self.permuteLabels(predictions1, predictions2)
-			statistic1 = self.computeAccuracy(truth, perm1)
-			statistic2 = self.computeAccuracy(truth, perm2)
-			diff = (statistic1 - statistic2) * swap
-	
-			if diff >= difference:
-				n += 1
-	
-			if i % m == 0:
-				print "Permutation test, {0}% done.".format(int(i * 100 / constants.PERMUTATIONS))
+		done = 0
+		m = max(1, int(len(chunks) * 0.1))
+		
+		try:
+			for i, count in enumerate(results):
+				n += count
+				done += chunks[i][2]
+				
+				if i % m == 0:
+					print "Permutation test, {0}% done.".format(int(done * 100 / constants.PERMUTATIONS))
+				
+				if earlyStopping and self.clearsSignificanceLevel(n, done):
+					break
+		finally:
+			if pool:
+				pool.terminate()
+				pool.join()
+			arrays.unlink()
 	
-		return (n + 1) / (constants.PERMUTATIONS + 1)
-
+		return (n + 1) / (done + 1)
 
-	# Shuffles paired labels with a probability of a fair coin toss.
-	def permuteLabels(self, labels1, labels2):
-		nLabels1 = []
-		nLabels2 = []
 
-		for i in range(len(labels1)):
-			choice = [labels1[i], labels2[i]]
-			random.shuffle(choice)
-			nLabels1.append(choice[0])
-			nLabels2.append(choice[1])
-
-		return nLabels1, nLabels2
+	# Checks if the normal approximation confidence interval of the Monte Carlo
+	# p-value lies entirely above or below the significance level.
+	def clearsSignificanceLevel(self, n, done):
+		p = (n + 1) / (done + 1)
+		margin = constants.CONFIDENCE_Z * math.sqrt(p * (1 - p) / done)
+		
+		return (p + margin < constants.SIGNIFICANCE_LEVEL) or (p - margin > constants.SIGNIFICANCE_LEVEL)
 	
 	
 	
@@ -386,53 +685,105 @@ class Learner:
 	# word pair for every meaning. Uses these predictions to compute predicted
 	# language pair similarity as a ratio of positive predictions to all
 	# predictions.
-	def predictLanguageSimilarity(self, model, wordforms, extractor):
-		predictedCounts = self.countPredictions(model, wordforms, extractor)
+	@tracer.traced("learner.predictLanguageSimilarity")
+	def predictLanguageSimilarity(self, model, wordforms, extractor, languages = None, POSTags = None):
+		predictedCounts = self.countPredictions(model, wordforms, extractor, languages, POSTags)
 		self.computeSimilarity(predictedCounts)
 		
 
-	# Generates a cognateness decision for each wordform and meaning, counts the
-	# number of positive and all predictions for each language pair.
-	def countPredictions(self, model, wordforms, extractor):
-		# Initializes the predicted counts dictionary so that it can later be
-		# used without additional key existence checks.
-		predictedCounts = {i: {j: [0, 0] for j in range(constants.LANGUAGE_COUNT + 1)} for i in range(constants.LANGUAGE_COUNT + 1)}
-		
-		# For each meaning, for each pair of languages, extracts features from
-		# the two wordforms, uses the learner to predict cognateness.
-		for meaningIndex in range(1, constants.MEANING_COUNT + 1):
-			for language1 in range(1, constants.LANGUAGE_COUNT + 1):
-				for language2 in range(1, constants.LANGUAGE_COUNT + 1):
-					form1 = wordforms[meaningIndex].get(language1, None)
-					form2 = wordforms[meaningIndex].get(language2, None)
+	# Generates a cognateness decision for each unordered pair of wordforms of
+	# each meaning, counts the number of positive and all predictions for each
+	# language pair. Feature rows are generated in bulk and scored in batches of
+	# constants.BATCH_SIZE, and counts are accumulated into a language by
+	# language array using bincount. Languages are mapped to dense ids (their
+	# positions in the sorted similarityLanguages), so the array only covers
+	# languages present in the data.
+	def countPredictions(self, model, wordforms, extractor, languages = None, POSTags = None):
+		self.similarityLanguages = numpy.array(sorted(set([language for meaningWordforms in wordforms.itervalues() for language in meaningWordforms])), dtype = int)
+		languageIds = {language: i for i, language in enumerate(self.similarityLanguages)}
+		size = len(self.similarityLanguages)
+		
+		# All and positive predictions for each ordered language pair id
+		# (id1 * size + id2).
+		predictedCounts = numpy.zeros((2, size * size))
+		
+		rows = []
+		pairIds = []
+		
+		for meaningIndex, meaningWordforms in wordforms.iteritems():
+			meaningLanguages = sorted([language for language, form in meaningWordforms.iteritems() if form])
+			
+			for i, language1 in enumerate(meaningLanguages):
+				for language2 in meaningLanguages[i :]:
+					rows.append(extractor(meaningWordforms[language1], meaningWordforms[language2], languages, language1, language2, meaningIndex, POSTags))
+					pairIds.append(languageIds[language1] * size + languageIds[language2])
 					
-					if not form1 or not form2:
-						continue
+					if len(rows) == constants.BATCH_SIZE:
+						self.countBatch(model, rows, pairIds, predictedCounts)
+						rows = []
+						pairIds = []
+		
+		if rows:
+			self.countBatch(model, rows, pairIds, predictedCounts)
+		
+		# Each unordered pair stands for both of its orderings, except for pairs
+		# of a language with itself.
+		predictedCounts = predictedCounts.reshape((2, size, size))
+		diagonals = numpy.array([numpy.diag(numpy.diag(counts)) for counts in predictedCounts])
+		
+		return predictedCounts + predictedCounts.transpose((0, 2, 1)) - diagonals
 
-					if model == constants.SVM:
-						prediction = self.predictSVM(extractor(form1, form2))
-					elif model == constants.LR:
-						prediction = self.predictLogisticRegression(extractor(form1, form2))
-					
-					predictedCounts[language1][language2][0] += 1
-					predictedCounts[language1][language2][1] += prediction
 
-		return predictedCounts
+	# Scores a batch of feature rows, adds the predictions to the counts of
+	# their language pairs.
+	def countBatch(self, model, rows, pairIds, predictedCounts):
+		if model == constants.SVM:
+			predictions = self.predictSVM(numpy.array(rows))
+		elif model == constants.LR:
+			predictions = self.predictLogisticRegression(numpy.array(rows))
+		
+		minlength = predictedCounts.shape[1]
+		predictedCounts[0] += numpy.bincount(pairIds, minlength = minlength)
+		predictedCounts[1] += numpy.bincount(pairIds, weights = predictions, minlength = minlength)
 
 
 	# Once all predictions are generated, computes predicted language pair
-	# similarity using counts of positive and all predictions.
+	# similarity using counts of positive and all predictions. The result is a
+	# dense array indexed by the positions of two languages in
+	# similarityLanguages.
 	def computeSimilarity(self, predictedCounts):
-		predictedSims = {i: {j: 0 for j in range(constants.LANGUAGE_COUNT + 1)} for i in range(constants.LANGUAGE_COUNT + 1)}
+		allCounts, positiveCounts = predictedCounts
 		
-		for language1 in range(1, constants.LANGUAGE_COUNT + 1):
-			for language2 in range(1, constants.LANGUAGE_COUNT + 1):
-				numerator = predictedCounts[language1][language2][1]
-				denominator = predictedCounts[language1][language2][0]
-				
-				if denominator > 0:
-					predictedSims[language1][language2] = numerator / denominator
-				else:
-					predictedSims[language1][language2] = 0.0
+		predictedSims = numpy.zeros(allCounts.shape)
+		numpy.divide(positiveCounts, allCounts, out = predictedSims, where = allCounts > 0)
 		
-		self.predictedSimilarities = predictedSims
\ No newline at end of file
+		self.predictedSimilarities = predictedSims
+
+
+
+### Parallel Workers ###
+# Counts the permutations in one chunk of the permutation test whose F1
+# difference is at least as large as the observed one. Defined at the module
+# level so that it can be sent to worker processes.
+def countPermutationChunk(chunk):
+	seed, chunkIndex, size, name, counts, swap, difference = chunk
+	truePositives1, predictedPositives1, truePositives2, predictedPositives2, positives = counts
+	
+	arrays = shared.SharedArrays(name)
+	delta = arrays.get("delta")
+	truthDelta = arrays.get("truthDelta")
+	
+	swaps = numpy.random.RandomState([seed, chunkIndex]).randint(0, 2, size = (size, len(delta))).astype(numpy.float32)
+	predictedShift = swaps.dot(delta).astype(numpy.float64)
+	trueShift = swaps.dot(truthDelta).astype(numpy.float64)
+	
+	statistic1 = computeF1Counts(truePositives1 + trueShift, predictedPositives1 + predictedShift, positives)
+	statistic2 = computeF1Counts(truePositives2 - trueShift, predictedPositives2 - predictedShift, positives)
+	
+	return int(((statistic1 - statistic2) * swap >= difference).sum())
+
+
+# Computes F1 from arrays of true positive and predicted positive counts.
+def computeF1Counts(truePositives, predictedPositives, positives):
+	denominators = predictedPositives + positives
+	return numpy.where(denominators > 0, 2 * truePositives / numpy.maximum(denominators, 1), 0.0)
@@ -0,0 +1,113 @@
+from __future__ import division
+from collections import OrderedDict
+import argparse
+import json
+import random
+import threading
+import time
+import urllib2
+
+import numpy
+
+import constants
+import output
+import reader
+
+
+
+class LoadTest:
+	### Initialization ###
+	# Initializes the load test against a running clustering server. Requests
+	# are built from the wordlists of the original data, sampling a fixed
+	# number of languages (the batch size) of a random meaning.
+	def __init__(self, url, requestCount = constants.LOADTEST_REQUESTS, concurrency = constants.LOADTEST_CONCURRENCY, seed = constants.BENCHMARK_SEED):
+		self.url = url
+		self.requestCount = requestCount
+		self.concurrency = concurrency
+		self.random = random.Random(seed)
+
+		self.rdr = reader.Reader()
+		self.rdr.read()
+
+		self.results = OrderedDict()
+
+
+	### Requests ###
+	# Builds a request of the given batch size.
+	def buildRequest(self, size):
+		meaningIndex = self.random.choice(sorted(self.rdr.wordforms.keys()))
+		entries = sorted(self.rdr.wordforms[meaningIndex].items())
+
+		return {"meaning": meaningIndex, "entries": self.random.sample(entries, min(size, len(entries)))}
+
+
+	# Sends a request, returns its latency in seconds and whether the server
+	# answered it successfully. Error responses (HTTP 4xx/5xx) are read like
+	# any other response, and counted as errors.
+	def send(self, request):
+		start = time.time()
+
+		try:
+			response = urllib2.urlopen(urllib2.Request(self.url, json.dumps(request), {"Content-Type": "application/json"}))
+			success = True
+		except urllib2.HTTPError as error:
+			response = error
+			success = False
+		response.read()
+
+		return time.time() - start, success
+
+
+	### Running ###
+	# Sends requests of each batch size from a number of concurrent clients,
+	# records latency percentiles and throughput.
+	def run(self, sizes):
+		for size in sizes:
+			requests = [self.buildRequest(size) for i in range(self.requestCount)]
+			latencies = []
+			errors = []
+			lock = threading.Lock()
+
+			def client(k):
+				for request in requests[k :: self.concurrency]:
+					latency, success = self.send(request)
+					with lock:
+						latencies.append(latency)
+						if not success:
+							errors.append(latency)
+
+			start = time.time()
+
+			clients = [threading.Thread(target = client, args = (k,)) for k in range(self.concurrency)]
+			for thread in clients:
+				thread.start()
+			for thread in clients:
+				thread.join()
+
+			seconds = time.time() - start
+
+			self.results[size] = OrderedDict([
+				("requests", len(latencies)),
+				("errors", len(errors)),
+				("p50", numpy.percentile(latencies, 50)),
+				("p99", numpy.percentile(latencies, 99)),
+				("requestsPerSecond", len(latencies) / seconds)
+			])
+
+		return self.results
+
+
+
+# FLOW
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "Sends clustering requests of various batch sizes to a running server, reports p50/p99 latency.")
+	parser.add_argument("--url", default = "http://{0}:{1}/cluster".format(constants.SERVER_HOST, constants.SERVER_PORT), help = "clustering endpoint")
+	parser.add_argument("--sizes", type = int, nargs = "+", default = constants.LOADTEST_SIZES, help = "numbers of (language, form) entries per request")
+	parser.add_argument("--requests", type = int, default = constants.LOADTEST_REQUESTS, help = "number of requests per batch size")
+	parser.add_argument("--concurrency", type = int, default = constants.LOADTEST_CONCURRENCY, help = "number of concurrent clients")
+	arguments = parser.parse_args()
+
+	lst = LoadTest(arguments.url, arguments.requests, arguments.concurrency)
+	lst.run(arguments.sizes)
+
+	output.reportLoadTest(lst.results)
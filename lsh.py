@@ -0,0 +1,168 @@
+from __future__ import division
+import zlib
+
+import numpy
+
+import constants
+
+
+
+class LSHIndex:
+	### Initialization ###
+	# Initializes the index. Each wordform is profiled as a set of letter
+	# bigrams and sound class bigrams (both padded with word boundaries), and
+	# summarized by a MinHash signature of hashCount values. Signatures are cut
+	# into bands of bandSize values; two wordforms become candidates if any of
+	# their bands are identical, which happens with a probability that rises
+	# steeply with the Jaccard similarity of their profiles.
+	def __init__(self, soundClasses = None, hashCount = constants.MINHASH_COUNT, bandSize = constants.LSH_BAND_SIZE, seed = 0):
+		self.soundClasses = soundClasses
+		self.hashCount = hashCount
+		self.bandSize = bandSize
+		self.bandCount = hashCount // bandSize
+
+		# Parameters of the hash functions h(x) = (a * x + b) mod p.
+		random = numpy.random.RandomState(seed)
+		self.hashA = random.randint(1, constants.MINHASH_PRIME, size = hashCount).astype(numpy.int64)
+		self.hashB = random.randint(0, constants.MINHASH_PRIME, size = hashCount).astype(numpy.int64)
+
+		# Multipliers combining the values of a band into a single key.
+		self.bandMultipliers = random.randint(1, constants.MINHASH_PRIME, size = bandSize).astype(numpy.int64)
+
+		# The language, meaning and form of each indexed entry.
+		self.languages = numpy.zeros(0, dtype = int)
+		self.meanings = numpy.zeros(0, dtype = int)
+		self.forms = []
+
+		# For each band, the sorted band keys of all entries and the entries in
+		# that order, so that a bucket is a range found by binary search.
+		self.bandKeys = []
+		self.bandEntries = []
+
+
+	### Building ###
+	# Indexes all wordforms, given as a dictionary of meanings, each with a
+	# dictionary of language indices and wordforms (Reader.wordforms).
+	def build(self, wordforms):
+		entries = [(languageIndex, meaningIndex, form) for meaningIndex, meaningWordforms in sorted(wordforms.iteritems()) for languageIndex, form in sorted(meaningWordforms.iteritems()) if form]
+
+		self.languages = numpy.array([entry[0] for entry in entries], dtype = int)
+		self.meanings = numpy.array([entry[1] for entry in entries], dtype = int)
+		self.forms = [entry[2] for entry in entries]
+
+		keys = self.computeBandKeys(self.computeSignatures(self.forms))
+
+		self.bandKeys = []
+		self.bandEntries = []
+
+		for band in range(self.bandCount):
+			order = numpy.argsort(keys[:, band], kind = "mergesort")
+			self.bandKeys.append(keys[order, band])
+			self.bandEntries.append(order)
+
+
+	# Collects the profile of a wordform as a set of hashed n-grams.
+	def profile(self, form):
+		shingles = self.bigrams(form)
+
+		if self.soundClasses:
+			soundClassForm = "".join([self.soundClasses[char] if char in self.soundClasses else "" for char in form])
+			shingles.extend(["~" + shingle for shingle in self.bigrams(soundClassForm)])
+
+		return set([zlib.crc32(shingle) & 0xffffffff for shingle in shingles])
+
+
+	# Returns the bigrams of a word padded with word boundaries.
+	def bigrams(self, form):
+		padded = "#" + form + "#"
+		return [padded[i : i + 2] for i in range(len(padded) - 1)]
+
+
+	# Computes MinHash signatures of many wordforms. The shingles of a batch of
+	# wordforms are hashed by all hash functions at once, and the minimum of
+	# each wordform's segment is found with reduceat.
+	def computeSignatures(self, forms):
+		signatures = numpy.zeros((len(forms), self.hashCount), dtype = numpy.int64)
+
+		for start in range(0, len(forms), constants.BATCH_SIZE):
+			profiles = [sorted(self.profile(form)) for form in forms[start : start + constants.BATCH_SIZE]]
+			lengths = numpy.array([len(profile) for profile in profiles], dtype = int)
+
+			shingles = numpy.fromiter((shingle for profile in profiles for shingle in profile), numpy.int64, lengths.sum())
+			hashes = ((shingles % constants.MINHASH_PRIME)[:, numpy.newaxis] * self.hashA + self.hashB) % constants.MINHASH_PRIME
+
+			offsets = numpy.concatenate(([0], numpy.cumsum(lengths)[: -1]))
+			signatures[start : start + len(profiles)] = numpy.minimum.reduceat(hashes, offsets, axis = 0)
+
+		return signatures
+
+
+	# Combines each band of each signature into a single key. Values that do not
+	# fill a whole band are not used.
+	def computeBandKeys(self, signatures):
+		bands = signatures[:, : self.bandCount * self.bandSize].reshape((len(signatures), self.bandCount, self.bandSize))
+		return (bands * self.bandMultipliers).sum(axis = 2)
+
+
+	### Querying ###
+	# Finds the indexed entries that share at least one band with the given
+	# wordform. Returns (language, meaning, form) tuples ranked by the number
+	# of shared bands (which grows with the Jaccard similarity of their
+	# profiles), optionally only the best limit candidates.
+	def query(self, form, limit = constants.LSH_CANDIDATES):
+		entries, similarities = self.queryEntries(form)
+
+		if limit is not None:
+			entries = entries[: limit]
+
+		return [(int(self.languages[entry]), int(self.meanings[entry]), self.forms[entry]) for entry in entries]
+
+
+	# Finds candidate entries for the given wordform, returns them together
+	# with the fraction of bands they share with it, in descending order.
+	def queryEntries(self, form):
+		keys = self.computeBandKeys(self.computeSignatures([form]))[0]
+
+		candidates = []
+		for band in range(self.bandCount):
+			start = self.bandKeys[band].searchsorted(keys[band], side = "left")
+			end = self.bandKeys[band].searchsorted(keys[band], side = "right")
+			candidates.append(self.bandEntries[band][start : end])
+
+		entries, counts = numpy.unique(numpy.concatenate(candidates), return_counts = True)
+		order = numpy.argsort(-counts, kind = "mergesort")
+
+		return entries[order], counts[order] / self.bandCount
+
+
+	# Re-scores candidate entries of a wordform with a trained model, using
+	# the same extractor and model as clustering. Returns (language, meaning,
+	# form, probability) tuples in descending order of the predicted
+	# probability of cognateness (the prediction itself for SVM).
+	def rescore(self, learner, model, extractor, form, candidates, language = None, languages = None, POSTags = None):
+		if not candidates:
+			return []
+
+		rows = numpy.array([extractor(form, otherForm, languages, language, otherLanguage, meaningIndex, POSTags) for (otherLanguage, meaningIndex, otherForm) in candidates])
+
+		if model == constants.SVM:
+			scores = learner.predictSVM(rows)
+		elif model == constants.LR:
+			scores = learner.predictProbLogisticRegression(rows)
+
+		order = numpy.argsort(-numpy.asarray(scores, dtype = float), kind = "mergesort")
+
+		return [candidates[i] + (float(scores[i]),) for i in order]
+
+
+	### Evaluation ###
+	# Counts the labelled pairs (and positive pairs) whose two wordforms share
+	# at least one band, i.e., would be found by a query.
+	def evaluateRecall(self, examples, labels):
+		forms1 = [example[0] for example in examples]
+		forms2 = [example[1] for example in examples]
+
+		found = (self.computeBandKeys(self.computeSignatures(forms1)) == self.computeBandKeys(self.computeSignatures(forms2))).any(axis = 1)
+		positives = numpy.asarray(labels) == 1
+
+		return len(found), int(found.sum()), int(positives.sum()), int((found & positives).sum())
@@ -1,7 +1,11 @@
 from __future__ import division
+import errno
 import os
 import pickle
 
+import numpy
+
+import artifact
 import constants
 
 
@@ -27,6 +31,14 @@ def reportPairwiseLearning(stage, prr, accuracy, F1, report):
 	print "\n", report
 
 
+# Prints to terminal how many negative training examples were kept by
+# subsampling, and how many of them are hard negatives.
+def reportSubsampling(keptCount, hardCount, totalCount):
+	print "\n", "### Negative Subsampling ###"
+	print "{0:30} {1} / {2}".format("Negative examples kept:", keptCount, totalCount)
+	print "{0:30} {1}".format("Hard negatives:", hardCount), "\n"
+
+
 # Prints to terminal key group-based deduction results.
 def reportGroup(stage, scores, allMeanings):
 	print "\n", "### Group-based Deduction (" + stage + ") ###"
@@ -43,16 +55,105 @@ def reportCluster(scores, counts, distances, allMeanings):
 	print "\n", "{0:30} {1:2d} {2:.4f} {3:6.2f}".format("Average:", int(sum(counts.values()) / len(counts)), sum(scores.values()) / len(scores), sum(distances.values()) / len(distances)), "\n"
 
 
+# Prints to terminal how many pairs were blocked during clustering, and how
+# many labelled pairs and true cognate pairs the blocker prunes.
+def reportBlocking(blockedCount, pairCount, prunedCount, positiveCount, prunedPositiveCount):
+	print "\n", "### Blocking ###"
+	print "{0:30} {1}".format("Rows not scored:", blockedCount)
+	print "{0:30} {1} / {2}".format("Labelled pairs pruned:", prunedCount, pairCount)
+	print "{0:30} {1} / {2}".format("True cognates pruned:", prunedPositiveCount, positiveCount), "\n"
+
+
+# Prints to terminal a statistic together with its bootstrap confidence
+# interval, labelled with the configured confidence level.
+def reportInterval(name, interval):
+	print constants.INTERVAL.format(constants.INTERVAL_LABEL.format(name, constants.CONFIDENCE * 100), *interval), "\n"
+
+
+# Prints to terminal benchmark results and, if a baseline was compared
+# against, any regressions.
+def reportBenchmark(results, regressions = None):
+	print "\n", "### Benchmarks ###"
+	print "{0:50} {1:>12} {2:>14}".format("", "latency (ms)", "pairs/second")
+	for name, result in results.iteritems():
+		flag = "  REGRESSION x{0:.2f}".format(regressions[name]) if regressions and name in regressions else ""
+		print "{0:50} {1:12.3f} {2:14.0f}{3}".format(name, result["latency"] * 1000, result["pairsPerSecond"], flag)
+	
+	if regressions is not None:
+		print "\n", "{0} regression(s) found.".format(len(regressions)), "\n"
+
+
+# Prints to terminal time and peak memory of each pipeline stage at each
+# scale of the scaling benchmark.
+def reportScaling(results):
+	print "\n", "### Scaling ###"
+	for scale, result in results.iteritems():
+		print "\n", "Scale {0} ({1} meanings, {2} languages)".format(scale, result["meanings"], result["languages"])
+		for stage, measurements in result["stages"].iteritems():
+			print "{0:12} {1:12d} items {2:10.2f} s {3:10.1f} MB peak {4:+10.1f} MB".format(stage, measurements["items"], measurements["seconds"], measurements["peakMemory"], measurements["peakIncrease"])
+	print ""
+
+
+# Prints to terminal load test latencies and error responses for each request
+# batch size.
+def reportLoadTest(results):
+	print "\n", "### Load Test ###"
+	print "{0:>10} {1:>10} {2:>10} {3:>12} {4:>12} {5:>14}".format("batch size", "requests", "errors", "p50 (ms)", "p99 (ms)", "requests/second")
+	for size, result in results.iteritems():
+		print "{0:10d} {1:10d} {2:10d} {3:12.1f} {4:12.1f} {5:14.1f}".format(size, result["requests"], result["errors"], result["p50"] * 1000, result["p99"] * 1000, result["requestsPerSecond"])
+	print ""
+
+
+# Prints to terminal how long the command took to start (imports and
+# argument parsing), and how long its data took to read and pair.
+def reportStartup(command, startup, preparation):
+	print "\n", "### Startup (" + command + ") ###"
+	print "{0:30} {1:.3f} s".format("Imports and arguments:", startup)
+	print "{0:30} {1:.3f} s".format("Reading and pairing:", preparation), "\n"
+
+
+# Prints to terminal the exit status and running time of each experiment run
+# by the parallel runner.
+def reportRuns(results):
+	print "\n", "### Runs ###"
+	for name, (status, seconds) in results.iteritems():
+		print "{0:30} {1:10.2f} s {2}".format(name, seconds, "ok" if status == 0 else "failed ({0})".format(status))
+	print ""
+
+
+# Prints to terminal the results table of a hyperparameter sweep.
+def reportSweep(results):
+	print "\n", "### Sweep ###"
+	print "  ".join(["{0:>12}".format(column) for column in results[0].keys()])
+	for row in results:
+		print "  ".join(["{0:12.4f}".format(value) if isinstance(value, float) else "{0:>12}".format(value) for value in row.values()])
+	print ""
+
+
+# Prints to terminal pairwise F1, cluster V1 and timings of each
+# cross-validation fold, and their averages.
+def reportCrossValidation(results, summary):
+	print "\n", "### Leave-One-Family-Out Cross-Validation ###"
+	print "{0:12} {1:>9} {2:>10} {3:>10} {4:>8} {5:>8} {6:>9} {7:>9} {8:>9}".format("held out", "languages", "train", "test", "F1", "V1", "split (s)", "fit (s)", "clust (s)")
+	for result in results:
+		print "{0:12} {1:9d} {2:10d} {3:10d} {4:8.4f} {5:8.4f} {6:9.2f} {7:9.2f} {8:9.2f}".format(*result.values())
+	print "{0:12} {1:>9} {2:>10} {3:>10} {4:8.4f} {5:8.4f} {6:9.2f} {7:9.2f} {8:9.2f}".format("Average", "", "", "", summary["F1"], summary["V1"], summary["splitSeconds"], summary["fitSeconds"], summary["clusterSeconds"])
+	print "{0:12} {1:>9} {2:>10} {3:>10} {4:8.4f} {5:8.4f}".format("(std)", "", "", "", summary["F1std"], summary["V1std"]), "\n"
+
+
 ### Saving to File ###
 # Saves each example (a pair of wordforms with their languages) to a file
 # together with their respective features and labels (both true and predicted).
-def savePredictions(filename, examples, features, predictions, truth):
+# With append set, the examples are added to the end of the file, so that
+# predictions can be saved one chunk at a time.
+def savePredictions(filename, examples, features, predictions, truth, append = False):
 	checkDirectory(filename)
 	
-	with open(filename, "wb") as output:
+	with open(filename, "ab" if append else "wb") as output:
 		for i, (form1, form2, language1, language2, meaningIndex) in enumerate(examples):
 			sExample = "{0} ({1}), {2} ({3})".format(form1, language1, form2, language2)
-			sFeatures = "[" + "  ".join(["{0:4.1f}".format(feature) for feature in features[i]]) + " ]"
+			row = features[i].toarray().ravel() if hasattr(features, "tocsr") else features[i]
+			sFeatures = "[" + "  ".join(["{0:4.1f}".format(feature) for feature in row]) + " ]"
 			
 			output.write("{0:40} {1:20} {2:2} {3:2}\n".format(sExample, sFeatures, truth[i], int(predictions[i])))
 
@@ -72,42 +173,67 @@ def saveGroup(filename, predictedSets):
 					output.write("{0} ({1})\n".format(wordform, languageIndex))
 
 
+# Saves the results table of a hyperparameter sweep as tab-separated values.
+def saveSweep(filename, results):
+	checkDirectory(filename)
+	
+	with open(filename, "wb") as output:
+		output.write("\t".join(results[0].keys()) + "\n")
+		for row in results:
+			output.write("\t".join([str(value) for value in row.values()]) + "\n")
+
+
+# Saves edit operation counts as tab-separated values, one row per nonzero
+# letter correspondence of each table (see Extractor.accumulateEditOps).
+# Spaces and other non-letters are written as "_", insertions and deletions
+# as "-".
+def saveEditOps(filename, operations):
+	checkDirectory(filename)
+	
+	tables = operations if isinstance(operations, dict) else {(): operations}
+	letters = [chr(constants.FIRST + i) for i in range(constants.LAST - constants.FIRST + 1)] + ["_", "-"]
+	
+	with open(filename, "wb") as output:
+		output.write("table\tletter1\tletter2\tcount\n")
+		for key, counts in tables.iteritems():
+			for i, j in zip(*numpy.nonzero(counts)):
+				output.write("{0}\t{1}\t{2}\t{3:.0f}\n".format(",".join([str(part) for part in key]), letters[i], letters[j], counts[i, j]))
+
+
 ### Serialization ###
-# Pickles data stored in extractor and learner objects.
-def pickleLearning(stage, ext, lrn):
+# Pickles extractor data, and saves the trained model of the learner as a
+# model artifact (see artifact.Model) along with its feature layout and
+# clustering threshold.
+def pickleLearning(stage, ext, lrn, model, layout = None, threshold = None):
 	extData = [ext.trainExamples, ext.trainLabels, ext.testExamples, ext.testLabels]
-	lrnData = [lrn.scaler, lrn.machine, lrn.predictedSimilarities]
 	
 	checkDirectory(constants.PICKLE_EXT.format(stage))
 	with open(constants.PICKLE_EXT.format(stage), "wb") as output:
 		pickle.dump(extData, output)
 	
-	checkDirectory(constants.PICKLE_LRN.format(stage))
-	with open(constants.PICKLE_LRN.format(stage), "wb") as output:
-		pickle.dump(lrnData, output)
+	artifact.Model.fromLearner(lrn, model, layout, threshold).save(os.path.join(constants.ARTIFACTS, constants.ARTIFACT_STAGE.format(stage)))
 
 
-# Unpickles pickled data, adds it to provided extractor and learner objects.
-def unpickleLearning(stage, ext, lrn):
+# Unpickles pickled data, adds it to the provided extractor object. Returns
+# the extractor and the loaded model artifact, which predicts like a learner.
+def unpickleLearning(stage, ext):
 	with open(constants.PICKLE_EXT.format(stage), "rb") as input:
 		extData = pickle.load(input)
 
-	with open(constants.PICKLE_LRN.format(stage), "rb") as input:
-		lrnData = pickle.load(input)
-
 	ext.trainExamples = extData[0]
 	ext.trainLabels = extData[1]
 	ext.testExamples = extData[2]
 	ext.testLabels = extData[3]
 
-	lrn.scaler = lrnData[0]
-	lrn.machine = lrnData[1]
-	lrn.predictedSimilarities = lrnData[2]
-
-	return ext, lrn
+	return ext, artifact.Model.load(os.path.join(constants.ARTIFACTS, constants.ARTIFACT_STAGE.format(stage)))
 
 
-# Checks if a directory for the given filename exists. If not, creates one.
+# Checks if a directory for the given filename exists. If not, creates one;
+# another process creating it at the same time is not an error.
 def checkDirectory(filename):
 	if not os.path.exists(os.path.dirname(filename)):
-		os.makedirs(os.path.dirname(filename))
\ No newline at end of file
+		try:
+			os.makedirs(os.path.dirname(filename))
+		except OSError as error:
+			if error.errno != errno.EEXIST:
+				raise
\ No newline at end of file
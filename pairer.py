@@ -1,6 +1,10 @@
 from __future__ import division
+import math
+
+import numpy
 
 import constants
+import tracer
 
 
 
@@ -56,32 +60,49 @@ class Pairer:
 		self.positiveCounts = {x: 0 for x in range(2)}
 		self.negativeCounts = {x: 0 for x in range(2)}
 		
+		# Sample weights of each dataset, set only once its negative examples
+		# have been subsampled; empty otherwise, meaning every example counts
+		# once.
+		self.weights = {x: [] for x in range(2)}
+		
 		# An explicit enumeration of meanings and languages in terms of training
 		# and test data.
 		self.trainMeanings = []
 		self.testMeanings = []
 		self.testLanguages = []
 		self.trainLanguages = []
+		
+		# A split-independent table of all pairs in the data, together with the
+		# language pair and meaning of each row. Splits are then index masks
+		# over this table.
+		self.allExamples = []
+		self.allLabels = []
+		self.pairLanguages = numpy.zeros((0, 2), dtype = int)
+		self.pairMeanings = numpy.zeros(0, dtype = int)
 	
 
 	### Pairing ###
 	# The data is divided into training and test sets by meaning as specified by
-	# the user in trainMeanings and testMeanings.
+	# the user in trainMeanings and testMeanings. Both sets contain all
+	# languages present in the data.
+	@tracer.traced("pairer.pairBySpecificMeaning")
 	def pairBySpecificMeaning(self, cognates, dCognates, trainMeanings, testMeanings):
 		self.trainMeanings = trainMeanings[:]
 		self.testMeanings = testMeanings[:]
-		self.trainLanguages = range(1, constants.LANGUAGE_COUNT + 1)
-		self.testLanguages = range(1, constants.LANGUAGE_COUNT + 1)
+		self.trainLanguages = self.collectLanguages(cognates)
+		self.testLanguages = self.collectLanguages(cognates)
 		
 		self.pair(cognates, dCognates)
 		self.combinePairs()
 	
 	
 	# The data is assigned to the training set only for languages specified in
-	# the trainLanguages list. The remaining data is used for testing.
+	# the trainLanguages list. The remaining data is used for testing. Both
+	# sets contain all meanings present in the data.
+	@tracer.traced("pairer.pairBySpecificLanguage")
 	def pairBySpecificLanguage(self, cognates, dCognates, trainLanguages, testLanguages):
-		self.trainMeanings = range(1, constants.MEANING_COUNT + 1)
-		self.testMeanings = range(1, constants.MEANING_COUNT + 1)
+		self.trainMeanings = sorted(cognates.keys())
+		self.testMeanings = sorted(cognates.keys())
 		self.trainLanguages = trainLanguages[:]
 		self.testLanguages = testLanguages[:]
 		
@@ -89,10 +110,14 @@ class Pairer:
 	
 	
 	# Splits the data into training and testing sets by language.
+	@tracer.traced("pairer.pairByLanguage")
 	def pairByLanguage(self, cognates, dCognates):
 		trainCognates = {}
 		testCognates = {}
 		
+		trainLanguages = set(self.trainLanguages)
+		testLanguages = set(self.testLanguages)
+		
 		for meaningIndex, CCNs in cognates.iteritems():
 			trainCognates[meaningIndex] = {}
 			testCognates[meaningIndex] = {}
@@ -102,9 +127,9 @@ class Pairer:
 				testCognates[meaningIndex][CCN] = {}
 				
 				for languageIndex, form in forms.iteritems():
-					if languageIndex in self.trainLanguages:
+					if languageIndex in trainLanguages:
 						trainCognates[meaningIndex][CCN][languageIndex] = form
-					if languageIndex in self.testLanguages:
+					if languageIndex in testLanguages:
 						testCognates[meaningIndex][CCN][languageIndex] = form
 
 		self.pair(trainCognates, dCognates)
@@ -116,6 +141,7 @@ class Pairer:
 	
 	# Pairs wordforms as either positive or negative examples using rules based
 	# on CCN group numbers and cognate group relationships.
+	@tracer.traced("pairer.pair")
 	def pair(self, cognates, dCognates):
 		for meaningIndex, CCNs in cognates.iteritems():
 			self.pExamples[meaningIndex] = []
@@ -129,18 +155,19 @@ class Pairer:
 	# Combines positive and negative examples, and divides them into training
 	# and testing sets based on provided ratios.
 	def combinePairs(self):
-		for i in range(1, constants.MEANING_COUNT + 1):
-			if i in self.testMeanings:
+		trainMeanings = set(self.trainMeanings)
+		testMeanings = set(self.testMeanings)
+		
+		for i in sorted(self.pExamples.keys()):
+			if i in testMeanings:
 				self.extendDataset(constants.TEST, i)
-			if i in self.trainMeanings:
+			if i in trainMeanings:
 				self.extendDataset(constants.TRAIN, i)
 
 
 	# Combines positive and negative examples only for the training data.
 	def combineSpecificPairs(self, purpose):
-		meaningCount = len(self.nExamples)
-	
-		for i in range(1, meaningCount + 1):
+		for i in sorted(self.nExamples.keys()):
 			self.extendDataset(purpose, i)
 
 
@@ -223,4 +250,153 @@ class Pairer:
 
 	# Checks if the two CCNs are not in a doubtful cognation relationship.
 	def doubtful(self, CCN1, CCN2, dCognates):
-		return (CCN1 in dCognates) and (CCN2 in dCognates[CCN1])
\ No newline at end of file
+		return (CCN1 in dCognates) and (CCN2 in dCognates[CCN1])
+
+	
+	# Collects the sorted indices of all languages present in the data.
+	def collectLanguages(self, cognates):
+		return sorted(set([languageIndex for CCNs in cognates.itervalues() for forms in CCNs.itervalues() for languageIndex in forms]))
+
+
+	### Global Pair Table ###
+	# Pairs all wordforms of every meaning once, regardless of how the data is
+	# going to be split. Since pairing decisions only depend on the two forms
+	# and their CCNs, any language or meaning split is a subset of this table.
+	@tracer.traced("pairer.pairAll")
+	def pairAll(self, cognates, dCognates):
+		self.pair(cognates, dCognates)
+		
+		self.allExamples = []
+		self.allLabels = []
+		
+		for meaningIndex in sorted(self.pExamples.keys()):
+			self.allExamples.extend(self.pExamples[meaningIndex])
+			self.allExamples.extend(self.nExamples[meaningIndex])
+			self.allLabels.extend(self.pLabels[meaningIndex])
+			self.allLabels.extend(self.nLabels[meaningIndex])
+		
+		self.pairLanguages = numpy.array([(language1, language2) for (form1, form2, language1, language2, meaningIndex) in self.allExamples], dtype = int).reshape((-1, 2))
+		self.pairMeanings = numpy.array([meaningIndex for (form1, form2, language1, language2, meaningIndex) in self.allExamples], dtype = int)
+	
+	
+	# Splits the global pair table by language: a pair belongs to a set only if
+	# both of its languages do.
+	@tracer.traced("pairer.splitByLanguage")
+	def splitByLanguage(self, trainLanguages, testLanguages):
+		self.trainMeanings = numpy.unique(self.pairMeanings).tolist()
+		self.testMeanings = numpy.unique(self.pairMeanings).tolist()
+		self.trainLanguages = trainLanguages[:]
+		self.testLanguages = testLanguages[:]
+		
+		return self.applySplit({constants.TRAIN: self.maskByLanguage(trainLanguages), constants.TEST: self.maskByLanguage(testLanguages)})
+	
+	
+	# Splits the global pair table by meaning.
+	@tracer.traced("pairer.splitByMeaning")
+	def splitByMeaning(self, trainMeanings, testMeanings):
+		self.trainMeanings = trainMeanings[:]
+		self.testMeanings = testMeanings[:]
+		self.trainLanguages = numpy.unique(self.pairLanguages).tolist()
+		self.testLanguages = numpy.unique(self.pairLanguages).tolist()
+		
+		return self.applySplit({constants.TRAIN: self.maskByMeaning(trainMeanings), constants.TEST: self.maskByMeaning(testMeanings)})
+	
+	
+	# Selects the pairs whose two languages are both in the given list.
+	def maskByLanguage(self, languages):
+		return numpy.in1d(self.pairLanguages[:, 0], languages) & numpy.in1d(self.pairLanguages[:, 1], languages)
+	
+	
+	# Selects the pairs of the given meanings.
+	def maskByMeaning(self, meanings):
+		return numpy.in1d(self.pairMeanings, meanings)
+	
+	
+	# Sets examples, labels and counts of each dataset to the rows of the global
+	# pair table selected by the dataset's mask. Returns the masks, so that the
+	# same rows can be selected from a global feature table.
+	def applySplit(self, masks):
+		labels = numpy.array(self.allLabels, dtype = int)
+		
+		for purpose, mask in masks.iteritems():
+			indices = numpy.flatnonzero(mask)
+			
+			# A table attached from shared memory is sliced at once rather than
+			# record by record.
+			self.examples[purpose] = self.allExamples[indices].tolist() if isinstance(self.allExamples, numpy.ndarray) else [self.allExamples[i] for i in indices]
+			self.labels[purpose] = labels[indices].tolist()
+			
+			self.positiveCounts[purpose] = int(labels[indices].sum())
+			self.negativeCounts[purpose] = len(indices) - self.positiveCounts[purpose]
+			self.weights[purpose] = []
+		
+		return masks
+	
+	
+	### Negative Subsampling ###
+	# Keeps, for each meaning of a dataset, at most ratio negative examples per
+	# positive one (at least ratio, if the meaning has no positive examples).
+	# Of the kept negatives, a hardFraction are the hardest ones, those most
+	# similar by score (a cheap word similarity measure, e.g.,
+	# Extractor.bigramDice); the rest are sampled uniformly, with the given
+	# seed, from the remaining negatives. Each sampled negative is weighted by
+	# the number of remaining negatives it stands for, and positives and hard
+	# negatives by 1, so that a model fit with the weights sees the original
+	# class balance and its probabilities stay calibrated. Examples keep their
+	# order. Returns the number of negatives kept, of them hard, and before
+	# subsampling.
+	@tracer.traced("pairer.subsampleNegatives")
+	def subsampleNegatives(self, purpose, ratio, hardFraction = 0.0, score = None, seed = 0):
+		random = numpy.random.RandomState(seed)
+		labels = numpy.array(self.labels[purpose], dtype = int)
+		meanings = numpy.array([example[4] for example in self.examples[purpose]], dtype = int).reshape(-1)
+		weights = numpy.ones(len(labels))
+		keep = labels == 1
+		hardCount = 0
+		
+		for meaningIndex in numpy.unique(meanings):
+			negatives = numpy.flatnonzero((meanings == meaningIndex) & (labels == 0))
+			keepCount = min(len(negatives), int(math.ceil(ratio * max(labels[meanings == meaningIndex].sum(), 1))))
+			hard = int(round(hardFraction * keepCount)) if score else 0
+			
+			if hard:
+				scores = numpy.array([score(self.examples[purpose][i][0], self.examples[purpose][i][1]) for i in negatives])
+				order = numpy.argsort(-scores, kind = "mergesort")
+				keep[negatives[order[: hard]]] = True
+				negatives = negatives[order[hard :]]
+			
+			sampled = random.choice(negatives, keepCount - hard, replace = False)
+			keep[sampled] = True
+			weights[sampled] = len(negatives) / (keepCount - hard) if keepCount > hard else 1.0
+			hardCount += hard
+		
+		indices = numpy.flatnonzero(keep)
+		totalCount = self.negativeCounts[purpose]
+		
+		self.examples[purpose] = [self.examples[purpose][i] for i in indices]
+		self.labels[purpose] = labels[indices].tolist()
+		self.weights[purpose] = weights[indices].tolist()
+		self.negativeCounts[purpose] = len(indices) - self.positiveCounts[purpose]
+		
+		return self.negativeCounts[purpose], hardCount, totalCount
+	
+	
+	### Shared Memory ###
+	# Copies the global pair table into shared memory (see shared.SharedArrays),
+	# so that worker processes can attach to it by name instead of receiving a
+	# pickled copy.
+	def shareTable(self, arrays):
+		arrays.putExamples("allExamples", self.allExamples)
+		arrays.put("allLabels", numpy.array(self.allLabels, dtype = int))
+		arrays.put("pairLanguages", self.pairLanguages)
+		arrays.put("pairMeanings", self.pairMeanings)
+	
+	
+	# Sets the global pair table to read-only views of a table in shared
+	# memory. Its examples are records that unpack like the original tuples,
+	# so the table can be split as usual.
+	def attachTable(self, arrays):
+		self.allExamples = arrays.getExamples("allExamples")
+		self.allLabels = arrays.get("allLabels")
+		self.pairLanguages = arrays.get("pairLanguages")
+		self.pairMeanings = arrays.get("pairMeanings")
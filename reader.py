@@ -2,18 +2,25 @@ from collections import OrderedDict
 import re
 
 import constants
+import tracer
 
 
 
 class Reader:
 	### Initialization ###
 	# Initializes the reader by setting the target filename and various data
-	# structures that will be used for reading various input files.
-	def __init__(self):
-		# Meanings and their indices (1 - 200).
+	# structures that will be used for reading various input files. All
+	# meanings and languages in the file are read, unless meaningCount or
+	# languageCount limit them to the first meanings or languages.
+	def __init__(self, filename = constants.IN, meaningCount = None, languageCount = None):
+		self.filename = filename
+		self.meaningCount = meaningCount
+		self.languageCount = languageCount
+		
+		# Meanings and their indices (1 - 200 in the original data).
 		self.meanings = OrderedDict()
 		
-		# Languages and their indices (1 - 95).
+		# Languages and their indices (1 - 95 in the original data).
 		self.languages = {}
 		
 		# For each meaning, the wordform for each language.
@@ -59,6 +66,7 @@ class Reader:
 
 	### Reading ###
 	# Reads the various input data files.
+	@tracer.traced("reader.read")
 	def read(self):
 		self.readData()
 		self.readPOSTags()
@@ -69,13 +77,13 @@ class Reader:
 	# Reads the cognate dataset line by line, parses each line and populates the
 	# associated data structures accordingly.
 	def readData(self):
-		with open(constants.IN, "rb") as data:
+		with open(self.filename, "rb") as data:
 			for line in data:
 				# Header line, indicates the beginning of a block.
 				if line[0] == constants.HEADER:
 					# Checks if the required amount of meanings has already been
 					# processed.
-					if self.currentMeaningIndex + 1 > constants.MEANING_COUNT:
+					if self.meaningCount is not None and self.currentMeaningIndex + 1 > self.meaningCount:
 						break
 					self.processHeader(line)
 				
@@ -133,8 +141,9 @@ class Reader:
 	### Processing Lines ###
 	# Processes the header line.
 	def processHeader(self, line):
-		meaningIndex = int(line[2 : 5])
-		meaning = line[6 :].strip().lower()
+		parts = line.split(None, 2)
+		meaningIndex = int(parts[1])
+		meaning = parts[2].strip().lower() if len(parts) > 2 else ""
 
 		self.meanings[meaningIndex] = meaning
 		self.cognateCCNs[meaningIndex] = {}
@@ -160,14 +169,20 @@ class Reader:
 			self.addDoubtfulCCNs(secondCCN, firstCCN)
 
 
-	# Processes the form line.
+	# Processes the form line. The meaning and language indices are followed by
+	# a 15 character language name and the forms. Index fields are usually 3
+	# and 2 characters wide, but wider ones (in larger datasets) simply shift
+	# the remaining fields.
 	def processForm(self, line):
-		self.currentLanguageIndex = int(line[6 : 8])
-		language = line[9 : 24].strip().lower().title()
+		indices = re.match(r" *\d+ (\d+) ", line)
+		offset = indices.end()
+		
+		self.currentLanguageIndex = int(indices.group(1))
+		language = line[offset : offset + 15].strip().lower().title()
 		
 		# Allows only a subset of all languages to be read.
-		if self.currentLanguageIndex <= constants.LANGUAGE_COUNT:
-			form = self.parseForms(line)
+		if self.languageCount is None or self.currentLanguageIndex <= self.languageCount:
+			form = self.parseForms(line[offset + 16 :])
 		
 			# Adds the form to the cognateCCNs dictionary. Also adds the form to
 			# its appropriate cognate group based on its CCN.
@@ -188,13 +203,13 @@ class Reader:
 				self.languages[self.currentLanguageIndex] = language
 	
 	
-	# Parses a given form line to extract all wordforms.
+	# Parses the forms part of a form line to extract all wordforms.
 	def parseForms(self, line):
 		forms = []
 		
 		# While most multiple forms are provided using a comma-delimited list,
 		# some are also delimited with a /.
-		for form in re.split("/|,", line[25 :]):
+		for form in re.split("/|,", line):
 			# Changes all kinds of weird spaces into a normal space.
 			form = " ".join(form.split())
 			
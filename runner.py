@@ -0,0 +1,122 @@
+from collections import OrderedDict
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import traceback
+
+import constants
+
+
+
+class Runner:
+	### Initialization ###
+	# Initializes a runner of at most processes concurrent experiments. Each
+	# experiment runs in a forked worker process, so data read and paired
+	# before the run is shared copy-on-write rather than copied or pickled.
+	def __init__(self, processes = None):
+		self.processes = processes or multiprocessing.cpu_count()
+
+		# For each finished experiment: its exit status and running time.
+		self.results = OrderedDict()
+
+
+	### Running ###
+	# Runs experiments, given as an ordered dictionary of names and (function,
+	# arguments) tuples. Each worker runs in its own temporary directory with
+	# its terminal output redirected to a file there. Once an experiment and
+	# all experiments before it have finished, its terminal output is printed
+	# and the files it wrote (e.g., output/*.txt) are moved into the working
+	# directory, so that reports never interleave and files written by more
+	# than one experiment end up as if they were run one after another.
+	def run(self, experiments):
+		names = experiments.keys()
+		directories = {}
+		workers = {}
+		finished = {}
+		nextStart = 0
+		nextCollect = 0
+
+		# Buffered output would otherwise be written again by each worker.
+		sys.stdout.flush()
+		sys.stderr.flush()
+
+		try:
+			while nextCollect < len(names):
+				while nextStart < len(names) and len(workers) < self.processes:
+					name = names[nextStart]
+					directories[name] = tempfile.mkdtemp(prefix = constants.RUNNER_PREFIX)
+					workers[self.fork(experiments[name], directories[name])] = (name, time.time())
+					nextStart += 1
+
+				pid, status = os.wait()
+				name, start = workers.pop(pid)
+				finished[name] = (os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status), time.time() - start)
+
+				while nextCollect < len(names) and names[nextCollect] in finished:
+					name = names[nextCollect]
+					self.results[name] = finished[name]
+					self.collect(directories.pop(name))
+					nextCollect += 1
+		finally:
+			for pid in workers:
+				os.kill(pid, signal.SIGTERM)
+			for pid in workers:
+				os.waitpid(pid, 0)
+			for directory in directories.itervalues():
+				shutil.rmtree(directory, ignore_errors = True)
+
+		return self.results
+
+
+	# Forks a worker process that runs a single experiment in the given
+	# directory. Returns the process id of the worker.
+	def fork(self, experiment, directory):
+		pid = os.fork()
+		if pid:
+			return pid
+
+		status = 1
+		try:
+			# Workers are stopped by the runner, not by Ctrl-C.
+			signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+			log = os.open(os.path.join(directory, constants.RUNNER_LOG), os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+			os.dup2(log, sys.stdout.fileno())
+			os.dup2(log, sys.stderr.fileno())
+			os.close(log)
+			os.chdir(directory)
+
+			function, arguments = experiment
+			function(*arguments)
+			status = 0
+		except BaseException:
+			traceback.print_exc()
+		finally:
+			sys.stdout.flush()
+			sys.stderr.flush()
+			os._exit(status)
+
+
+	### Collection ###
+	# Prints the terminal output of a finished worker, moves the files it wrote
+	# into the working directory, and removes its directory.
+	def collect(self, directory):
+		with open(os.path.join(directory, constants.RUNNER_LOG), "rb") as log:
+			shutil.copyfileobj(log, sys.stdout)
+		sys.stdout.flush()
+
+		for root, subdirectories, filenames in os.walk(directory):
+			target = os.path.relpath(root, directory)
+
+			for filename in filenames:
+				if root == directory and filename == constants.RUNNER_LOG:
+					continue
+				if not os.path.exists(target):
+					os.makedirs(target)
+				shutil.move(os.path.join(root, filename), os.path.join(target, filename))
+
+		shutil.rmtree(directory, ignore_errors = True)
@@ -0,0 +1,169 @@
+from __future__ import division
+from collections import OrderedDict
+import argparse
+import json
+import multiprocessing
+import os
+import Queue
+import resource
+import time
+import traceback
+
+import constants
+import extractor
+import generator
+import learner
+import output
+import pairer
+import reader
+
+
+
+class ScalingBenchmark:
+	### Initialization ###
+	# Initializes the benchmark. Each scale multiplies the number of meanings
+	# of the Dyen-Kruskal-Black data (and thus the number of entries and pairs)
+	# while the number of languages stays fixed, unless set otherwise.
+	def __init__(self, scales, languageCount = constants.LANGUAGE_COUNT, seed = constants.BENCHMARK_SEED, directory = constants.SCALING_DIRECTORY):
+		self.scales = scales
+		self.languageCount = languageCount
+		self.seed = seed
+		self.directory = directory
+
+		self.results = OrderedDict()
+
+
+	### Running ###
+	# Runs the pipeline at every scale. Each scale runs in a separate process,
+	# so that its peak memory use is not affected by earlier (smaller) runs.
+	# Raises an error if a scale fails, or if its process dies without a
+	# result (e.g., killed for running out of memory).
+	def run(self):
+		for scale in self.scales:
+			queue = multiprocessing.Queue()
+			process = multiprocessing.Process(target = self.runWorker, args = (scale, queue))
+			process.start()
+			
+			try:
+				while True:
+					try:
+						error, result = queue.get(timeout = constants.SCALING_POLL)
+						break
+					except Queue.Empty:
+						if not process.is_alive() and queue.empty():
+							raise RuntimeError("Scale {0} exited with code {1} without a result.".format(scale, process.exitcode))
+			finally:
+				process.join()
+			
+			if error:
+				raise RuntimeError("Scale {0} failed:\n{1}".format(scale, error))
+			
+			self.results[scale] = result
+
+		return self.results
+
+
+	# Runs a single scale in a worker process, puts (error, result) on the
+	# queue: the formatted traceback if the scale failed, its measurements
+	# otherwise.
+	def runWorker(self, scale, queue):
+		error, result = None, None
+		
+		try:
+			result = self.runScale(scale)
+		except BaseException:
+			error = traceback.format_exc()
+		finally:
+			queue.put((error, result))
+
+
+	# Generates a synthetic wordlist of the given scale, then runs and measures
+	# reading, pairing, feature extraction, learning, prediction and
+	# clustering. Families in the first half are used for training, the rest
+	# for testing. Clustering is measured on a fixed number of test meanings.
+	def runScale(self, scale):
+		stages = OrderedDict()
+		meaningCount = int(constants.MEANING_COUNT * scale)
+		filename = os.path.join(self.directory, "synthetic{0}.txt".format(scale))
+
+		gnr = generator.Generator(self.languageCount, meaningCount, seed = self.seed)
+		trainLanguages = [language for family in gnr.families[: len(gnr.families) // 2] for language in family]
+		testLanguages = [language for family in gnr.families[len(gnr.families) // 2 :] for language in family]
+
+		output.checkDirectory(filename)
+		try:
+			self.measure(stages, "generate", lambda: gnr.generate(filename), meaningCount)
+
+			rdr = reader.Reader(filename, meaningCount, self.languageCount)
+			self.measure(stages, "read", rdr.read, 0)
+			stages["read"]["items"] = sum([len(forms) for forms in rdr.wordforms.itervalues()])
+		finally:
+			if os.path.exists(filename):
+				os.remove(filename)
+
+		prr = pairer.Pairer()
+		self.measure(stages, "pair", lambda: prr.pairBySpecificLanguage(rdr.cognateCCNs, rdr.dCognateCCNs, trainLanguages, testLanguages), 0)
+		stages["pair"]["items"] = len(prr.examples[constants.TRAIN]) + len(prr.examples[constants.TEST])
+
+		ext = extractor.Extractor()
+		self.measure(stages, "extract", lambda: ext.HK2011Baseline(prr.examples, prr.labels), stages["pair"]["items"])
+
+		lrn = learner.Learner()
+		lrn.initLogisticRegression(0.0001)
+		self.measure(stages, "fit", lambda: lrn.fitLogisticRegression(ext.trainExamples, ext.trainLabels), len(ext.trainLabels))
+		self.measure(stages, "predict", lambda: lrn.predictLogisticRegression(ext.testExamples), len(ext.testLabels))
+
+		meanings = sorted(rdr.wordforms.keys())[: constants.SCALING_MEANINGS]
+		self.measure(stages, "cluster", lambda: lrn.cluster(constants.LR, constants.T1, rdr.wordforms, rdr.POSTags, meanings, testLanguages, ext.HK2011Extractor), len(meanings))
+
+		return OrderedDict([("meanings", meaningCount), ("languages", self.languageCount), ("stages", stages)])
+
+
+	# Runs a single stage, records its wall time, the process' peak resident
+	# memory after the stage, and the increase of the peak during the stage.
+	def measure(self, stages, name, function, items):
+		peakBefore = self.getPeakMemory()
+		start = time.time()
+
+		function()
+
+		seconds = time.time() - start
+		peakAfter = self.getPeakMemory()
+
+		stages[name] = OrderedDict([
+			("items", items),
+			("seconds", seconds),
+			("peakMemory", peakAfter),
+			("peakIncrease", peakAfter - peakBefore)
+		])
+
+
+	# Returns the peak resident memory of the current process in megabytes.
+	def getPeakMemory(self):
+		return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+	### Saving ###
+	# Writes the results as JSON.
+	def save(self, filename):
+		output.checkDirectory(filename)
+
+		with open(filename, "wb") as results:
+			json.dump(self.results, results, indent = 2)
+
+
+
+# FLOW
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "Runs the pipeline on synthetic wordlists of increasing size, records time and peak memory per stage.")
+	parser.add_argument("--scales", type = float, nargs = "+", default = [1, 10], help = "multiples of the number of meanings of the original data (e.g., 1 10 100)")
+	parser.add_argument("--languages", type = int, default = constants.LANGUAGE_COUNT, help = "number of languages")
+	parser.add_argument("--seed", type = int, default = constants.BENCHMARK_SEED, help = "generator seed")
+	parser.add_argument("--output", default = constants.SCALING_OUT, help = "JSON file to write results to")
+	arguments = parser.parse_args()
+
+	scl = ScalingBenchmark(arguments.scales, arguments.languages, arguments.seed)
+	scl.run()
+	scl.save(arguments.output)
+
+	output.reportScaling(scl.results)
@@ -0,0 +1,204 @@
+from collections import OrderedDict
+import Queue
+import threading
+import time
+import traceback
+
+import numpy
+
+import constants
+
+
+
+class Request:
+	### Initialization ###
+	# Initializes a pending scoring request for a single word pair.
+	def __init__(self, key, callback = None):
+		self.key = key
+		self.callback = callback
+
+		self.score = None
+		self.error = None
+		self.done = threading.Event()
+
+
+	### Completion ###
+	# Sets the score (or the error) of the request, wakes up the waiting
+	# thread and calls the callback, if any. Errors raised by the callback are
+	# printed rather than raised, so that they cannot stop the worker thread
+	# and leave later requests waiting forever.
+	def finish(self, score = None, error = None):
+		self.score = score
+		self.error = error
+		self.done.set()
+
+		if self.callback:
+			try:
+				self.callback(self)
+			except Exception:
+				traceback.print_exc()
+
+
+	# Waits for the request to finish, returns its score. Raises the error of
+	# the batch the request was scored in, if any.
+	def result(self, timeout = None):
+		if not self.done.wait(timeout):
+			raise RuntimeError("Scoring request timed out.")
+		if self.error:
+			raise self.error
+
+		return self.score
+
+
+
+class Scorer:
+	### Initialization ###
+	# Initializes a long-lived scorer around a trained learner and an extractor
+	# function (e.g., Extractor.minimalExtractor). Requests coming from any
+	# number of threads are gathered by a single worker thread into batches of
+	# at most maxBatch pairs, waiting at most maxLatency seconds after the first
+	# request of a batch, and scored with one model call per batch. Scores of
+	# the cacheSize most recently used pairs are cached.
+	def __init__(self, learner, extractor, model = constants.LR, languages = None, POSTags = None, maxBatch = constants.SCORER_BATCH, maxLatency = constants.SCORER_LATENCY, cacheSize = constants.SCORER_CACHE):
+		self.learner = learner
+		self.extractor = extractor
+		self.model = model
+		self.languages = languages
+		self.POSTags = POSTags
+
+		self.maxBatch = maxBatch
+		self.maxLatency = maxLatency
+		self.cacheSize = cacheSize
+
+		# Least recently used pairs come first.
+		self.cache = OrderedDict()
+		self.lock = threading.Lock()
+
+		# Number of submitted requests that are not scored yet.
+		self.pendingCount = 0
+
+		# Statistics: requests, cache hits, and scored batches.
+		self.requestCount = 0
+		self.hitCount = 0
+		self.batchCount = 0
+
+		self.queue = Queue.Queue()
+		self.worker = threading.Thread(target = self.run)
+		self.worker.daemon = True
+		self.worker.start()
+
+
+	### Scoring ###
+	# Scores a word pair, blocking until its batch has been scored. Returns the
+	# probability of cognateness (the prediction itself for SVM).
+	def score(self, form1, form2, language1, language2, meaningIndex):
+		return self.submit(form1, form2, language1, language2, meaningIndex).result()
+
+
+	# Submits a word pair for scoring without waiting. Returns a request whose
+	# result() gives the score; the callback, if given, is called with the
+	# request from the worker thread once it is scored. Cached pairs are
+	# finished immediately.
+	def submit(self, form1, form2, language1, language2, meaningIndex, callback = None):
+		request = Request((form1, form2, language1, language2, meaningIndex), callback)
+
+		with self.lock:
+			self.requestCount += 1
+			score = self.cache.pop(request.key, None)
+
+			if score is not None:
+				self.hitCount += 1
+				self.cache[request.key] = score
+			else:
+				self.pendingCount += 1
+
+		if score is not None:
+			request.finish(score)
+		else:
+			self.queue.put(request)
+
+		return request
+
+
+	# Scores many word pairs at once, given as (form1, form2, language1,
+	# language2, meaningIndex) tuples. Returns their scores in order.
+	def scoreMany(self, pairs):
+		return [request.result() for request in [self.submit(*pair) for pair in pairs]]
+
+
+	### Batching ###
+	# Runs the worker loop: waits for a request, gathers further requests into
+	# a batch until it is full, the latency budget of the first request is
+	# spent, or the batch holds all pending requests (so that callers waiting
+	# on each other are not delayed), then scores the batch. Stops when it
+	# receives None.
+	def run(self):
+		while True:
+			request = self.queue.get()
+			if request is None:
+				return
+
+			batch = [request]
+			deadline = time.time() + self.maxLatency
+
+			while len(batch) < min(self.maxBatch, self.pendingCount):
+				remaining = deadline - time.time()
+				if remaining <= 0:
+					break
+
+				try:
+					request = self.queue.get(timeout = remaining)
+				except Queue.Empty:
+					break
+
+				if request is None:
+					self.scoreBatch(batch)
+					return
+				batch.append(request)
+
+			self.scoreBatch(batch)
+
+
+	# Scores a batch of requests with a single model call. Duplicate pairs
+	# within the batch are scored once. Errors are passed on to all requests
+	# of the batch.
+	def scoreBatch(self, batch):
+		keys = list(OrderedDict.fromkeys([request.key for request in batch]))
+
+		try:
+			rows = numpy.array([self.extractor(form1, form2, self.languages, language1, language2, meaningIndex, self.POSTags) for (form1, form2, language1, language2, meaningIndex) in keys])
+
+			if self.model == constants.SVM:
+				scores = self.learner.predictSVM(rows)
+			elif self.model == constants.LR:
+				scores = self.learner.predictProbLogisticRegression(rows)
+		except Exception as error:
+			with self.lock:
+				self.pendingCount -= len(batch)
+
+			for request in batch:
+				request.finish(error = error)
+			return
+
+		scores = dict(zip(keys, [float(score) for score in scores]))
+
+		with self.lock:
+			self.batchCount += 1
+			self.pendingCount -= len(batch)
+
+			for key in keys:
+				self.cache.pop(key, None)
+				self.cache[key] = scores[key]
+
+			while len(self.cache) > self.cacheSize:
+				self.cache.popitem(last = False)
+
+		for request in batch:
+			request.finish(scores[request.key])
+
+
+	### Shutdown ###
+	# Stops the worker thread after all pending requests are scored.
+	def close(self):
+		self.queue.put(None)
+		self.worker.join()
@@ -1,13 +1,29 @@
 from __future__ import division
+import time
+
+# Process start, for reporting startup time.
+STARTED = time.time()
+
+from collections import OrderedDict
+import argparse
 import itertools
 import operator
+import os
+import sys
+
+import numpy
 
 import constants
+import crossval
 import extractor
 import learner
 import output
 import pairer
 import reader
+import runner
+import store
+import sweep
+import tracer
 
 
 
@@ -16,6 +32,7 @@ import reader
 def pairwiseDeduction(measure):
 	# Feature extraction
 	ext = extractor.Extractor()
+	ext.store = fst
 	
 	if measure == constants.IDENTICAL_WORDS:
 		ext.identicalWordsBaseline(prr.examples, prr.labels)
@@ -54,7 +71,7 @@ def groupDeduction(measure):
 	
 	# Evaluation
 	lrn = learner.Learner()
-	V1scores = {meaningIndex: lrn.computeV1(trueLabels[meaningIndex], predictedLabels[meaningIndex]) for meaningIndex in prr.testMeanings}
+	V1scores = lrn.computeV1Scores(trueLabels, predictedLabels, prr.testMeanings)
 
 	# Reporting
 	output.reportGroup(constants.DEDUCERS[measure], V1scores, rdr.meanings)
@@ -66,6 +83,7 @@ def HK2011Pairwise(twoStage = False):
 	# 1st Pass
 	# Feature extraction
 	ext = extractor.Extractor()
+	ext.store = fst
 	ext.HK2011Baseline(prr.examples, prr.labels)
 
 	# Learning
@@ -125,7 +143,7 @@ def HK2011Clustering(ext, lrn, twoStage = False):
 	predictedLabels, predictedSets, clusterCounts, clusterDistances = lrn.cluster(constants.SVM, threshold, rdr.wordforms, rdr.POSTags, prr.testMeanings, prr.testLanguages, extractor)
 
 	# Evaluation
-	V1scores = {meaningIndex: lrn.computeV1(trueLabels[meaningIndex], predictedLabels[meaningIndex]) for meaningIndex in prr.testMeanings}
+	V1scores = lrn.computeV1Scores(trueLabels, predictedLabels, prr.testMeanings)
 
 	# Reporting
 	output.reportCluster(V1scores, clusterCounts, clusterDistances, rdr.meanings)
@@ -136,6 +154,7 @@ def HK2011Clustering(ext, lrn, twoStage = False):
 def treeFeatureSelection():
 	# Feature extraction
 	ext = extractor.Extractor()
+	ext.store = fst
 	ext.appendWordSimilarityFeatures(prr.examples, prr.labels, ext.allMeasures)
 	
 	# Feature selection
@@ -149,45 +168,110 @@ def treeFeatureSelection():
 		print "{0}: {1:.4f}".format(feature, importances[i])
 
 
-def editOperations():
+# Counts the edit operations of all cognate pairs in the data, in a single
+# table or one table per language or language group pair, and saves them as
+# sound correspondence statistics.
+def editOperations(tables = None, processes = None):
+	# Pairing
+	tbl = pairer.Pairer()
+	tbl.pairAll(rdr.cognateCCNs, rdr.dCognateCCNs)
+	
 	# Feature extraction
 	ext = extractor.Extractor()
-	operations = ext.extractEditOps(prr.examples, prr.labels)
+	operations = ext.accumulateEditOps([example for example, label in itertools.izip(tbl.allExamples, tbl.allLabels) if label == 1], tables, processes)
+	
+	# Reporting
+	output.saveEditOps(constants.EDIT_OPS_OUT, operations)
 
 
-def pairwiseLearning(minimal = False):
-	# Feature extraction
+def pairwiseLearning(minimal = False, negativeRatio = None, hardFraction = 0.0, seed = 0, streaming = False, saveModel = False):
 	ext = extractor.Extractor()
-	ext.consonantPrep = rdr.consonants
-	ext.soundClassPrep = rdr.soundClasses
+	ext.store = fst
 	
-	if minimal:
-		ext.appendWordSimilarityFeatures(prr.examples, prr.labels, ext.minimalMeasures)
-		ext.appendPOSTags(prr.examples, prr.labels, rdr.POSTags)
+	# Negative subsampling
+	if negativeRatio:
+		output.reportSubsampling(*prr.subsampleNegatives(constants.TRAIN, negativeRatio, hardFraction, ext.bigramDice, seed))
+	
+	# Feature extraction and learning
+	stage = "Pairwise Learning"
+	if streaming:
+		lrn, predictions = learnStreaming(ext, prr.examples, prr.labels, minimal, 0.0001, "output/" + stage + ".txt")
 	else:
-		ext.appendWordSimilarityFeatures(prr.examples, prr.labels, [ext.commonBigramRatio, ext.commonTrigramNumber, ext.bigramDice, ext.jaroDistance])
-		ext.appendWordSimilarityFeatures(prr.examples, prr.labels, [ext.identicalWords], rdr.consonants)
-		ext.appendWordSimilarityFeatures(prr.examples, prr.labels, [ext.LCPLength, ext.commonBigramNumber, ext.identicalPrefix], rdr.soundClasses)
-		ext.appendPOSTags(prr.examples, prr.labels, rdr.POSTags)
-		ext.appendLetterFeatures(prr.examples, prr.labels)
-		ext.appendSameLanguageGroupFeatures(prr.examples, prr.labels)
-
-
-	# Learning
-	lrn, predictions = learn(ext, 0.0001)
+		extractFeatures(ext, prr.examples, prr.labels, minimal)
+		lrn, predictions = learn(ext, 0.0001, prr.weights[constants.TRAIN] or None)
 
 	# Reporting
-	stage = "Pairwise Learning"
 	accuracy = lrn.computeAccuracy(ext.testLabels, predictions)
 	F1 = lrn.computeF1(ext.testLabels, predictions)
 	report = lrn.evaluatePairwise(ext.testLabels, predictions)
 	
 	output.reportPairwiseLearning(stage, prr, accuracy, F1, report)
-	output.savePredictions("output/" + stage + ".txt", prr.examples[constants.TEST], ext.testExamples, predictions, ext.testLabels)
+	output.reportInterval("F1", lrn.computeF1Interval(ext.testLabels, predictions))
+	if not streaming:
+		output.savePredictions("output/" + stage + ".txt", prr.examples[constants.TEST], ext.testExamples, predictions, ext.testLabels)
+	
+	# Saving the model, e.g., for the clustering server
+	if saveModel:
+		layout = ext.getMinimalLayout(rdr.POSTags) if minimal else ext.getCombinedLayout(rdr.POSTags)
+		output.pickleLearning(constants.MINIMAL if minimal else constants.COMBINED, ext, lrn, constants.LR, layout, constants.T3 if minimal else constants.T4)
 
 	return ext, lrn
 
 
+# Trains and tests on each given partition of the language groups, as (train
+# groups, test groups) pairs of indices into constants.LANGUAGE_GROUPS.
+# Pairs and their features are computed once, and each partition only
+# splits them.
+def partitionLearning(partitions, minimal = False):
+	# Pairing
+	tbl = pairer.Pairer()
+	tbl.pairAll(rdr.cognateCCNs, rdr.dCognateCCNs)
+	
+	# Feature extraction
+	ext = extractor.Extractor()
+	ext.store = fst
+	extractFeatures(ext, {constants.TABLE: tbl.allExamples}, {constants.TABLE: tbl.allLabels}, minimal)
+	
+	for trainGroups, testGroups in partitions:
+		trainLanguages = [language for group in trainGroups for language in constants.LANGUAGE_GROUPS[group]]
+		testLanguages = [language for group in testGroups for language in constants.LANGUAGE_GROUPS[group]]
+		ext.splitTable(tbl.splitByLanguage(trainLanguages, testLanguages))
+		
+		# Learning
+		lrn, predictions = learn(ext, 0.0001)
+		
+		# Reporting
+		stage = "Partition " + ",".join([str(group) for group in trainGroups])
+		accuracy = lrn.computeAccuracy(ext.testLabels, predictions)
+		F1 = lrn.computeF1(ext.testLabels, predictions)
+		report = lrn.evaluatePairwise(ext.testLabels, predictions)
+		
+		output.reportPairwiseLearning(stage, tbl, accuracy, F1, report)
+
+
+# Holds out each language group in turn, trains on the others. Features of
+# the global pair table are extracted once for all folds, and folds run in
+# parallel.
+def crossValidation(minimal = False, processes = None):
+	# Pairing
+	tbl = pairer.Pairer()
+	tbl.pairAll(rdr.cognateCCNs, rdr.dCognateCCNs)
+	
+	# Feature extraction
+	ext = extractor.Extractor()
+	ext.store = fst
+	extractFeatures(ext, {constants.TABLE: tbl.allExamples}, {constants.TABLE: tbl.allLabels}, minimal)
+	
+	# Cross-validation
+	pairExtractor = ext.minimalExtractor if minimal else ext.combinedExtractor
+	threshold = constants.T3 if minimal else constants.T4
+	cvl = crossval.CrossValidation(rdr, tbl, ext, pairExtractor, threshold, 0.0001, processes, ext.getBlocker(blocking))
+	cvl.run()
+	
+	# Reporting
+	output.reportCrossValidation(cvl.results, cvl.aggregate())
+
+
 def groupLearning(ext, lrn, minimal = False):
 	# Feature extraction
 	trueLabels = ext.extractGroupLabels(rdr.cognateSets, rdr.wordforms, prr.testMeanings, prr.testLanguages)
@@ -195,21 +279,41 @@ def groupLearning(ext, lrn, minimal = False):
 
 	# Learning
 	threshold = constants.T3 if minimal else constants.T4
-	predictedLabels, predictedSets, clusterCounts, clusterDistances = lrn.cluster(constants.LR, threshold, rdr.wordforms, rdr.POSTags, prr.testMeanings, prr.testLanguages, extractor)
+	blocker = ext.getBlocker(blocking)
+	predictedLabels, predictedSets, clusterCounts, clusterDistances = lrn.cluster(constants.LR, threshold, rdr.wordforms, rdr.POSTags, prr.testMeanings, prr.testLanguages, extractor, blocker)
 	
 	# Evaluation
-	V1scores = {meaningIndex: lrn.computeV1(trueLabels[meaningIndex], predictedLabels[meaningIndex]) for meaningIndex in prr.testMeanings}
+	V1scores = lrn.computeV1Scores(trueLabels, predictedLabels, prr.testMeanings)
 	
 	# Reporting
 	output.reportCluster(V1scores, clusterCounts, clusterDistances, rdr.meanings)
+	if blocker:
+		output.reportBlocking(lrn.blockedCount, *ext.evaluateBlocking(prr.examples[constants.TEST], prr.labels[constants.TEST], blocking))
+	output.reportInterval("Average V1", lrn.computeAverageInterval(V1scores))
 	output.saveGroup("output/Clustering.txt", predictedSets)
 
 
-def learn(ext, C):
+def extractFeatures(ext, examples, labels, minimal = False):
+	ext.consonantPrep = rdr.consonants
+	ext.soundClassPrep = rdr.soundClasses
+	
+	if minimal:
+		ext.appendWordSimilarityFeatures(examples, labels, ext.minimalMeasures)
+		ext.appendPOSTags(examples, labels, rdr.POSTags)
+	else:
+		ext.appendWordSimilarityFeatures(examples, labels, [ext.commonBigramRatio, ext.commonTrigramNumber, ext.bigramDice, ext.jaroDistance])
+		ext.appendWordSimilarityFeatures(examples, labels, [ext.identicalWords], rdr.consonants)
+		ext.appendWordSimilarityFeatures(examples, labels, [ext.LCPLength, ext.commonBigramNumber, ext.identicalPrefix], rdr.soundClasses)
+		ext.appendPOSTags(examples, labels, rdr.POSTags)
+		ext.appendLetterFeatures(examples, labels)
+		ext.appendSameLanguageGroupFeatures(examples, labels)
+
+
+def learn(ext, C, sampleWeights = None):
 	# Learning
 	lrn = learner.Learner()
 	lrn.initLogisticRegression(C)
-	lrn.fitLogisticRegression(ext.trainExamples, ext.trainLabels)
+	lrn.fitLogisticRegression(ext.trainExamples, ext.trainLabels, sampleWeights)
 	
 	# Prediction
 	predictions = lrn.predictLogisticRegression(ext.testExamples)
@@ -217,28 +321,223 @@ def learn(ext, C):
 	return lrn, predictions
 
 
+# Trains logistic regression by stochastic gradient descent over chunks of
+# training features, so that they are never all held in memory. Chunks are
+# extracted on the first pass over the training examples and read back from
+# the feature store on later passes. Test features are extracted and scored
+# chunk by chunk as well, and each chunk's predictions are saved to the
+# given file as they are made; only predictions and labels are kept.
+def learnStreaming(ext, examples, labels, minimal, C, filename):
+	ext.consonantPrep = rdr.consonants
+	ext.soundClassPrep = rdr.soundClasses
+	layout = ext.getMinimalLayout(rdr.POSTags) if minimal else ext.getCombinedLayout(rdr.POSTags)
+	
+	# Learning
+	lrn = learner.Learner()
+	lrn.initStreaming(constants.LR, C)
+	lrn.fitStreaming(constants.LR, lambda: ext.streamFeatures(examples[constants.TRAIN], labels[constants.TRAIN], layout, constants.TRAIN))
+	
+	# Prediction
+	predictions = []
+	truth = []
+	start = 0
+	
+	for features, chunkLabels in ext.streamFeatures(examples[constants.TEST], labels[constants.TEST], layout, constants.TEST):
+		chunkPredictions = lrn.predictLogisticRegression(features)
+		output.savePredictions(filename, examples[constants.TEST][start : start + len(chunkLabels)], features, chunkPredictions, chunkLabels, start > 0)
+		
+		predictions.append(chunkPredictions)
+		truth.append(chunkLabels)
+		start += len(chunkLabels)
+	
+	ext.testLabels = numpy.concatenate(truth)
+	
+	return lrn, numpy.concatenate(predictions)
 
-# FLOW
-# Reading
-rdr = reader.Reader()
-rdr.read()
 
+### Experiment Runs ###
+# Runs the Hauer & Kondrak approach, optionally followed by clustering.
+def runHK2011(twoStage = False, clustering = False):
+	ext, lrn = HK2011Pairwise(twoStage)
+	
+	if clustering:
+		HK2011Clustering(ext, lrn, twoStage)
 
-# Data division
-trainMeanings = [i for i in range(1, constants.MEANING_COUNT + 1) if (i % 10 != 0 and i % 10 != 5)]
-devMeanings = [i for i in range(1, constants.MEANING_COUNT + 1) if i % 10 == 5]
-testMeanings = [i for i in range(1, constants.MEANING_COUNT + 1) if i % 10 == 0]
 
-trainLanguages = constants.LANGUAGE_GROUPS[1] + constants.LANGUAGE_GROUPS[2] + constants.LANGUAGE_GROUPS[3]
-testLanguages = constants.LANGUAGE_GROUPS[0] + constants.LANGUAGE_GROUPS[4] + constants.LANGUAGE_GROUPS[5] + constants.LANGUAGE_GROUPS[6] + constants.LANGUAGE_GROUPS[8] + constants.LANGUAGE_GROUPS[7]
+# Runs the minimal or combined approach, optionally followed by clustering,
+# optionally on subsampled negative training examples and optionally trained
+# on streamed chunks of features. The trained model can be saved as a model
+# artifact.
+def runLearning(minimal = False, clustering = False, negativeRatio = None, hardFraction = 0.0, seed = 0, streaming = False, saveModel = False):
+	ext, lrn = pairwiseLearning(minimal, negativeRatio, hardFraction, seed, streaming, saveModel)
+	
+	if clustering:
+		groupLearning(ext, lrn, minimal)
+
+
+# Sweeps the hyperparameters of the minimal or combined approach over a
+# single set of extracted features, writes the results table.
+def runSweep(minimal, models, penalties, Cs, thresholds, processes = None):
+	# Feature extraction
+	ext = extractor.Extractor()
+	ext.store = fst
+	extractFeatures(ext, prr.examples, prr.labels, minimal)
+	
+	swp = sweep.Sweep(ext, processes)
+	
+	if thresholds:
+		trueLabels = ext.extractGroupLabels(rdr.cognateSets, rdr.wordforms, prr.testMeanings, prr.testLanguages)
+		blocker = ext.getBlocker(blocking)
+		swp.cacheClustering(ext.minimalExtractor if minimal else ext.combinedExtractor, rdr.wordforms, rdr.POSTags, prr.testMeanings, prr.testLanguages, trueLabels, blocker)
+	
+	# Sweeping
+	swp.run(models, penalties, Cs, thresholds)
+	
+	# Reporting
+	output.reportSweep(swp.results)
+	output.saveSweep(constants.SWEEP_OUT, swp.results)
 
 
-# Pairing
-prr = pairer.Pairer()
-#prr.pairBySpecificMeaning(rdr.cognateCCNs, rdr.dCognateCCNs, trainMeanings, devMeanings)
-prr.pairBySpecificLanguage(rdr.cognateCCNs, rdr.dCognateCCNs, trainLanguages, testLanguages)
+# Lists the experiments of a full evaluation cycle, by name, as (function,
+# arguments) tuples: every rule-based baseline, both Hauer & Kondrak passes,
+# and both approaches with clustering.
+def getExperiments(measures):
+	experiments = OrderedDict()
+	
+	for name, measure in sorted(measures.items(), key = operator.itemgetter(1)):
+		experiments["pairwiseDeduction." + name] = (pairwiseDeduction, (measure,))
+	for name, measure in sorted(measures.items(), key = operator.itemgetter(1)):
+		experiments["groupDeduction." + name] = (groupDeduction, (measure,))
+	
+	experiments["HK2011Clustering"] = (runHK2011, (True, True))
+	experiments["groupLearning.minimal"] = (runLearning, (True, True))
+	experiments["groupLearning.combined"] = (runLearning, (False, True))
+	
+	return experiments
+
 
 
-# Learning
-ext, lrn = pairwiseLearning()
-groupLearning(ext, lrn)
\ No newline at end of file
+# FLOW
+if __name__ == "__main__":
+	measures = {"words": constants.IDENTICAL_WORDS, "prefix": constants.IDENTICAL_PREFIX, "letter": constants.IDENTICAL_LETTER}
+	experiments = getExperiments(measures)
+
+	parser = argparse.ArgumentParser(description = "Runs cognate identification experiments on the Comparative Indo-European Database.")
+	parser.add_argument("--input", default = constants.IN, help = "wordlist to read, in the format of the Comparative Indo-European Database (default: {0})".format(constants.IN))
+	parser.add_argument("--split", choices = ["meaning", "language"], default = "language", help = "divide the data into training and test sets by meaning or by language")
+	parser.add_argument("--blocking", type = int, default = constants.BLOCKING_N, metavar = "N", help = "during clustering, only score word pairs sharing a sound class n-gram of length N (default: 0, score all pairs)")
+	commands = parser.add_subparsers(dest = "command")
+
+	command = commands.add_parser("pairwiseDeduction", help = "rule-based baseline, pairwise")
+	command.add_argument("--measure", choices = sorted(measures.keys()), default = "words", help = "baseline measure")
+	command = commands.add_parser("groupDeduction", help = "rule-based baseline, grouping")
+	command.add_argument("--measure", choices = sorted(measures.keys()), default = "words", help = "baseline measure")
+	command = commands.add_parser("HK2011Pairwise", help = "Hauer & Kondrak (2011), pairwise")
+	command.add_argument("--two-stage", action = "store_true", help = "add the 2nd pass with language pair features")
+	command = commands.add_parser("HK2011Clustering", help = "Hauer & Kondrak (2011), pairwise and clustering")
+	command.add_argument("--two-stage", action = "store_true", help = "add the 2nd pass with language pair features")
+	for name, description in [("pairwiseLearning", "minimal or combined approach, pairwise"), ("groupLearning", "minimal or combined approach, pairwise and clustering")]:
+		command = commands.add_parser(name, help = description)
+		command.add_argument("--minimal", action = "store_true", help = "use the minimal approach features")
+		command.add_argument("--negative-ratio", type = float, default = None, help = "keep at most this many negative training examples per positive one in each meaning, weighting them to preserve the original class balance")
+		command.add_argument("--hard-negatives", type = float, default = 0.0, help = "fraction of the kept negatives that are the most similar ones by bigram Dice coefficient rather than sampled")
+		command.add_argument("--seed", type = int, default = 0, help = "random seed of negative subsampling")
+		command.add_argument("--streaming", action = "store_true", help = "train by stochastic gradient descent on chunks of features, cached in the feature store, instead of on all features at once")
+		command.add_argument("--save-model", action = "store_true", help = "save the trained model as a model artifact in {0} (e.g., for server.py)".format(os.path.join(constants.ARTIFACTS, constants.ARTIFACT_STAGE.format(constants.MINIMAL + "|" + constants.COMBINED))))
+	commands.add_parser("treeFeatureSelection", help = "word similarity measure importances")
+	command = commands.add_parser("editOperations", help = "edit operation counts of all cognate pairs")
+	command.add_argument("--tables", choices = ["global", "language", "group"], default = "global", help = "count a single table, or one per language pair or language group pair")
+	command.add_argument("--processes", type = int, default = None, help = "number of worker processes (default: number of CPUs)")
+	command = commands.add_parser("partitionLearning", help = "minimal or combined approach, pairwise, trained and tested on given language groups")
+	command.add_argument("--minimal", action = "store_true", help = "use the minimal approach features")
+	command.add_argument("--train-groups", type = int, nargs = "+", required = True, choices = range(len(constants.LANGUAGE_GROUPS)), metavar = "GROUP", help = "indices of the training language groups (0-{0}: {1})".format(len(constants.LANGUAGE_GROUPS) - 1, ", ".join(constants.LANGUAGE_GROUP_NAMES)))
+	command.add_argument("--test-groups", type = int, nargs = "+", required = True, choices = range(len(constants.LANGUAGE_GROUPS)), metavar = "GROUP", help = "indices of the test language groups")
+	command = commands.add_parser("crossValidation", help = "leave-one-family-out cross-validation of the minimal or combined approach")
+	command.add_argument("--minimal", action = "store_true", help = "use the minimal approach features")
+	command.add_argument("--processes", type = int, default = None, help = "number of worker processes (default: number of CPUs)")
+	command = commands.add_parser("sweep", help = "sweep C, penalty, model and clustering threshold of the minimal or combined approach")
+	command.add_argument("--minimal", action = "store_true", help = "use the minimal approach features")
+	command.add_argument("--models", nargs = "+", choices = ["SVM", "LR"], default = ["SVM", "LR"], help = "models to sweep")
+	command.add_argument("--penalties", nargs = "+", choices = ["l1", "l2"], default = ["l2", "l1"], help = "logistic regression penalties to sweep")
+	command.add_argument("--Cs", type = float, nargs = "+", default = constants.SWEEP_CS, help = "C values to sweep")
+	command.add_argument("--thresholds", type = float, nargs = "*", default = constants.SWEEP_THRESHOLDS, help = "clustering thresholds to sweep (none to skip clustering)")
+	command.add_argument("--processes", type = int, default = None, help = "number of worker processes (default: number of CPUs)")
+	command = commands.add_parser("parallel", help = "run several experiments at once in forked worker processes, reporting in a fixed order")
+	command.add_argument("--experiments", nargs = "+", choices = experiments.keys(), default = experiments.keys(), metavar = "EXPERIMENT", help = "experiments to run (default: all of {0})".format(", ".join(experiments.keys())))
+	command.add_argument("--processes", type = int, default = None, help = "number of worker processes (default: number of CPUs)")
+
+	arguments = parser.parse_args()
+	if getattr(arguments, "streaming", False) and arguments.negative_ratio:
+		parser.error("--streaming does not support sample weights of --negative-ratio")
+	startup = time.time() - STARTED
+
+
+	# Reading
+	rdr = reader.Reader(arguments.input)
+	rdr.read()
+
+
+	# Data division
+	# Not a method of any traced class, so it is recorded as a stage here.
+	with tracer.stage("script.divideData"):
+		trainMeanings = [i for i in rdr.meanings if (i % 10 != 0 and i % 10 != 5)]
+		devMeanings = [i for i in rdr.meanings if i % 10 == 5]
+		testMeanings = [i for i in rdr.meanings if i % 10 == 0]
+
+		trainLanguages = constants.LANGUAGE_GROUPS[1] + constants.LANGUAGE_GROUPS[2] + constants.LANGUAGE_GROUPS[3]
+		testLanguages = constants.LANGUAGE_GROUPS[0] + constants.LANGUAGE_GROUPS[4] + constants.LANGUAGE_GROUPS[5] + constants.LANGUAGE_GROUPS[6] + constants.LANGUAGE_GROUPS[8] + constants.LANGUAGE_GROUPS[7]
+
+
+	# Feature storage
+	# The absolute path keeps workers of the parallel runner, which run in their
+	# own directories, on the same store.
+	fst = store.FeatureStore(os.path.abspath(constants.STORE))
+
+
+	# Blocking
+	# Length of the sound class n-grams word pairs must share to be scored
+	# during clustering; 0 scores all pairs.
+	blocking = arguments.blocking
+
+
+	# Pairing
+	prr = pairer.Pairer()
+	if arguments.split == "meaning":
+		prr.pairBySpecificMeaning(rdr.cognateCCNs, rdr.dCognateCCNs, trainMeanings, devMeanings)
+	else:
+		prr.pairBySpecificLanguage(rdr.cognateCCNs, rdr.dCognateCCNs, trainLanguages, testLanguages)
+
+	output.reportStartup(arguments.command, startup, time.time() - STARTED - startup)
+
+
+	# Experiments
+	if arguments.command == "pairwiseDeduction":
+		pairwiseDeduction(measures[arguments.measure])
+	elif arguments.command == "groupDeduction":
+		groupDeduction(measures[arguments.measure])
+	elif arguments.command == "HK2011Pairwise":
+		runHK2011(arguments.two_stage)
+	elif arguments.command == "HK2011Clustering":
+		runHK2011(arguments.two_stage, True)
+	elif arguments.command == "pairwiseLearning":
+		runLearning(arguments.minimal, False, arguments.negative_ratio, arguments.hard_negatives, arguments.seed, arguments.streaming, arguments.save_model)
+	elif arguments.command == "groupLearning":
+		runLearning(arguments.minimal, True, arguments.negative_ratio, arguments.hard_negatives, arguments.seed, arguments.streaming, arguments.save_model)
+	elif arguments.command == "treeFeatureSelection":
+		treeFeatureSelection()
+	elif arguments.command == "editOperations":
+		editOperations({"global": None, "language": constants.LANGUAGE_PAIR_TABLES, "group": constants.GROUP_PAIR_TABLES}[arguments.tables], arguments.processes)
+	elif arguments.command == "partitionLearning":
+		partitionLearning([(arguments.train_groups, arguments.test_groups)], arguments.minimal)
+	elif arguments.command == "crossValidation":
+		crossValidation(arguments.minimal, arguments.processes)
+	elif arguments.command == "sweep":
+		runSweep(arguments.minimal, [constants.SVM if model == "SVM" else constants.LR for model in arguments.models], arguments.penalties, arguments.Cs, arguments.thresholds, arguments.processes)
+	elif arguments.command == "parallel":
+		rnr = runner.Runner(arguments.processes)
+		rnr.run(OrderedDict([(name, experiments[name]) for name in experiments if name in arguments.experiments]))
+		output.reportRuns(rnr.results)
+		
+		# Fails if any experiment failed, so that scripts calling this notice.
+		if any([status != 0 for status, seconds in rnr.results.itervalues()]):
+			sys.exit(1)
@@ -0,0 +1,248 @@
+from __future__ import division
+import argparse
+import BaseHTTPServer
+import json
+import multiprocessing
+import os
+import SocketServer
+import time
+
+import artifact
+import constants
+import extractor
+import learner
+import pairer
+import reader
+
+
+
+class ClusteringService:
+	### Initialization ###
+	# Initializes the service, which holds the data, the extractor and the
+	# learner of the minimal approach, trained at startup or loaded from a
+	# model artifact. Clustering scores all word
+	# pairs unless blocking is set (see Extractor.getBlocker). The data is read
+	# from the given wordlist.
+	def __init__(self, blocking = constants.BLOCKING_N, filename = constants.IN):
+		self.filename = filename
+		self.rdr = None
+		self.ext = None
+		self.lrn = None
+		self.blocking = blocking
+
+		# The model, extractor function and threshold that clustering uses.
+		self.model = constants.LR
+		self.extractor = None
+		self.threshold = constants.T3
+
+
+	### Training ###
+	# Reads the data, pairs all meanings and languages, and trains logistic
+	# regression on the minimal approach features. Returns the time it took.
+	def train(self):
+		start = time.time()
+
+		self.rdr = reader.Reader(self.filename)
+		self.rdr.read()
+
+		prr = pairer.Pairer()
+		prr.pairBySpecificMeaning(self.rdr.cognateCCNs, self.rdr.dCognateCCNs, self.rdr.meanings.keys(), [])
+
+		self.ext = extractor.Extractor()
+		self.ext.soundClassPrep = self.rdr.soundClasses
+		self.ext.appendWordSimilarityFeatures(prr.examples, prr.labels, self.ext.minimalMeasures)
+		self.ext.appendPOSTags(prr.examples, prr.labels, self.rdr.POSTags)
+
+		self.lrn = learner.Learner()
+		self.lrn.initLogisticRegression(0.0001)
+		self.lrn.fitLogisticRegression(self.ext.trainExamples, self.ext.trainLabels)
+
+		# Training features are no longer needed.
+		self.ext.cleanup()
+		self.extractor = self.ext.minimalExtractor
+
+		return time.time() - start
+
+
+	# Reads the data and loads a model artifact (e.g., saved by script.py
+	# pairwiseLearning --minimal --save-model) instead of training. Word pairs
+	# are scored with the artifact and the extractor compiled from its feature
+	# layout, and clustered with its threshold. Returns the time it took.
+	def load(self, directory):
+		start = time.time()
+
+		self.rdr = reader.Reader(self.filename)
+		self.rdr.read()
+
+		self.ext = extractor.Extractor()
+		self.ext.consonantPrep = self.rdr.consonants
+		self.ext.soundClassPrep = self.rdr.soundClasses
+
+		model = artifact.Model.load(directory)
+		self.lrn = learner.Learner()
+		self.lrn.artifact = model
+
+		self.model = model.model
+		self.extractor = model.getExtractor(self.ext)
+		self.threshold = model.threshold
+
+		return time.time() - start
+
+
+	### Clustering ###
+	# Clusters the wordforms of a single meaning. The request holds the meaning
+	# index and a list of [language index, wordform] entries, one per
+	# language. Returns clusters in the shape of Learner.extractClusters, i.e.,
+	# each cluster index with a list of [wordform, language index] entries.
+	def cluster(self, request):
+		self.validate(request)
+
+		meaningIndex = int(request["meaning"])
+		entries = [(int(language), form.strip().lower()) for language, form in request["entries"]]
+
+		if meaningIndex not in self.rdr.POSTags:
+			raise ValueError("Unknown meaning: {0}".format(meaningIndex))
+		if len(set([language for language, form in entries])) < len(entries):
+			raise ValueError("Each language may only have a single wordform.")
+
+		wordforms = {meaningIndex: {language: form for language, form in entries if form}}
+		languages = [language for language, form in entries if form]
+
+		blocker = self.ext.getBlocker(self.blocking)
+		predictedClusters = self.lrn.cluster(self.model, self.threshold, wordforms, self.rdr.POSTags, [meaningIndex], languages, self.extractor, blocker)[1]
+
+		return {"meaning": meaningIndex, "clusters": {str(clusterIndex): cluster for clusterIndex, cluster in sorted(predictedClusters[meaningIndex].iteritems())}}
+
+
+	# Checks the shape of a request: an object with a meaning index and a list
+	# of [language index, wordform] entries, wordforms being strings.
+	def validate(self, request):
+		if not isinstance(request, dict):
+			raise ValueError("The request must be an object.")
+		if not isinstance(request.get("entries"), list):
+			raise ValueError("The request must have a list of entries.")
+
+		for entry in request["entries"]:
+			if not isinstance(entry, list) or len(entry) != 2:
+				raise ValueError("Each entry must be a [language, wordform] pair.")
+			if not isinstance(entry[0], (int, long, basestring)) or isinstance(entry[0], bool):
+				raise ValueError("Languages must be integers: {0}".format(json.dumps(entry[0])))
+			if not isinstance(entry[1], basestring):
+				raise ValueError("Wordforms must be strings: {0}".format(json.dumps(entry[1])))
+
+
+
+### Parallel Workers ###
+# The service is trained or loaded before the worker pool is created, so that
+# forked workers inherit it instead of retraining.
+SERVICE = ClusteringService()
+
+
+# Clusters a single request in a worker process. Errors are returned rather
+# than raised, so that they can be reported to the client: invalid requests
+# as 400, any other error as 500.
+def clusterRequest(request):
+	try:
+		return 200, SERVICE.cluster(request)
+	except (KeyError, TypeError, ValueError) as error:
+		return 400, {"error": str(error)}
+	except Exception as error:
+		return 500, {"error": "{0}: {1}".format(type(error).__name__, error)}
+
+
+
+### HTTP ###
+class ClusteringHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	# Handles a clustering request (POST /cluster) by passing it to the worker
+	# pool.
+	def do_POST(self):
+		if self.path != "/cluster":
+			self.sendJSON(404, {"error": "Not found."})
+			return
+
+		try:
+			request = json.loads(self.rfile.read(int(self.headers.getheader("content-length", 0))))
+		except ValueError as error:
+			self.sendJSON(400, {"error": str(error)})
+			return
+
+		try:
+			status, response = self.server.pool.apply(clusterRequest, (request,))
+		except Exception as error:
+			status, response = 500, {"error": "{0}: {1}".format(type(error).__name__, error)}
+
+		self.sendJSON(status, response)
+
+
+	# Handles a health check (GET /health).
+	def do_GET(self):
+		if self.path == "/health":
+			self.sendJSON(200, {"status": "ok"})
+		else:
+			self.sendJSON(404, {"error": "Not found."})
+
+
+	# Writes a JSON response.
+	def sendJSON(self, status, response):
+		body = json.dumps(response)
+
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+
+	# Only logs requests if the server is verbose.
+	def log_message(self, format, *args):
+		if self.server.verbose:
+			BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+
+# Accepts each connection on its own thread; the threads only parse requests
+# and wait for the worker pool, which does the clustering.
+class ClusteringServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	daemon_threads = True
+
+	def __init__(self, address, pool, verbose = False):
+		BaseHTTPServer.HTTPServer.__init__(self, address, ClusteringHandler)
+		self.pool = pool
+		self.verbose = verbose
+
+
+
+# FLOW
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "Serves cognate clustering of single-meaning wordlists over HTTP/JSON (POST /cluster).")
+	parser.add_argument("--host", default = constants.SERVER_HOST, help = "address to listen on")
+	parser.add_argument("--port", type = int, default = constants.SERVER_PORT, help = "port to listen on")
+	parser.add_argument("--workers", type = int, default = multiprocessing.cpu_count(), help = "number of worker processes")
+	parser.add_argument("--input", default = constants.IN, help = "wordlist to read, in the format of the Comparative Indo-European Database (default: {0})".format(constants.IN))
+	parser.add_argument("--blocking", type = int, default = constants.BLOCKING_N, metavar = "N", help = "only score word pairs sharing a sound class n-gram of length N (default: 0, score all pairs)")
+	parser.add_argument("--model", default = os.path.join(constants.ARTIFACTS, constants.ARTIFACT_STAGE.format(constants.MINIMAL)), help = "model artifact to load, if it exists; otherwise a model is trained at startup (default: %(default)s, saved by script.py pairwiseLearning --minimal --save-model)")
+	parser.add_argument("--verbose", action = "store_true", help = "log every request")
+	arguments = parser.parse_args()
+
+	SERVICE.blocking = arguments.blocking
+	SERVICE.filename = arguments.input
+
+	if os.path.exists(os.path.join(arguments.model, constants.ARTIFACT_MANIFEST)):
+		print "Loading {0}...".format(arguments.model),
+		print "{0:.2f}s".format(SERVICE.load(arguments.model))
+	else:
+		print "Training...",
+		print "{0:.2f}s".format(SERVICE.train())
+
+	pool = multiprocessing.Pool(arguments.workers)
+	httpd = ClusteringServer((arguments.host, arguments.port), pool, arguments.verbose)
+
+	print "Listening on {0}:{1} with {2} workers.".format(arguments.host, arguments.port, arguments.workers)
+
+	try:
+		httpd.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		httpd.server_close()
+		pool.terminate()
@@ -0,0 +1,160 @@
+import atexit
+import os
+import shutil
+import signal
+import tempfile
+import uuid
+
+import numpy
+
+import constants
+
+
+
+class SharedArrays:
+	### Initialization ###
+	# Initializes a named set of arrays in shared memory. Each array is a .npy
+	# file in a directory on a RAM-backed filesystem (constants.SHARED_MEMORY,
+	# or the temporary directory if there is none), which every process that
+	# attaches maps into memory. Workers thus get zero-copy NumPy views of the
+	# same pages instead of pickled copies. Without a name, a new set is
+	# created and owned by this process: it is removed when the set is closed
+	# or used as a context manager, and at the latest when the process exits
+	# or is terminated. With a name, an existing set is attached to and never
+	# removed.
+	def __init__(self, name = None):
+		self.owner = name is None
+		self.pid = os.getpid()
+		self.name = name or "{0}{1}-{2}".format(constants.SHARED_PREFIX, os.getpid(), uuid.uuid4().hex[: 8])
+		self.directory = os.path.join(getSharedDirectory(), self.name)
+
+		if self.owner:
+			os.makedirs(self.directory)
+			atexit.register(self.unlink)
+			handleTermination()
+		elif not os.path.isdir(self.directory):
+			raise ValueError("No shared arrays named {0}.".format(self.name))
+
+
+	### Arrays ###
+	# Creates a new shared array of the given shape and type, returns a
+	# writable view of it.
+	def create(self, key, shape, dtype = numpy.float64):
+		return numpy.lib.format.open_memmap(self.getFilename(key), mode = "w+", dtype = dtype, shape = shape)
+
+
+	# Copies an array into shared memory, returns a writable view of the copy.
+	def put(self, key, array):
+		array = numpy.asarray(array)
+		view = self.create(key, array.shape, array.dtype)
+		view[...] = array
+		view.flush()
+
+		return view
+
+
+	# Returns a zero-copy view of a shared array, read-only unless writable is
+	# set. Writes are seen by all processes.
+	def get(self, key, writable = False):
+		return numpy.load(self.getFilename(key), mmap_mode = "r+" if writable else "r")
+
+
+	# Checks if a shared array exists.
+	def contains(self, key):
+		return os.path.exists(self.getFilename(key))
+
+
+	# Generates the filename of a shared array.
+	def getFilename(self, key):
+		return os.path.join(self.directory, constants.SHARED_ARRAY.format(key))
+
+
+	### Pair Tables ###
+	# Copies a list of examples (form1, form2, language1, language2,
+	# meaningIndex) into a single shared record array. Forms are stored as
+	# fixed-width byte strings.
+	def putExamples(self, key, examples):
+		width = max([max(len(example[0]), len(example[1])) for example in examples] + [1])
+		dtype = [("form1", "S{0}".format(width)), ("form2", "S{0}".format(width)), ("language1", int), ("language2", int), ("meaningIndex", int)]
+
+		view = self.create(key, (len(examples),), dtype)
+		for start in range(0, len(examples), constants.BATCH_SIZE):
+			view[start : start + constants.BATCH_SIZE] = examples[start : start + constants.BATCH_SIZE]
+		view.flush()
+
+		return view
+
+
+	# Returns a zero-copy view of a shared pair table. Its records unpack like
+	# the original examples.
+	def getExamples(self, key):
+		return self.get(key)
+
+
+	### Lifecycle ###
+	# Removes the shared arrays if this process owns them (forked children of
+	# the owner do not). Views that are still open stay valid, and the memory
+	# is freed once the last of them is closed.
+	def unlink(self):
+		if self.owner and os.getpid() == self.pid:
+			shutil.rmtree(self.directory, ignore_errors = True)
+			unregisterExit(self.unlink)
+
+
+	def __enter__(self):
+		return self
+
+
+	# Removes the shared arrays on leaving the block, whether it finished, raised
+	# an error or was interrupted.
+	def __exit__(self, type, value, traceback):
+		self.unlink()
+
+
+
+# Finds the directory holding shared arrays: a RAM-backed filesystem if there
+# is one, the temporary directory otherwise.
+def getSharedDirectory():
+	return constants.SHARED_MEMORY if os.path.isdir(constants.SHARED_MEMORY) else tempfile.gettempdir()
+
+
+
+# Removes a function registered to run at exit. Python 2 has no
+# atexit.unregister, so its list of exit handlers is filtered instead.
+def unregisterExit(function):
+	if hasattr(atexit, "unregister"):
+		atexit.unregister(function)
+	else:
+		atexit._exithandlers[:] = [handler for handler in atexit._exithandlers if handler[0] != function]
+
+
+
+### Termination ###
+# The process whose SIGTERM is turned into SystemExit.
+TERMINATED_PID = None
+
+
+# Turns SIGTERM into SystemExit in the calling process, unless the program set
+# its own handler. A process killed by a signal runs neither finally blocks
+# nor exit handlers, so owners of shared arrays (e.g., experiments stopped by
+# runner.Runner) would otherwise leave them behind.
+def handleTermination():
+	global TERMINATED_PID
+
+	if signal.getsignal(signal.SIGTERM) in (signal.SIG_DFL, terminate):
+		try:
+			signal.signal(signal.SIGTERM, terminate)
+		except ValueError:
+			# Signal handlers can only be set in the main thread.
+			return
+		TERMINATED_PID = os.getpid()
+
+
+# Handles SIGTERM. Forked children (e.g., pool workers) that inherited the
+# handler are terminated as before, without unwinding.
+def terminate(signum, frame):
+	if os.getpid() != TERMINATED_PID:
+		signal.signal(signum, signal.SIG_DFL)
+		os.kill(os.getpid(), signum)
+	else:
+		raise SystemExit(128 + signum)
@@ -0,0 +1,117 @@
+import errno
+import hashlib
+import inspect
+import os
+
+import numpy
+
+import constants
+
+
+
+class FeatureStore:
+	### Initialization ###
+	# Initializes the store in the given directory. Each stored block is a
+	# single .npy file holding the values of one measure for every pair in a
+	# pair table.
+	def __init__(self, directory = constants.STORE):
+		self.directory = directory
+
+		# Measure keys, by measure function.
+		self.measureKeys = {}
+
+
+	### Keys ###
+	# Computes a hash of the pair table. Any change to the pairs or their order
+	# results in a different hash and thus in a different set of blocks. The
+	# hash is computed on every call rather than cached, since example lists
+	# are extended in place (e.g., by pairer.Pairer); hashing a table takes well
+	# under a second.
+	def hashPairs(self, examples):
+		digest = hashlib.sha1()
+		for example in examples:
+			digest.update(repr(example))
+			digest.update("\n")
+
+		return digest.hexdigest()[: 16]
+
+
+	# Generates the key of a measure (or an extractor function): its name and a
+	# hash of its source code and constants.STORE_VERSION. Blocks computed by
+	# an earlier version of the measure thus have a different key and are
+	# computed again rather than loaded.
+	def getMeasureKey(self, measure):
+		function = getattr(measure, "__func__", measure)
+
+		if function not in self.measureKeys:
+			try:
+				source = inspect.getsource(function)
+			except (IOError, TypeError):
+				source = ""
+
+			digest = hashlib.sha1("{0}\n{1}".format(constants.STORE_VERSION, source)).hexdigest()[: 8]
+			self.measureKeys[function] = constants.STORE_MEASURE.format(function.__name__, digest)
+
+		return self.measureKeys[function]
+
+
+	# Generates the filename of a block given its measure, preprocessor, pair
+	# table hash and split.
+	def getFilename(self, measure, preprocessor, pairHash, purpose):
+		return os.path.join(self.directory, constants.STORE_BLOCK.format(measure, preprocessor, pairHash, purpose))
+
+
+	# Checks if a block has already been computed and saved.
+	def contains(self, measure, preprocessor, pairHash, purpose):
+		return os.path.exists(self.getFilename(measure, preprocessor, pairHash, purpose))
+
+
+	### Saving and Loading ###
+	# Saves a block of feature values to disk. The block is first written to a
+	# temporary file and then renamed, so that a half-written block is never
+	# picked up by another experiment.
+	def save(self, measure, preprocessor, pairHash, purpose, block):
+		filename = self.getFilename(measure, preprocessor, pairHash, purpose)
+
+		# Concurrent workers (see runner.Runner) may create the directory at
+		# the same time.
+		try:
+			os.makedirs(self.directory)
+		except OSError as error:
+			if error.errno != errno.EEXIST:
+				raise
+
+		temporary = filename + ".{0}.tmp".format(os.getpid())
+		with open(temporary, "wb") as output:
+			numpy.save(output, numpy.asarray(block, dtype = numpy.float64))
+		os.rename(temporary, filename)
+
+
+	# Loads a block as a read-only memory-mapped array.
+	def load(self, measure, preprocessor, pairHash, purpose):
+		return numpy.load(self.getFilename(measure, preprocessor, pairHash, purpose), mmap_mode = "r")
+
+
+	# Combines memory-mapped blocks into a single feature matrix. The output is
+	# allocated once and each block is read straight from its mapping into its
+	# columns, so no intermediate copies are made along the way.
+	def combine(self, blocks):
+		rowCount = blocks[0].shape[0]
+		widths = [1 if block.ndim == 1 else block.shape[1] for block in blocks]
+
+		combined = numpy.empty((rowCount, sum(widths)))
+
+		column = 0
+		for i, block in enumerate(blocks):
+			combined[:, column : column + widths[i]] = block.reshape((rowCount, widths[i]))
+			column += widths[i]
+
+		return combined
+
+
+	# Yields the combined features and labels of memory-mapped blocks one
+	# chunk of rows at a time, so that only a single chunk is read into
+	# memory at once.
+	def streamBlocks(self, blocks, labels, chunkSize = constants.STREAM_CHUNK):
+		for start in range(0, blocks[0].shape[0], chunkSize):
+			yield self.combine([block[start : start + chunkSize] for block in blocks]), numpy.asarray(labels[start : start + chunkSize])
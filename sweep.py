@@ -0,0 +1,186 @@
+from __future__ import division
+from collections import OrderedDict
+import multiprocessing
+import time
+
+import numpy
+
+import constants
+import learner
+
+
+
+class Sweep:
+	### Initialization ###
+	# Initializes a hyperparameter sweep over the training and test features of
+	# an extractor. Features are computed once, before the sweep, and shared by
+	# all grid points.
+	def __init__(self, ext, processes = None):
+		self.ext = ext
+		self.processes = processes or multiprocessing.cpu_count()
+
+		# Cached clustering features: for each test meaning, the feature rows of
+		# all ordered pairs of its wordforms, their positions in the meaning's
+		# distance matrix, the positions of blocked pairs, the size of the
+		# matrix, and the true cognate labels.
+		self.meanings = []
+		self.clusterRows = {}
+		self.clusterPositions = {}
+		self.blockedPositions = {}
+		self.clusterSizes = {}
+		self.trueLabels = {}
+
+		self.results = []
+
+
+	### Clustering Features ###
+	# Extracts the feature rows of all ordered wordform pairs of each test
+	# meaning, the same pairs Learner.computeDistances scores, so that
+	# clustering at any grid point only needs to score the cached rows.
+	def cacheClustering(self, extractor, wordforms, POSTags, testMeanings, testLanguages, trueLabels, blocker = None):
+		lrn = learner.Learner()
+
+		self.meanings = list(testMeanings)
+		self.trueLabels = trueLabels
+
+		for meaningIndex in testMeanings:
+			meaningLanguages = lrn.collectMeaningLanguages(testLanguages, wordforms[meaningIndex])
+			forms = [wordforms[meaningIndex].get(language, None) for language in meaningLanguages]
+
+			present = numpy.array([bool(form) for form in forms], dtype = bool)
+			pairs = numpy.outer(present, present)
+			candidates = blocker(forms) if blocker else pairs
+
+			positions = numpy.argwhere(candidates)
+			rows = [extractor(forms[i], forms[j], testLanguages, meaningLanguages[i], meaningLanguages[j], meaningIndex, POSTags) for i, j in positions]
+
+			self.clusterRows[meaningIndex] = numpy.array(rows)
+			self.clusterPositions[meaningIndex] = positions.reshape((-1, 2))
+			self.blockedPositions[meaningIndex] = numpy.argwhere(pairs & ~candidates).reshape((-1, 2))
+			self.clusterSizes[meaningIndex] = len(meaningLanguages)
+
+
+	### Sweeping ###
+	# Runs the sweep. Each model (and penalty, for logistic regression) is a
+	# regularization path over the given C values, fitted in increasing order
+	# of C; logistic regression with the L2 penalty is warm-started from the
+	# previous solution along its path. Paths are independent and run in a
+	# process pool. If clustering features are cached, each fitted model also
+	# clusters the test meanings at every threshold. Returns the results
+	# table, one row per model, penalty, C and threshold.
+	def run(self, models, penalties, Cs, thresholds = None):
+		paths = [(model, penalty) for model in models for penalty in (penalties if model == constants.LR else ["l2"])]
+		tasks = [(model, penalty, sorted(Cs), sorted(thresholds or [])) for model, penalty in paths]
+
+		global SWEEP
+		SWEEP = self
+
+		# The pool is forked after the features are computed, so that workers
+		# share them instead of receiving copies.
+		pool = multiprocessing.Pool(min(self.processes, len(tasks))) if self.processes > 1 and len(tasks) > 1 else None
+
+		try:
+			pathResults = pool.map(sweepPath, tasks) if pool else [sweepPath(task) for task in tasks]
+		finally:
+			if pool:
+				pool.terminate()
+				pool.join()
+
+		self.results = [row for rows in pathResults for row in rows]
+
+		return self.results
+
+
+	# Fits every C value of a single path, evaluates each fitted model.
+	def runPath(self, model, penalty, Cs, thresholds):
+		lrn = learner.Learner()
+		rows = []
+
+		if model == constants.LR and penalty == "l2":
+			lrn.initLogisticRegression(Cs[0], penalty, "lbfgs", True)
+
+		for C in Cs:
+			start = time.time()
+
+			if model == constants.SVM:
+				lrn.initSVM(C)
+				lrn.SVM.set_params(verbose = False)
+				lrn.fitSVM(self.ext.trainExamples, self.ext.trainLabels)
+				predictions = lrn.predictSVM(self.ext.testExamples)
+			elif model == constants.LR:
+				if penalty == "l2":
+					lrn.LR.set_params(C = C)
+				else:
+					lrn.initLogisticRegression(C, penalty)
+				lrn.fitLogisticRegression(self.ext.trainExamples, self.ext.trainLabels)
+				predictions = lrn.predictLogisticRegression(self.ext.testExamples)
+
+			seconds = time.time() - start
+
+			row = OrderedDict([
+				("model", "SVM" if model == constants.SVM else "LR"),
+				("penalty", penalty),
+				("solver", lrn.LR.solver if model == constants.LR else "liblinear"),
+				("C", C),
+				("accuracy", lrn.computeAccuracy(self.ext.testLabels, predictions)),
+				("F1", lrn.computeF1(self.ext.testLabels, predictions)),
+				("seconds", seconds)
+			])
+
+			if thresholds and self.meanings:
+				for threshold, V1 in self.evaluateThresholds(lrn, model, thresholds).iteritems():
+					rows.append(OrderedDict(row.items() + [("threshold", threshold), ("V1", V1)]))
+			else:
+				rows.append(row)
+
+		return rows
+
+
+	### Thresholds ###
+	# Clusters all cached test meanings at every threshold. Distances are
+	# computed once per model. Returns the average V1 score of each threshold.
+	def evaluateThresholds(self, lrn, model, thresholds):
+		predictedLabels = {threshold: {} for threshold in thresholds}
+
+		for meaningIndex in self.meanings:
+			distances = self.computeDistances(lrn, model, meaningIndex)
+
+			for threshold, (labels, n, minDistance) in lrn.clusterThresholds(thresholds, distances).iteritems():
+				predictedLabels[threshold][meaningIndex] = labels
+
+		return OrderedDict([(threshold, numpy.mean(lrn.computeV1Scores(self.trueLabels, predictedLabels[threshold], self.meanings).values())) for threshold in thresholds])
+
+
+	# Scores the cached rows of a meaning, builds its distance matrix as
+	# Learner.computeDistances does.
+	def computeDistances(self, lrn, model, meaningIndex):
+		size = self.clusterSizes[meaningIndex]
+		distances = numpy.zeros((size, size))
+
+		rows = self.clusterRows[meaningIndex]
+		positions = self.clusterPositions[meaningIndex]
+		blocked = self.blockedPositions[meaningIndex]
+
+		if len(rows):
+			if model == constants.SVM:
+				scores = lrn.predictSVM(rows)
+			elif model == constants.LR:
+				scores = lrn.predictProbLogisticRegression(rows)
+
+			distances[positions[:, 0], positions[:, 1]] = 1 - scores
+
+		distances[blocked[:, 0], blocked[:, 1]] = 1.0
+
+		return distances.tolist()
+
+
+
+### Parallel Workers ###
+# The sweep is set before the worker pool is created, so that forked workers
+# inherit its features.
+SWEEP = None
+
+
+# Runs a single regularization path in a worker process.
+def sweepPath(task):
+	return SWEEP.runPath(*task)
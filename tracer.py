@@ -0,0 +1,197 @@
+from __future__ import division
+from collections import OrderedDict
+import atexit
+import contextlib
+import functools
+import json
+import os
+import resource
+import threading
+import time
+
+import numpy
+
+import constants
+
+
+
+class Tracer:
+	### Initialization ###
+	# Initializes the tracer, which collects stage events and counters and
+	# writes them to the given file when the program exits.
+	def __init__(self, filename):
+		self.filename = filename
+		self.events = []
+		self.counters = OrderedDict()
+		self.start = time.time()
+		self.lock = threading.Lock()
+
+
+	### Recording ###
+	# Runs a function as a named stage, records its wall time, CPU time, peak
+	# resident memory and the bytes of NumPy arrays it allocated (arrays
+	# returned, and growth of arrays held by the object whose method is run).
+	def run(self, name, function, args, kwargs):
+		owner = args[0] if args else None
+		bytesBefore = self.countArrayBytes(owner)
+		wallStart = time.time()
+		CPUStart = time.clock()
+
+		result = function(*args, **kwargs)
+
+		CPU = time.clock() - CPUStart
+		wall = time.time() - wallStart
+		allocated = max(0, self.countArrayBytes(owner) - bytesBefore) + self.countArrayBytes(result)
+
+		self.record(name, wallStart, wall, CPU, allocated)
+
+		return result
+
+
+	# Adds a stage event in the trace event format, with the measurements as
+	# event arguments.
+	def record(self, name, wallStart, wall, CPU, allocated):
+		event = OrderedDict([
+			("name", name),
+			("ph", "X"),
+			("ts", int((wallStart - self.start) * 1e6)),
+			("dur", int(wall * 1e6)),
+			("pid", os.getpid()),
+			("tid", threading.current_thread().ident),
+			("args", OrderedDict([
+				("wall", wall),
+				("CPU", CPU),
+				("peakRSS", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024),
+				("arrayBytes", allocated)
+			]))
+		])
+
+		with self.lock:
+			self.events.append(event)
+
+
+	# Increases a named counter.
+	def count(self, name, amount = 1):
+		with self.lock:
+			self.counters[name] = self.counters.get(name, 0) + amount
+
+
+	# Sums the sizes of NumPy arrays held by an object: the object itself, its
+	# attributes, or the items of a tuple or list of arrays.
+	def countArrayBytes(self, item):
+		if isinstance(item, numpy.ndarray):
+			return item.nbytes
+		elif isinstance(item, (tuple, list)):
+			return sum([element.nbytes for element in item if isinstance(element, numpy.ndarray)])
+		elif hasattr(item, "__dict__"):
+			return sum([value.nbytes for value in vars(item).itervalues() if isinstance(value, numpy.ndarray)])
+		return 0
+
+
+	### Saving ###
+	# Writes the recorded events and counters as a trace event file, with a
+	# per-stage summary added for convenience.
+	def save(self):
+		summary = OrderedDict()
+
+		for event in self.events:
+			stage = summary.setdefault(event["name"], OrderedDict([("calls", 0), ("wall", 0.0), ("CPU", 0.0), ("arrayBytes", 0), ("peakRSS", 0)]))
+			stage["calls"] += 1
+			stage["wall"] += event["args"]["wall"]
+			stage["CPU"] += event["args"]["CPU"]
+			stage["arrayBytes"] += event["args"]["arrayBytes"]
+			stage["peakRSS"] = max(stage["peakRSS"], event["args"]["peakRSS"])
+
+		directory = os.path.dirname(self.filename)
+		if directory and not os.path.exists(directory):
+			os.makedirs(directory)
+
+		with open(self.filename, "wb") as output:
+			json.dump(OrderedDict([("traceEvents", self.events), ("counters", self.counters), ("stages", summary)]), output, indent = 1)
+
+
+
+### Hooks ###
+# The tracer is only created if the trace environment variable names an output
+# file. Otherwise, all hooks below are no-ops.
+TRACER = Tracer(os.environ[constants.TRACE_VARIABLE]) if os.environ.get(constants.TRACE_VARIABLE) else None
+
+if TRACER:
+	atexit.register(TRACER.save)
+
+
+# Decorates a function so that each of its calls is recorded as a stage. If a
+# counter is given, it is increased by count(*args), or by 1 if no count
+# function is given. When tracing is off, the function is returned unchanged.
+def traced(name, counter = None, count = None):
+	def decorate(function):
+		if not TRACER:
+			return function
+
+		@functools.wraps(function)
+		def wrapper(*args, **kwargs):
+			if counter:
+				TRACER.count(counter, count(*args, **kwargs) if count else 1)
+			return TRACER.run(name, function, args, kwargs)
+
+		return wrapper
+
+	return decorate
+
+
+# Records a block of code as a stage.
+@contextlib.contextmanager
+def stage(name):
+	if not TRACER:
+		yield
+		return
+
+	wallStart = time.time()
+	CPUStart = time.clock()
+
+	yield
+
+	TRACER.record(name, wallStart, time.time() - wallStart, time.clock() - CPUStart, 0)
+
+
+# Increases a named counter.
+def count(name, amount = 1):
+	if TRACER:
+		TRACER.count(name, amount)
+
+
+### Counting ###
+# Counts the examples of all datasets passed to an extractor method, found in
+# its first dictionary argument.
+def countExamples(*args, **kwargs):
+	for argument in args:
+		if isinstance(argument, dict):
+			return sum([len(examples) for examples in argument.itervalues()])
+	return 0
+
+
+# Returns a counter of the examples of a single dataset (e.g., the test set)
+# in the first dictionary argument, for extractor methods that only extend
+# that dataset.
+def countDataset(purpose):
+	def count(*args, **kwargs):
+		for argument in args:
+			if isinstance(argument, dict):
+				return len(argument[purpose])
+		return 0
+
+	return count
+
+
+# Counts the examples of the dataset an extractor method extends, given by
+# its purpose argument (e.g., appendBinaryLanguageFeatures).
+def countPurposeExamples(self, allExamples, allLabels, purpose, *args, **kwargs):
+	return len(allExamples[purpose])
+
+
+# Counts the feature rows passed to a model method; a single example counts
+# as one row.
+def countRows(self, examples, *args, **kwargs):
+	shape = numpy.shape(examples) if not hasattr(examples, "shape") else examples.shape
+
+	return shape[0] if len(shape) == 2 else 1